@@ -0,0 +1,91 @@
+"""Shared pytest fixtures"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_loader import MIMICDataLoader
+
+
+@pytest.fixture
+def loader():
+    """Loader populated with a small synthetic MIMIC-IV extract"""
+    loader = MIMICDataLoader(use_cache=False)
+    loader.admissions = pd.DataFrame({
+        'subject_id': [1, 2, 1],
+        'hadm_id': [100, 200, 300],
+        'admittime': ['2180-01-01 10:00:00', '2181-06-01 08:30:00', '2182-03-05 12:00:00'],
+    })
+    loader.patients = pd.DataFrame({
+        'subject_id': [2, 1],
+        'gender': ['M', 'F'],
+        'anchor_age': [70, 50],
+        'anchor_year': [2181, 2180],
+    })
+    loader.diagnoses = pd.DataFrame({
+        'subject_id': [1, 2, 1, 1, 2],
+        'hadm_id': [100, 200, 100, 300, 200],
+        'seq_num': [1, 1, 2, 1, 2],
+        'icd_code': ['78650', '4151', '4019', 'I214', 'UNKNOWN'],
+        'icd_version': [9, 9, 9, 10, 9],
+    })
+    loader.d_icd = pd.DataFrame({
+        'icd_code': ['78650', '4151', '4019', 'I214'],
+        'icd_version': [9, 9, 9, 10],
+        'long_title': ['Chest pain, unspecified', 'Pulmonary embolism', 'Hypertension', 'NSTEMI'],
+    })
+    loader.labevents = pd.DataFrame({
+        'subject_id': [1, 1, 1, 2, 1],
+        'hadm_id': [100, 100, 100, 200, 300],
+        'itemid': [51222, 51222, 50912, 50971, 51222],
+        'charttime': ['2180-01-01 14:00:00', '2180-01-01 11:00:00', '2180-01-01 11:00:00',
+                      '2181-06-01 09:00:00', '2182-03-05 13:00:00'],
+        'valuenum': [12.5, 13.1, 1.1, 4.2, np.nan],
+    })
+    loader.icustays = pd.DataFrame({'subject_id': [2], 'hadm_id': [200], 'stay_id': [9000]})
+    loader.chartevents = pd.DataFrame({
+        'subject_id': [2, 2, 2, 2, 2, 2, 2, 2],
+        'hadm_id': [200, 200, 200, 200, 200, 200, 200, 200],
+        'itemid': [220045, 220045, 220179, 220180, 220210, 220277, 223761, 220045],
+        'charttime': ['2181-06-01 10:00:00', '2181-06-01 09:00:00', '2181-06-01 09:00:00',
+                      '2181-06-01 09:00:00', '2181-06-01 09:00:00', '2181-06-01 09:00:00',
+                      '2181-06-01 09:00:00', '2181-06-05 09:00:00'],
+        'valuenum': [110.0, 95.0, 85.0, 50.0, 24.0, 88.0, 100.4, 60.0],
+    })
+    loader.omr = pd.DataFrame({
+        'subject_id': [1, 1, 1],
+        'chartdate': ['2179-12-20', '2175-01-01', '2180-01-02'],
+        'result_name': ['Blood Pressure', 'Blood Pressure', 'Weight (Lbs)'],
+        'result_value': ['142/91', '120/80', '180'],
+    })
+    loader.prescriptions = pd.DataFrame({
+        'subject_id': [1, 1, 1, 2, 1, 1],
+        'hadm_id': [100, 100, 100, 200, 300, 300],
+        'starttime': pd.to_datetime(['2180-01-01 12:00:00', '2180-01-01 10:30:00',
+                                     '2180-01-02 09:00:00', '2181-06-01 09:00:00',
+                                     '2182-03-05 13:00:00', '2182-03-05 14:00:00']),
+        'drug': ['Pantoprazole', 'Aspirin', 'Pantoprazole', 'Heparin',
+                 'Heparin Flush (10 units/ml)', 'Heparin'],
+        'route': ['IV', 'PO', 'IV', 'IV', 'IV', 'SC'],
+    })
+    loader.microbiology = pd.DataFrame({
+        'subject_id': [2, 2, 1],
+        'hadm_id': pd.array([200, None, 300], dtype='Int32'),
+        'chartdate': pd.to_datetime(['2181-06-01', '2181-06-02', '2182-03-05']),
+        'charttime': pd.to_datetime(['2181-06-01 10:00:00', None, '2182-03-05 15:00:00']),
+        'spec_type_desc': ['SPUTUM', 'BLOOD CULTURE', 'URINE'],
+        'test_name': ['GRAM STAIN', 'Blood Culture', 'URINE CULTURE'],
+        'org_name': ['STREPTOCOCCUS PNEUMONIAE', None, 'ESCHERICHIA COLI'],
+    })
+    loader.outputevents = pd.DataFrame({
+        'subject_id': [1], 'hadm_id': [100], 'itemid': [226559],
+        'charttime': pd.to_datetime(['2180-01-01 11:00:00']), 'value': np.array([350.0], dtype=np.float32),
+    })
+    loader.d_items = pd.DataFrame({'itemid': [226559], 'label': ['Foley']})
+    for table in ('pharmacy', 'transfers', 'datetimeevents', 'procedureevents'):
+        setattr(loader, table, pd.DataFrame({'hadm_id': pd.Series(dtype='Int32')}))
+    loader.build_indexes()
+    return loader
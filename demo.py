@@ -10,7 +10,8 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from loguru import logger
-from config import LOG_LEVEL, LOG_FORMAT, LOGS_DIR
+from config import LOG_LEVEL, LOG_FORMAT, LOGS_DIR, SpecialtyType
+import diagnostics
 from data_loader import MIMICDataLoader, format_patient_summary
 from agents.base import MasterOrchestrator
 from agents.cardiology import CardiologyAgent
@@ -20,6 +21,7 @@ from agents.safety import SafetyMonitorAgent
 logger.remove()
 logger.add(sys.stderr, format=LOG_FORMAT, level=LOG_LEVEL)
 logger.add(LOGS_DIR / "mimiq.log", format=LOG_FORMAT, level="DEBUG", rotation="10 MB")
+diagnostics.set_level("DEBUG")  # Keep per-agent detail in the log file
 
 
 async def main():
@@ -53,8 +55,8 @@ async def main():
     cardio_agent = CardiologyAgent(depth=0)
     safety_agent = SafetyMonitorAgent()
     
-    orchestrator.register_agent("cardiology", cardio_agent)
-    orchestrator.register_agent("safety", safety_agent)
+    orchestrator.register_agent(SpecialtyType.CARDIOLOGY, cardio_agent)
+    orchestrator.register_agent(SpecialtyType.SAFETY, safety_agent)
     
     logger.success("Agent system initialized")
     
@@ -74,8 +76,8 @@ async def main():
         logger.info("\n🚨 Running Safety Monitor...")
         safety_result = await safety_agent.analyze(patient)
         
-        if safety_agent.has_critical_alerts():
-            logger.critical(f"\n⚠️  CRITICAL ALERTS: {', '.join(safety_agent.get_alerts())}")
+        if safety_agent.has_critical_alerts(safety_result):
+            logger.critical(f"\n⚠️  CRITICAL ALERTS: {', '.join(safety_agent.get_alerts(safety_result))}")
             logger.critical(f"Diagnosis: {safety_result.diagnosis}")
             logger.critical(f"Confidence: {safety_result.confidence:.1%}")
             logger.critical(f"Risk Level: {safety_result.risk_level}")
@@ -2,11 +2,16 @@
 Base fractal agent class and orchestrator
 """
 
-from typing import Dict, List, Optional, Any, TypedDict
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Any, Tuple, TypedDict, Union
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from enum import Enum
 import asyncio
+import multiprocessing
+import time
+import numpy as np
 from loguru import logger
 
 import sys
@@ -14,10 +19,16 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config import (
-    MAX_FRACTAL_DEPTH, CONFIDENCE_THRESHOLD, 
+    MAX_FRACTAL_DEPTH, CONFIDENCE_THRESHOLD, AGENT_TIMEOUT_SECONDS, ORCHESTRATION_DEADLINE_SECONDS,
+    SAFETY_PRIORITY_MODE, AGENT_EXECUTOR, AGENT_EXECUTOR_WORKERS, AGENT_ROUTING,
     SpecialtyType, DiagnosisType, RiskLevel
 )
 from data_loader import PatientData
+import diagnostics
+from src.agents.result_cache import ResultCache
+from src.agents.routing import RoutingTable
+from src.agents.tracing import TRACER
+from src.agents.depth_policy import DEPTH_POLICY, DepthPolicy, remaining_budget, request_budget
 
 @dataclass
 class DiagnosisResult:
@@ -41,6 +52,63 @@ class AgentState:
     safety_alerts: List[str] = field(default_factory=list)
     confidence: float = 0.0
     current_depth: int = 0
+    final_diagnosis: Optional[DiagnosisResult] = None
+    agent_timings: Dict[str, float] = field(default_factory=dict)  # Agent name -> seconds
+    timed_out_agents: List[str] = field(default_factory=list)
+    failed_agents: List[str] = field(default_factory=list)  # Agents that raised an exception
+    partial: bool = False  # Some agents missed the deadline or their timeout, or safety failed
+    preempted_agents: List[str] = field(default_factory=list)
+    provisional: bool = False  # Returned early on a critical safety alert (priority mode)
+
+@dataclass
+class AnalysisContext:
+    """
+    Scratch state of one FractalAgent.analyze() call
+    
+    Agents are long-lived singletons shared by concurrent requests, so
+    anything an analysis accumulates lives here instead of on the agent and
+    is dropped when the call returns.
+    """
+    agent_name: str
+    patient_data: PatientData
+    alerts: List[str] = field(default_factory=list)
+    # (child name, child depth, patient fingerprint) -> child analysis, shared by the whole request tree
+    child_results: Dict[tuple, asyncio.Future] = field(default_factory=dict)
+    patient_fingerprint: Optional[str] = None  # Computed once per request tree
+
+# Context of the analyze() call running in the current task; asyncio copies it
+# into child tasks, so concurrent and nested analyses never see each other's
+_CURRENT_ANALYSIS: ContextVar[Optional[AnalysisContext]] = ContextVar("current_analysis", default=None)
+
+def confidence_matrix(hypotheses_per_patient: List[List[DiagnosisResult]]) -> np.ndarray:
+    """Patients x hypotheses confidences, NaN-padded where a patient has fewer hypotheses"""
+    width = max((len(h) for h in hypotheses_per_patient), default=0)
+    matrix = np.full((len(hypotheses_per_patient), width), np.nan)
+    for row, hypotheses in enumerate(hypotheses_per_patient):
+        matrix[row, :len(hypotheses)] = [h.confidence for h in hypotheses]
+    return matrix
+
+def normalized_entropy(confidences: np.ndarray) -> np.ndarray:
+    """
+    Diagnostic uncertainty of every row of a patients x hypotheses matrix
+    
+    Shannon entropy of the row's normalized confidences divided by
+    log2(number of hypotheses), so 0 is certain and 1 is uniform. NaN marks
+    padding; rows without hypotheses or with zero total confidence score 1.0.
+    """
+    confidences = np.atleast_2d(np.asarray(confidences, dtype=np.float64))
+    present = ~np.isnan(confidences)
+    counts = present.sum(axis=1)
+    values = np.where(present, confidences, 0.0)
+    totals = values.sum(axis=1)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probs = values / totals[:, None]
+        terms = np.where(probs > 0, probs * np.log2(probs + 1e-10), 0.0)
+    entropy = -terms.sum(axis=1)
+    max_entropy = np.where(counts > 1, np.log2(np.maximum(counts, 2)), 1.0)
+    
+    return np.where((counts == 0) | (totals == 0), 1.0, entropy / max_entropy)
 
 class FractalAgent(ABC):
     """
@@ -58,16 +126,20 @@ class FractalAgent(ABC):
         name: str,
         depth: int = 0,
         max_depth: int = MAX_FRACTAL_DEPTH,
-        confidence_threshold: float = CONFIDENCE_THRESHOLD
+        confidence_threshold: float = CONFIDENCE_THRESHOLD,
+        depth_policy: Optional[DepthPolicy] = None
     ):
         self.specialty = specialty
         self.name = name
         self.depth = depth
         self.max_depth = max_depth
         self.confidence_threshold = confidence_threshold
-        self.children: List['FractalAgent'] = []
+        # Adjusts max_depth per decision for load, risk and budget (shared by default)
+        self.depth_policy = depth_policy if depth_policy is not None else DEPTH_POLICY
+        # Subspecialty name -> child agent (or None), created on first use
+        self._child_pool: Dict[str, Optional['FractalAgent']] = {}
         
-        logger.info(f"Initialized {self.name} at depth {self.depth}")
+        diagnostics.debug("Initialized {} at depth {}", self.name, self.depth)
     
     async def analyze(self, patient_data: PatientData) -> DiagnosisResult:
         """
@@ -77,29 +149,93 @@ class FractalAgent(ABC):
         2. If uncertain, spawn children
         3. Synthesize results
         """
-        logger.info(f"{self.name} analyzing patient {patient_data.patient_id}")
+        diagnostics.debug("{} analyzing patient {}", self.name, patient_data.patient_id)
         
+        root = _CURRENT_ANALYSIS.get() is None
+        with TRACER.span("analyze", agent=self.name, depth=self.depth, patient_id=str(patient_data.patient_id)), \
+                self.depth_policy.track(self.depth, root):
+            return await self._run_in(self._new_context(patient_data), self._analyze(patient_data))
+    
+    def score_batch(self, hypotheses_per_patient: List[List[DiagnosisResult]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Uncertainty and spawn decision for each patient's hypotheses
+        
+        Returns:
+            (uncertainty per patient, boolean mask of patients whose
+            analysis should spawn child agents)
+        """
+        uncertainty = normalized_entropy(confidence_matrix(hypotheses_per_patient))
+        high_risk = np.array([
+            any(h.risk_level in (RiskLevel.HIGH, RiskLevel.CRITICAL) for h in hypotheses)
+            for hypotheses in hypotheses_per_patient
+        ], dtype=bool)
+        depth_limits = self.depth_policy.depth_limits(self.max_depth, self.depth, high_risk)
+        spawn = (uncertainty > (1 - self.confidence_threshold)) & (self.depth < depth_limits)
+        return uncertainty, spawn
+    
+    def _new_context(self, patient_data: PatientData) -> AnalysisContext:
+        # Nested analyses (children) share their root's memoized child results
+        parent = _CURRENT_ANALYSIS.get()
+        context = AnalysisContext(self.name, patient_data)
+        if parent is not None:
+            context.child_results = parent.child_results
+        if parent is not None and parent.patient_data is patient_data:
+            context.patient_fingerprint = parent.patient_fingerprint
+        else:
+            context.patient_fingerprint = patient_data.fingerprint()
+        return context
+    
+    @staticmethod
+    async def _run_in(context: AnalysisContext, step: Awaitable) -> Any:
+        """Await one analysis step with context as the current analysis"""
+        token = _CURRENT_ANALYSIS.set(context)
+        try:
+            return await step
+        finally:
+            _CURRENT_ANALYSIS.reset(token)
+    
+    @property
+    def context(self) -> AnalysisContext:
+        """Context of the analyze() call in progress"""
+        context = _CURRENT_ANALYSIS.get()
+        if context is None:
+            raise RuntimeError(f"{self.name}: no analysis in progress")
+        return context
+    
+    async def _analyze(self, patient_data: PatientData) -> DiagnosisResult:
         # Generate initial hypotheses
-        hypotheses = await self._generate_hypotheses(patient_data)
+        with TRACER.span("generate_hypotheses", agent=self.name, depth=self.depth):
+            hypotheses = await self._generate_hypotheses(patient_data)
         
-        # Calculate uncertainty (entropy)
-        uncertainty = self._calculate_uncertainty(hypotheses)
+        # Calculate uncertainty (entropy) and whether to spawn children
+        with TRACER.span("uncertainty", agent=self.name, depth=self.depth):
+            uncertainty, spawn = self.score_batch([hypotheses])
         
-        logger.debug(f"{self.name} uncertainty: {uncertainty:.2f}")
+        diagnostics.debug("{} uncertainty: {:.2f}", self.name, uncertainty[0])
         
-        # Spawn children if needed
+        return await self._complete_analysis(patient_data, hypotheses, bool(spawn[0]))
+    
+    async def _complete_analysis(
+        self,
+        patient_data: PatientData,
+        hypotheses: List[DiagnosisResult],
+        needs_children: bool
+    ) -> DiagnosisResult:
+        """Spawn children if needed and synthesize the final result"""
         children_results = []
-        if uncertainty > (1 - self.confidence_threshold) and self.depth < self.max_depth:
-            children_results = await self._spawn_and_analyze_children(patient_data, hypotheses)
+        if needs_children:
+            with TRACER.span("spawn_children", agent=self.name, depth=self.depth):
+                children_results = await self._spawn_and_analyze_children(patient_data, hypotheses)
         
         # Synthesize final result
-        final_result = await self._synthesize_results(hypotheses, children_results, patient_data)
-        final_result.depth = self.depth
-        final_result.children_results = children_results
-        
-        logger.info(
-            f"{self.name} completed: {final_result.diagnosis} "
-            f"(confidence: {final_result.confidence:.2f})"
+        with TRACER.span("synthesize", agent=self.name, depth=self.depth):
+            final_result = await self._synthesize_results(hypotheses, children_results, patient_data)
+        # Copied: the synthesized result may be a (memoized, shared) child result
+        final_result = replace(final_result, depth=self.depth, children_results=children_results)
+        
+        diagnostics.debug(
+            "{} completed: {} (confidence: {:.2f})",
+            self.name, final_result.diagnosis, final_result.confidence
         )
         
         return final_result
@@ -120,25 +256,7 @@ class FractalAgent(ABC):
         
         Higher entropy = more uncertainty = need for sub-agents
         """
-        if not hypotheses:
-            return 1.0
-        
-        # Normalize confidences
-        total_conf = sum(h.confidence for h in hypotheses)
-        if total_conf == 0:
-            return 1.0
-        
-        probs = [h.confidence / total_conf for h in hypotheses]
-        
-        # Calculate entropy
-        import numpy as np
-        entropy = -sum(p * np.log2(p + 1e-10) for p in probs if p > 0)
-        
-        # Normalize to [0, 1]
-        max_entropy = np.log2(len(hypotheses)) if len(hypotheses) > 1 else 1
-        normalized_entropy = entropy / max_entropy if max_entropy > 0 else 0
-        
-        return normalized_entropy
+        return float(normalized_entropy(confidence_matrix([hypotheses]))[0])
     
     async def _spawn_and_analyze_children(
         self, 
@@ -149,15 +267,14 @@ class FractalAgent(ABC):
         
         subspecialties = await self._identify_subspecialties(hypotheses)
         
-        logger.info(f"{self.name} spawning {len(subspecialties)} child agents")
+        diagnostics.debug("{} spawning {} child agents", self.name, len(subspecialties))
         
-        # Create child agents
+        # Pooled child agents, each analyzed at most once per request tree
         tasks = []
         for subspecialty_name in subspecialties:
-            child_agent = self._create_child_agent(subspecialty_name)
+            child_agent = self._get_child_agent(subspecialty_name)
             if child_agent:
-                self.children.append(child_agent)
-                tasks.append(child_agent.analyze(patient_data))
+                tasks.append(self._analyze_child(child_agent, patient_data))
         
         # Run children in parallel
         if tasks:
@@ -167,6 +284,30 @@ class FractalAgent(ABC):
         
         return []
     
+    def _get_child_agent(self, subspecialty_name: str) -> Optional['FractalAgent']:
+        """Pooled child agent for a subspecialty (agents keep no per-call state)"""
+        if subspecialty_name not in self._child_pool:
+            child = self._create_child_agent(subspecialty_name)
+            if child is not None:
+                child.depth_policy = self.depth_policy
+            self._child_pool[subspecialty_name] = child
+        return self._child_pool[subspecialty_name]
+    
+    def _analyze_child(self, child_agent: 'FractalAgent', patient_data: PatientData) -> asyncio.Future:
+        """Child's analysis, started once and shared within the request tree"""
+        context = self.context
+        if context.patient_data is patient_data:
+            fingerprint = context.patient_fingerprint
+        else:
+            fingerprint = patient_data.fingerprint()
+        # Depth is part of the key: a result carries the subtree spawned from its depth
+        key = (child_agent.name, child_agent.depth, fingerprint)
+        future = context.child_results.get(key)
+        if future is None:
+            future = asyncio.ensure_future(child_agent.analyze(patient_data))
+            context.child_results[key] = future
+        return future
+    
     @abstractmethod
     def _create_child_agent(self, subspecialty_name: str) -> Optional['FractalAgent']:
         """Factory method to create child agents"""
@@ -183,39 +324,272 @@ class FractalAgent(ABC):
         pass
     
     def get_tree_structure(self, indent: int = 0) -> str:
-        """Get a string representation of the agent tree"""
+        """Get a string representation of this agent and the child agents it has created"""
         tree = "  " * indent + f"└─ {self.name} (depth={self.depth})\n"
-        for child in self.children:
-            tree += child.get_tree_structure(indent + 1)
+        for child in self._child_pool.values():
+            if child is not None:
+                tree += child.get_tree_structure(indent + 1)
+        return tree
+    
+    @staticmethod
+    def result_tree(result: DiagnosisResult, indent: int = 0) -> str:
+        """Get a string representation of the agent tree behind one analysis result"""
+        tree = "  " * indent + f"└─ {result.agent_name} (depth={result.depth})\n"
+        for child in result.children_results:
+            tree += FractalAgent.result_tree(child, indent + 1)
         return tree
 
 
+# Agents registered in this worker process (MasterOrchestrator executor="process")
+_WORKER_AGENTS: Dict[SpecialtyType, FractalAgent] = {}
+
+def _init_agent_worker(agents: Dict[SpecialtyType, FractalAgent]):
+    _WORKER_AGENTS.clear()
+    _WORKER_AGENTS.update(agents)
+
+def _analyze_in_worker(specialty: SpecialtyType, patient_data: PatientData, budget: Optional[float]) -> DiagnosisResult:
+    with request_budget(budget):
+        return asyncio.run(_WORKER_AGENTS[specialty].analyze(patient_data))
+
+def _analyze_in_thread(agent: FractalAgent, patient_data: PatientData, budget: Optional[float]) -> DiagnosisResult:
+    with request_budget(budget):
+        return asyncio.run(agent.analyze(patient_data))
+
+
 class MasterOrchestrator:
     """
     Top-level orchestrator that routes patients to appropriate specialty agents
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        use_cache: bool = True,
+        cache: Optional[ResultCache] = None,
+        agent_timeout: Optional[float] = AGENT_TIMEOUT_SECONDS,
+        deadline: Optional[float] = ORCHESTRATION_DEADLINE_SECONDS,
+        priority_mode: bool = SAFETY_PRIORITY_MODE,
+        executor: Optional[str] = AGENT_EXECUTOR,
+        max_workers: Optional[int] = AGENT_EXECUTOR_WORKERS,
+        router: Optional[RoutingTable] = None,
+        start_method: Optional[str] = None
+    ):
+        """
+        Args:
+            use_cache: Reuse results for patients seen before
+            cache: Explicit result cache (overrides use_cache)
+            agent_timeout: Seconds each agent may take (None = unbounded)
+            deadline: Seconds per orchestrate() call before the remaining
+                agents are dropped (None = wait for all)
+            priority_mode: Return as soon as the safety agent reports a
+                CRITICAL result, cancelling the agents still running
+            executor: "thread" or "process" to run each agent's analyze() in
+                a pool (processes receive the agents once and a pickled
+                PatientData per call); None runs agents on the event loop
+            max_workers: Pool size (None = CPU count)
+            router: Rule-based agent selection; defaults to a RoutingTable
+                when AGENT_ROUTING is "rules", otherwise every agent runs
+            start_method: multiprocessing start method of the process pool
+                ("fork", "spawn", "forkserver"; None = platform default)
+        """
+        if executor not in (None, "thread", "process"):
+            raise ValueError(f"Unknown agent executor: {executor!r}")
+        
         self.name = "Master Orchestrator"
         self.specialty_agents = {}
+        self.agent_timeout = agent_timeout
+        self.deadline = deadline
+        self.priority_mode = priority_mode
+        self.executor_mode = executor
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None  # Created on first use
+        self.router = router if router is not None else (RoutingTable() if AGENT_ROUTING == "rules" else None)
+        
+        # States and agent results keyed by PatientData.fingerprint()
+        self.cache = cache if cache is not None else (ResultCache() if use_cache else None)
+        
         logger.info("Initialized Master Orchestrator")
     
     def register_agent(self, specialty: SpecialtyType, agent: FractalAgent):
         """Register a specialty agent"""
         self.specialty_agents[specialty] = agent
+        if self.cache is not None:
+            # Cached results were produced by the previous set of agents
+            self.cache.clear()
+        if self.executor_mode == "process":
+            # Worker processes hold copies of the previously registered agents
+            self.close()
         logger.info(f"Registered {agent.name} for {specialty}")
     
-    async def orchestrate(self, patient_data: PatientData) -> AgentState:
+    def close(self):
+        """Shut down the agent executor, if one was started"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def _get_executor(self) -> Optional[Executor]:
+        if self.executor_mode is not None and self._executor is None:
+            if self.executor_mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_agent_worker,
+                    initargs=(dict(self.specialty_agents),)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="agent")
+        return self._executor
+    
+    def _dispatch(self, specialty: SpecialtyType, agent: FractalAgent, patient_data: PatientData) -> Awaitable:
+        """agent.analyze(patient_data) on the event loop or in the executor"""
+        executor = self._get_executor()
+        if executor is None:
+            return agent.analyze(patient_data)
+        
+        # The request budget lives in a ContextVar, which does not cross into the pool
+        loop = asyncio.get_running_loop()
+        budget = remaining_budget()
+        if self.executor_mode == "process":
+            return loop.run_in_executor(executor, _analyze_in_worker, specialty, patient_data, budget)
+        return loop.run_in_executor(executor, _analyze_in_thread, agent, patient_data, budget)
+    
+    async def orchestrate(self, patient_data: PatientData, deadline: Optional[float] = None) -> AgentState:
         """
         Main orchestration logic
         
         1. Analyze patient data
         2. Route to appropriate specialty agents
         3. Collect and synthesize results
+        
+        The safety agent's result is always awaited. Other agents that miss
+        their timeout or the deadline are dropped and the state is returned
+        with partial=True and their names in timed_out_agents. Agents that
+        raise are logged and listed in failed_agents; a failed safety agent
+        also marks the state partial.
+        
+        In priority mode a CRITICAL safety result ends the call early: agents
+        that have not finished are cancelled (listed in preempted_agents) and
+        the state is marked provisional.
+        
+        Args:
+            patient_data: Patient to diagnose
+            deadline: Seconds for this call (defaults to self.deadline)
         """
-        logger.info(f"Orchestrating diagnosis for patient {patient_data.patient_id}")
+        diagnostics.debug("Orchestrating diagnosis for patient {}", patient_data.patient_id)
         
-        # Initialize state
+        with TRACER.span("orchestrate", patient_id=str(patient_data.patient_id)):
+            return await self._orchestrate(patient_data, deadline)
+    
+    async def _orchestrate(self, patient_data: PatientData, deadline: Optional[float]) -> AgentState:
+        fingerprint, cached = self._lookup_state(patient_data)
+        if cached is not None:
+            return cached
+        
+        state, agents = self._prepare_state(patient_data)
+        
+        # Run agents in parallel, bounded by the deadline
+        if agents:
+            results = await self._run_agents(
+                agents, patient_data, state, fingerprint,
+                self.deadline if deadline is None else deadline
+            )
+            state.diagnosis_results = [
+                r for r in results if isinstance(r, DiagnosisResult)
+            ]
+            diagnostics.debug(
+                "Gathered {} results ({} diagnoses): {}",
+                len(results), len(state.diagnosis_results), lambda: self._describe_outcomes(results)
+            )
+        
+        return self._finish(state, fingerprint)
+    
+    async def orchestrate_stream(
+        self,
+        patient_data: PatientData,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[Union[DiagnosisResult, AgentState]]:
+        """
+        Streaming variant of orchestrate()
+        
+        Yields each agent's DiagnosisResult as soon as that agent finishes,
+        then the final synthesized AgentState (the same state orchestrate()
+        would return). Timeouts and the deadline apply as in orchestrate():
+        the safety result is always yielded, other late agents are dropped.
+        In priority mode a CRITICAL safety result is followed directly by the
+        provisional state.
+        
+        Example:
+            async for item in orchestrator.orchestrate_stream(patient):
+                if isinstance(item, DiagnosisResult):
+                    push_to_ui(item)
+                else:
+                    final_state = item
+        """
+        diagnostics.debug("Streaming diagnosis for patient {}", patient_data.patient_id)
+        
+        fingerprint, cached = self._lookup_state(patient_data)
+        if cached is not None:
+            for result in cached.diagnosis_results:
+                yield result
+            yield cached
+            return
+        
+        state, agents = self._prepare_state(patient_data)
+        deadline = self.deadline if deadline is None else deadline
+        
+        if agents:
+            tasks = self._start_agents(agents, patient_data, state, fingerprint, deadline)
+            safety_task = tasks.get(SpecialtyType.SAFETY)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            pending = set(tasks.values())
+            
+            try:
+                while pending:
+                    remaining = None if deadline is None else max(0.0, deadline - (loop.time() - started))
+                    done, pending = await asyncio.wait(
+                        pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not done:
+                        break  # Deadline passed
+                    for task in done:
+                        if task.exception() is None and isinstance(task.result(), DiagnosisResult):
+                            yield task.result()
+                    if safety_task in done and self._preempt_on_critical(safety_task, tasks, agents, state):
+                        break
+                
+                # Past the deadline: drop the rest, but still wait for safety
+                late = [task for task in pending if task is not safety_task]
+                for task in late:
+                    task.cancel()
+                if safety_task in pending:
+                    await asyncio.wait([safety_task])
+                    if safety_task.exception() is None:
+                        yield safety_task.result()
+                if late:
+                    await asyncio.wait(late)
+            finally:
+                # The consumer may stop iterating early
+                for task in tasks.values():
+                    task.cancel()
+            
+            results = self._collect_outcomes(agents, tasks, state, deadline)
+            state.diagnosis_results = [r for r in results if isinstance(r, DiagnosisResult)]
+        
+        yield self._finish(state, fingerprint)
+    
+    def _lookup_state(self, patient_data: PatientData) -> tuple:
+        """(fingerprint, copy of the cached state or None); fingerprint is None without a cache"""
+        fingerprint = patient_data.fingerprint() if self.cache is not None else None
+        if fingerprint is not None:
+            cached = self.cache.get(("state", fingerprint))
+            if cached is not None:
+                diagnostics.debug("Returning cached diagnosis for patient {}", patient_data.patient_id)
+                return fingerprint, self._copy_state(cached, patient_data)
+        return fingerprint, None
+    
+    def _prepare_state(self, patient_data: PatientData) -> tuple:
+        """Fresh state plus the (specialty, agent) pairs to run for this patient"""
         state = AgentState(
             patient_data=patient_data,
             active_agents=[],
@@ -228,42 +602,190 @@ class MasterOrchestrator:
         # Determine which agents to activate
         agents_to_activate = self._route_patient(patient_data)
         
-        logger.info(f"Activating {len(agents_to_activate)} specialty agents")
-        
-        # Run agents in parallel
-        tasks = []
-        for specialty in agents_to_activate:
-            if specialty in self.specialty_agents:
-                agent = self.specialty_agents[specialty]
-                state.active_agents.append(agent.name)
-                tasks.append(agent.analyze(patient_data))
-        
-        # Gather results
-        if tasks:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            print(f"\n[ORCHESTRATOR DEBUG] Gathered {len(results)} results:")
-            for i, r in enumerate(results):
-                print(f"  Result {i}: type={type(r).__name__}")
-                if isinstance(r, DiagnosisResult):
-                    print(f"    -> {r.agent_name}: {r.diagnosis.value} ({r.confidence:.2f})")
-                elif isinstance(r, Exception):
-                    print(f"    -> Exception: {r}")
-            
-            state.diagnosis_results = [
-                r for r in results if isinstance(r, DiagnosisResult)
-            ]
-            print(f"  Filtered: {len(state.diagnosis_results)} DiagnosisResults\n")
-        
-        # Synthesize final diagnosis
-        state = self._synthesize_final_diagnosis(state)
+        diagnostics.debug("Activating {} specialty agents", len(agents_to_activate))
         
-        logger.success(
-            f"Orchestration complete for patient {patient_data.patient_id}. "
-            f"Final confidence: {state.confidence:.2f}"
+        agents = [
+            (specialty, self.specialty_agents[specialty])
+            for specialty in agents_to_activate if specialty in self.specialty_agents
+        ]
+        state.active_agents = [agent.name for _, agent in agents]
+        return state, agents
+    
+    def _finish(self, state: AgentState, fingerprint: Optional[str]) -> AgentState:
+        """Synthesize the final diagnosis and cache complete states"""
+        with TRACER.span("synthesize_final", patient_id=str(state.patient_data.patient_id)):
+            for result in state.diagnosis_results:
+                state.safety_alerts.extend(result.supporting_evidence.get("critical_alerts", []))
+            state = self._synthesize_final_diagnosis(state)
+        
+        if fingerprint is not None and not (state.partial or state.provisional):
+            self.cache.put(("state", fingerprint), self._copy_state(state, state.patient_data))
+        
+        diagnostics.debug(
+            "Orchestration complete for patient {}. Final confidence: {:.2f}",
+            state.patient_data.patient_id, state.confidence
         )
         
         return state
     
+    def _start_agents(
+        self,
+        agents: List[tuple],
+        patient_data: PatientData,
+        state: AgentState,
+        fingerprint: Optional[str],
+        deadline: Optional[float] = None
+    ) -> Dict[SpecialtyType, asyncio.Task]:
+        tasks = {}
+        for specialty, agent in agents:
+            # Tasks copy the budget; safety outlives the deadline, so only its timeout bounds it
+            with request_budget(None if specialty == SpecialtyType.SAFETY else deadline):
+                tasks[specialty] = asyncio.create_task(
+                    self._timed_analyze(specialty, agent, patient_data, state.agent_timings, fingerprint)
+                )
+        return tasks
+    
+    async def _run_agents(
+        self,
+        agents: List[tuple],
+        patient_data: PatientData,
+        state: AgentState,
+        fingerprint: Optional[str],
+        deadline: Optional[float]
+    ) -> List[Any]:
+        """
+        Run agents concurrently: safety first, the rest until the deadline
+        
+        Returns:
+            One entry per agent in order: its DiagnosisResult or the exception
+            it raised (asyncio.TimeoutError for agents that ran out of time)
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = self._start_agents(agents, patient_data, state, fingerprint, deadline)
+        
+        # Safety is never dropped: await it within its own agent timeout only
+        safety_task = tasks.get(SpecialtyType.SAFETY)
+        if safety_task is not None:
+            await asyncio.wait([safety_task])
+            self._preempt_on_critical(safety_task, tasks, agents, state)
+        
+        others = [task for specialty, task in tasks.items() if specialty != SpecialtyType.SAFETY]
+        if others:
+            remaining = None if deadline is None else max(0.0, deadline - (loop.time() - started))
+            _, pending = await asyncio.wait(others, timeout=remaining)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        
+        return self._collect_outcomes(agents, tasks, state, deadline)
+    
+    def _preempt_on_critical(
+        self,
+        safety_task: asyncio.Task,
+        tasks: Dict[SpecialtyType, asyncio.Task],
+        agents: List[tuple],
+        state: AgentState
+    ) -> bool:
+        """In priority mode, cancel unfinished agents once safety reports a CRITICAL result"""
+        if not self.priority_mode or safety_task.cancelled() or safety_task.exception() is not None:
+            return False
+        result = safety_task.result()
+        if not isinstance(result, DiagnosisResult) or result.risk_level != RiskLevel.CRITICAL:
+            return False
+        
+        for specialty, agent in agents:
+            if not tasks[specialty].done():
+                tasks[specialty].cancel()
+                state.preempted_agents.append(agent.name)
+        state.provisional = True
+        logger.critical(
+            f"Critical safety alert ({result.diagnosis.value}) for patient "
+            f"{state.patient_data.patient_id}: returning provisional diagnosis, "
+            f"preempted {state.preempted_agents}"
+        )
+        return True
+    
+    def _collect_outcomes(
+        self,
+        agents: List[tuple],
+        tasks: Dict[SpecialtyType, asyncio.Task],
+        state: AgentState,
+        deadline: Optional[float]
+    ) -> List[Any]:
+        """Finished tasks' outcomes in agent order, recording the agents that ran out of time or failed"""
+        results = []
+        safety_failed = False
+        for specialty, agent in agents:
+            task = tasks[specialty]
+            if task.cancelled() and agent.name in state.preempted_agents:
+                outcome = asyncio.CancelledError(f"{agent.name} preempted by a critical safety alert")
+            elif task.cancelled():
+                outcome = asyncio.TimeoutError(f"{agent.name} missed the {deadline}s deadline")
+            else:
+                outcome = task.exception() or task.result()
+            
+            if isinstance(outcome, asyncio.TimeoutError):
+                state.timed_out_agents.append(agent.name)
+                logger.warning(f"{agent.name} timed out for patient {state.patient_data.patient_id}")
+            elif isinstance(outcome, Exception):
+                state.failed_agents.append(agent.name)
+                safety_failed |= specialty == SpecialtyType.SAFETY
+                logger.error(f"{agent.name} failed for patient {state.patient_data.patient_id}: {outcome!r}")
+            results.append(outcome)
+        
+        state.partial = bool(state.timed_out_agents) or safety_failed
+        return results
+    
+    async def _timed_analyze(
+        self,
+        specialty: SpecialtyType,
+        agent: FractalAgent,
+        patient_data: PatientData,
+        timings: Dict[str, float],
+        fingerprint: Optional[str] = None
+    ) -> DiagnosisResult:
+        """Run one agent (or reuse its cached result), recording its latency in seconds"""
+        start = time.perf_counter()
+        try:
+            key = ("agent", agent.name, fingerprint) if fingerprint is not None else None
+            result = self.cache.get(key) if key is not None else None
+            if result is None:
+                with TRACER.span("agent", agent=agent.name, executor=self.executor_mode or "inline"), \
+                        request_budget(self.agent_timeout):
+                    result = await asyncio.wait_for(
+                        self._dispatch(specialty, agent, patient_data), self.agent_timeout
+                    )
+                if key is not None:
+                    self.cache.put(key, result)
+            return result
+        finally:
+            timings[agent.name] = time.perf_counter() - start
+    
+    @staticmethod
+    def _describe_outcomes(results: List[Any]) -> str:
+        return "; ".join(
+            f"{r.agent_name}: {r.diagnosis.value} ({r.confidence:.2f})" if isinstance(r, DiagnosisResult)
+            else f"{type(r).__name__}: {r}"
+            for r in results
+        )
+    
+    @staticmethod
+    def _copy_state(state: AgentState, patient_data: PatientData) -> AgentState:
+        """Copy of a state whose lists can be changed without touching the cache"""
+        return replace(
+            state,
+            patient_data=patient_data,
+            active_agents=list(state.active_agents),
+            diagnosis_results=list(state.diagnosis_results),
+            safety_alerts=list(state.safety_alerts),
+            agent_timings=dict(state.agent_timings),
+            timed_out_agents=list(state.timed_out_agents),
+            failed_agents=list(state.failed_agents),
+            preempted_agents=list(state.preempted_agents),
+        )
+    
     def _route_patient(self, patient_data: PatientData) -> List[SpecialtyType]:
         """
         Determine which specialty agents to activate based on presentation
@@ -275,12 +797,21 @@ class MasterOrchestrator:
         - Gastroenterology (GERD, esophageal spasm, biliary)
         - Pulmonology (PE, pneumothorax, pneumonia, pleuritis)
         - MSK (costochondritis, muscle strain, rib fracture)
+        
+        With a router, only the specialties its rules select run (safety is
+        always among them); see src/agents/routing.py.
         """
-        # Activate ALL registered specialty agents for comprehensive analysis
-        # This ensures we don't miss diagnoses from any specialty
-        agents = list(self.specialty_agents.keys())
+        if self.router is not None:
+            agents = self.router.route(patient_data, self.specialty_agents)
+        else:
+            # Activate ALL registered specialty agents for comprehensive analysis
+            # This ensures we don't miss diagnoses from any specialty
+            agents = list(self.specialty_agents.keys())
         
-        logger.info(f"Routing patient to {len(agents)} specialty agents: {[a.value for a in agents]}")
+        diagnostics.debug(
+            "Routing patient to {} specialty agents: {}",
+            len(agents), lambda: [getattr(a, "value", a) for a in agents]  # Callers may register plain strings
+        )
         
         return agents
     
@@ -339,6 +870,7 @@ class MasterOrchestrator:
             )
         
         # Top diagnosis
+        state.final_diagnosis = sorted_results[0] if sorted_results else None
         state.confidence = sorted_results[0].confidence if sorted_results else 0.0
         
         return state
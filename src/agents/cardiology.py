@@ -13,9 +13,9 @@ from config import (
     HEART_SCORE_RISK_FACTORS, HEART_SCORE_TROPONIN,
     TROPONIN_NORMAL, TROPONIN_ELEVATED, TROPONIN_HIGH
 )
-from data_loader import PatientData, calculate_troponin_trend
+from data_loader import PatientData
+import diagnostics
 from src.agents.base import FractalAgent, DiagnosisResult
-from loguru import logger
 
 
 class CardiologyAgent(FractalAgent):
@@ -33,8 +33,8 @@ class CardiologyAgent(FractalAgent):
         hypotheses = []
         
         # Get troponin values
-        troponin_values = patient_data.labs.get('Troponin', [])
-        latest_troponin = troponin_values[-1][1] if troponin_values else 0.04
+        troponin_values = patient_data.lab('Troponin')
+        latest_troponin = troponin_values.latest(0.04)
         
         # Check for ACS (acute coronary syndrome)
         if latest_troponin >= TROPONIN_ELEVATED:
@@ -51,7 +51,7 @@ class CardiologyAgent(FractalAgent):
                 ],
                 supporting_evidence={
                     "troponin": latest_troponin,
-                    "trend": calculate_troponin_trend(troponin_values)
+                    "trend": troponin_values.trend()
                 },
                 agent_name=self.name,
                 depth=self.depth
@@ -59,16 +59,18 @@ class CardiologyAgent(FractalAgent):
             hypotheses.append(acs_hypothesis)
         else:
             # Consider stable angina or non-cardiac
+            on_antianginals = patient_data.on_medication('antianginal')
             angina_hypothesis = DiagnosisResult(
                 diagnosis=DiagnosisType.STABLE_ANGINA,
-                confidence=0.3,
-                reasoning="Normal troponin but chest pain warrants evaluation",
+                confidence=0.4 if on_antianginals else 0.3,
+                reasoning="Normal troponin but chest pain warrants evaluation"
+                          + (" (on antianginal therapy)" if on_antianginals else ""),
                 risk_level=RiskLevel.MODERATE,
                 recommendations=[
                     "Stress test",
                     "Outpatient cardiology follow-up"
                 ],
-                supporting_evidence={"troponin": latest_troponin},
+                supporting_evidence={"troponin": latest_troponin, "antianginal_therapy": on_antianginals},
                 agent_name=self.name,
                 depth=self.depth
             )
@@ -146,9 +148,9 @@ class ACSAgent(FractalAgent):
         # Calculate HEART score
         heart_score = self._calculate_heart_score(patient_data)
         
-        troponin_values = patient_data.labs.get('Troponin', [])
-        latest_troponin = troponin_values[-1][1] if troponin_values else 0.04
-        troponin_trend = calculate_troponin_trend(troponin_values)
+        troponin_values = patient_data.lab('Troponin')
+        latest_troponin = troponin_values.latest(0.04)
+        troponin_trend = troponin_values.trend()
         
         # NSTEMI: Elevated troponin without ST elevation
         if latest_troponin >= TROPONIN_ELEVATED:
@@ -235,15 +237,14 @@ class ACSAgent(FractalAgent):
             score += 1
         
         # Troponin
-        troponin_values = patient_data.labs.get('Troponin', [])
-        latest_troponin = troponin_values[-1][1] if troponin_values else 0.04
+        latest_troponin = patient_data.latest_lab('Troponin', 0.04)
         
         if latest_troponin >= (3 * TROPONIN_NORMAL):
             score += 2
         elif latest_troponin >= TROPONIN_NORMAL:
             score += 1
         
-        logger.debug(f"Calculated HEART score: {score}")
+        diagnostics.debug("Calculated HEART score: {}", score)
         return score
     
     async def _identify_subspecialties(self, hypotheses: List[DiagnosisResult]) -> List[str]:
@@ -0,0 +1,214 @@
+"""
+Adaptive fractal depth
+
+FractalAgent spawns children while the normalized entropy of its hypotheses
+is above 1 - CONFIDENCE_THRESHOLD and its depth is below a depth limit. With
+a static limit (MAX_FRACTAL_DEPTH) every extra level of recursion is paid for
+regardless of load, so latency explodes under backpressure. DepthPolicy
+computes the limit per decision instead:
+
+- load: the number of root analyses in flight against `capacity`; at
+  `backpressure` x capacity the limit drops one level, at capacity it drops
+  to `min_depth`
+- risk: patients with a HIGH/CRITICAL hypothesis get `risk_boost` extra levels
+- budget: if the request's remaining time (see request_budget) is less than
+  the observed mean cost of an analysis one level deeper, the agent stops
+  spawning
+
+While the policy is enabled every analysis is timed per depth
+(DepthPolicy.stats()); the mean per-depth cost feeds the budget check. A
+disabled policy does no timing or locking, so the default path costs one
+attribute check per analysis.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import (
+    ADAPTIVE_DEPTH, DEPTH_POLICY_CAPACITY, DEPTH_POLICY_BACKPRESSURE,
+    DEPTH_POLICY_MIN_DEPTH, DEPTH_POLICY_RISK_BOOST
+)
+
+# perf_counter() time by which the current request must finish
+_REQUEST_DEADLINE: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+_TIMING_WINDOW = 1024  # Analyses kept per depth for percentiles
+
+
+@contextmanager
+def request_budget(seconds: Optional[float]):
+    """Give the analyses started inside this block `seconds` of compute (None = unbounded)"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.perf_counter() + seconds
+    current = _REQUEST_DEADLINE.get()
+    token = _REQUEST_DEADLINE.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _REQUEST_DEADLINE.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current request's budget, or None if unbounded"""
+    deadline = _REQUEST_DEADLINE.get()
+    return None if deadline is None else deadline - time.perf_counter()
+
+
+class DepthPolicy:
+    """Per-decision depth limit from load, patient risk and the request budget"""
+
+    def __init__(
+        self,
+        enabled: bool = ADAPTIVE_DEPTH,
+        capacity: int = DEPTH_POLICY_CAPACITY,
+        backpressure: float = DEPTH_POLICY_BACKPRESSURE,
+        min_depth: int = DEPTH_POLICY_MIN_DEPTH,
+        risk_boost: int = DEPTH_POLICY_RISK_BOOST
+    ):
+        """
+        Args:
+            enabled: Apply the adaptive limits and record per-depth timings
+            capacity: Concurrent root analyses at which depth drops to min_depth
+            backpressure: Fraction of capacity at which depth drops one level
+            min_depth: Lowest limit load can impose (0 = never spawn)
+            risk_boost: Extra levels for patients with HIGH/CRITICAL hypotheses
+        """
+        self.enabled = enabled
+        self.capacity = capacity
+        self.backpressure = backpressure
+        self.min_depth = min_depth
+        self.risk_boost = risk_boost
+
+        self.in_flight = 0
+        self.decisions: Dict[str, int] = {"load": 0, "risk": 0, "budget": 0}
+        self._timings: Dict[int, Deque[float]] = {}
+        self._counts: Dict[int, int] = {}
+        self._totals: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, depth: int, root: bool):
+        """Time one analysis at depth; root analyses count towards load"""
+        if not self.enabled:
+            yield
+            return
+        if root:
+            with self._lock:
+                self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if root:
+                    self.in_flight -= 1
+                self._timings.setdefault(depth, deque(maxlen=_TIMING_WINDOW)).append(elapsed)
+                self._counts[depth] = self._counts.get(depth, 0) + 1
+                self._totals[depth] = self._totals.get(depth, 0.0) + elapsed
+
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.capacity if self.capacity else 0.0
+
+    def mean_cost(self, depth: int) -> float:
+        """Mean seconds of an analysis at depth (0 before any was timed)"""
+        with self._lock:
+            return self._mean_cost(depth)
+
+    def _mean_cost(self, depth: int) -> float:
+        # Caller holds _lock
+        count = self._counts.get(depth, 0)
+        return self._totals[depth] / count if count else 0.0
+
+    def depth_limits(self, max_depth: int, depth: int, high_risk: np.ndarray) -> np.ndarray:
+        """
+        Depth limit for each patient of a decision made at `depth`
+
+        Args:
+            max_depth: The agent's static limit
+            depth: Depth of the deciding agent
+            high_risk: Boolean per patient, any HIGH/CRITICAL hypothesis
+
+        Returns:
+            Integer limits; the agent spawns children where depth < limit
+        """
+        high_risk = np.asarray(high_risk, dtype=bool)
+        if not self.enabled:
+            return np.full(high_risk.shape, max_depth)
+
+        reasons = []
+        load = self.load
+        limit = max_depth
+        if load >= 1.0:
+            limit = min(limit, self.min_depth)
+        elif load >= self.backpressure:
+            limit = max(min(limit, self.min_depth), limit - 1)
+        if limit < max_depth:
+            reasons.append("load")
+
+        limits = np.where(high_risk, limit + self.risk_boost, limit)
+        if self.risk_boost and high_risk.any():
+            reasons.append("risk")
+
+        remaining = remaining_budget()
+        if remaining is not None and remaining < self.mean_cost(depth + 1):
+            # No time for another level: stop spawning from this depth
+            limits = np.minimum(limits, depth)
+            reasons.append("budget")
+
+        if reasons:
+            with self._lock:
+                for reason in reasons:
+                    self.decisions[reason] += 1
+        return limits
+
+    def stats(self) -> Dict[int, Dict[str, float]]:
+        """{depth: {"count", "mean_ms", "p50_ms", "p90_ms", "p99_ms"}} over recent analyses"""
+        with self._lock:
+            return {
+                depth: {
+                    "count": self._counts[depth],
+                    "mean_ms": self._mean_cost(depth) * 1000,
+                    **{f"p{q}_ms": float(np.percentile(values, q)) * 1000 for q in (50, 90, 99)},
+                }
+                for depth, values in sorted(self._timings.items())
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._timings.clear()
+            self._counts.clear()
+            self._totals.clear()
+            self.decisions = {key: 0 for key in self.decisions}
+
+    def __getstate__(self):
+        # Locks cannot be pickled (agents carry the policy into process pools);
+        # a worker has no analyses in flight of its own yet
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["in_flight"] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"DepthPolicy(enabled={self.enabled}, in_flight={self.in_flight}, load={self.load:.2f})"
+
+
+# Process-wide policy shared by all agents (load is a property of the process)
+DEPTH_POLICY = DepthPolicy()
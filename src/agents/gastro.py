@@ -144,26 +144,26 @@ class GastroenterologyAgent(FractalAgent):
         
         # Check labs for GI-relevant markers
         if 'Lipase' in patient_data.labs:
-            lipase_values = patient_data.labs['Lipase']
-            latest_lipase = lipase_values[-1][1] if lipase_values else 0
+            latest_lipase = patient_data.latest_lab('Lipase', 0)
             if latest_lipase > 180:  # > 3x ULN suggests pancreatitis
                 features['elevated_lipase'] = latest_lipase
         
         if 'Amylase' in patient_data.labs:
-            amylase_values = patient_data.labs['Amylase']
-            latest_amylase = amylase_values[-1][1] if amylase_values else 0
+            latest_amylase = patient_data.latest_lab('Amylase', 0)
             if latest_amylase > 300:
                 features['elevated_amylase'] = latest_amylase
         
         if 'ALT' in patient_data.labs or 'AST' in patient_data.labs:
-            alt_values = patient_data.labs.get('ALT', [(0, 0)])
-            ast_values = patient_data.labs.get('AST', [(0, 0)])
-            latest_alt = alt_values[-1][1] if alt_values else 0
-            latest_ast = ast_values[-1][1] if ast_values else 0
+            latest_alt = patient_data.latest_lab('ALT', 0)
+            latest_ast = patient_data.latest_lab('AST', 0)
             
             if latest_alt > 200 or latest_ast > 200:
                 features['transaminitis'] = True
         
+        # Acid suppression prescribed during the admission
+        if patient_data.on_medication('acid_suppression'):
+            features['on_acid_suppression'] = True
+        
         return features
     
     def _calculate_gerd_score(self, features: Dict, patient_data: PatientData) -> float:
@@ -190,6 +190,8 @@ class GastroenterologyAgent(FractalAgent):
             score += 0.25
         if features.get('history_gerd'):
             score += 0.30
+        if features.get('on_acid_suppression'):
+            score += 0.10
         
         # Age factor (GERD more common in middle age)
         age = features.get('age', 50)
@@ -216,9 +218,8 @@ class GastroenterologyAgent(FractalAgent):
             score += 0.15
         
         # If cardiac workup negative, consider esophageal
-        troponin_values = patient_data.labs.get('Troponin', [])
-        if troponin_values:
-            latest_troponin = troponin_values[-1][1]
+        latest_troponin = patient_data.latest_lab('Troponin')
+        if latest_troponin is not None:
             if latest_troponin < 0.04:  # Normal troponin
                 score += 0.20
         
@@ -286,8 +287,7 @@ class GastroenterologyAgent(FractalAgent):
         # Check for Murphy's sign in physical exam (if available)
         # Check for elevated WBC (cholecystitis)
         if 'WBC' in patient_data.labs:
-            wbc_values = patient_data.labs['WBC']
-            latest_wbc = wbc_values[-1][1] if wbc_values else 0
+            latest_wbc = patient_data.latest_lab('WBC', 0)
             if latest_wbc > 11:
                 score += 0.15
         
@@ -138,8 +138,7 @@ class MusculoskeletalAgent(FractalAgent):
         
         # Check for normal cardiac biomarkers (suggests non-cardiac)
         if 'Troponin' in patient_data.labs:
-            troponin_values = patient_data.labs['Troponin']
-            latest_troponin = troponin_values[-1][1] if troponin_values else 0
+            latest_troponin = patient_data.latest_lab('Troponin', 0)
             if latest_troponin < 0.04:  # Normal
                 features['normal_troponin'] = True
         
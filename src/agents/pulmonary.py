@@ -9,7 +9,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config import (
-    SpecialtyType, DiagnosisType, RiskLevel
+    SpecialtyType, DiagnosisType, RiskLevel, RESPIRATORY_SPECIMENS
 )
 from data_loader import PatientData
 from src.agents.base import FractalAgent, DiagnosisResult
@@ -135,18 +135,27 @@ class PulmonaryAgent(FractalAgent):
         
         # Check labs
         if 'WBC' in patient_data.labs:
-            wbc_values = patient_data.labs['WBC']
-            latest_wbc = wbc_values[-1][1] if wbc_values else 7.5
+            latest_wbc = patient_data.latest_lab('WBC', 7.5)
             if latest_wbc > 12:  # Leukocytosis
                 features['elevated_wbc'] = True
                 features['infection_likely'] = True
         
         if 'D-dimer' in patient_data.labs:
-            ddimer_values = patient_data.labs['D-dimer']
-            latest_ddimer = ddimer_values[-1][1] if ddimer_values else 0
+            latest_ddimer = patient_data.latest_lab('D-dimer', 0)
             if latest_ddimer > 500:  # Elevated
                 features['elevated_ddimer'] = True
         
+        # Admission timeline: positive respiratory cultures and anticoagulation
+        # (urine/blood isolates and contaminants say nothing about pneumonia)
+        if any(
+            specimen in culture.lower()
+            for culture in patient_data.microbiology for specimen in RESPIRATORY_SPECIMENS
+        ):
+            features['positive_culture'] = True
+            features['infection_likely'] = True
+        if patient_data.on_medication('anticoagulant'):
+            features['anticoagulated'] = True
+        
         # Infer from chief complaint
         if hasattr(patient_data, 'chief_complaint') and patient_data.chief_complaint:
             complaint = patient_data.chief_complaint.lower()
@@ -211,6 +220,10 @@ class PulmonaryAgent(FractalAgent):
         if features.get('elevated_ddimer'):
             score += 0.20
         
+        # Anticoagulation started during the admission (treated VTE)
+        if features.get('anticoagulated'):
+            score += 0.10
+        
         # Age > 60 increases risk
         if features.get('age', 50) > 60:
             score += 0.10
@@ -292,6 +305,10 @@ class PulmonaryAgent(FractalAgent):
         if features.get('elevated_wbc'):
             score += 0.25
         
+        # Organism grown in culture
+        if features.get('positive_culture'):
+            score += 0.15
+        
         # Tachypnea
         if features.get('tachypnea'):
             score += 0.15
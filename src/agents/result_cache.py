@@ -0,0 +1,78 @@
+"""
+LRU/TTL cache for orchestrator results
+
+MasterOrchestrator keys whole AgentStates and individual agents'
+DiagnosisResults by PatientData.fingerprint(), so re-running the same
+patient (a UI rerun, a re-uploaded report) skips the agents entirely.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS
+
+
+class ResultCache:
+    """Least-recently-used cache whose entries also expire after ttl seconds"""
+
+    def __init__(
+        self,
+        maxsize: int = RESULT_CACHE_SIZE,
+        ttl: Optional[float] = RESULT_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            maxsize: Entries kept before the least recently used is evicted
+            ttl: Seconds an entry stays valid (None never expires)
+            clock: Time source, injectable for tests
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value, or None on a miss or expired entry"""
+        entry = self._entries.get(key)
+        if entry is not None and (self.ttl is None or entry[0] > self.clock()):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        expires = self.clock() + self.ttl if self.ttl is not None else float("inf")
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"ResultCache({self.stats()})"
@@ -0,0 +1,197 @@
+"""
+Declarative agent routing
+
+Compiles config.ROUTING_RULES once into lookup structures so selecting the
+agents for a patient costs a regex scan of the chief complaint, one trie walk
+per ICD code and a few vital sign comparisons:
+
+- complaint phrases -> one alternation regex plus {phrase: rule bits}
+- ICD prefixes -> an ICDPrefixMatcher whose categories are rule bitmasks
+  (each prefix also carries the bits of its shorter prefixes, so the longest
+  match yields every rule that matches), looked up with each code's version
+  (every version when PatientData.icd_versions is missing)
+- vital ranges -> (vital, low, high, rule bits) tuples
+
+The fired rules' specialties are unioned into the selection. RoutingStats
+counts how much agent work the routing skipped.
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Sequence
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import ROUTING_RULES, SpecialtyType
+from data_loader import PatientData
+from icd_matcher import ICDPrefixMatcher, normalize_icd_code
+
+
+@dataclass
+class RoutingStats:
+    """How much agent work routing skipped"""
+    patients: int = 0
+    fallbacks: int = 0  # Patients no rule fired for (all agents ran)
+    candidate_runs: int = 0  # Agent runs without routing
+    selected_runs: int = 0
+    skipped: Dict[str, int] = field(default_factory=dict)  # Specialty -> patients skipped
+    rule_hits: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def skipped_runs(self) -> int:
+        return self.candidate_runs - self.selected_runs
+
+    @property
+    def skip_rate(self) -> float:
+        return self.skipped_runs / self.candidate_runs if self.candidate_runs else 0.0
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "patients": self.patients,
+            "fallbacks": self.fallbacks,
+            "candidate_runs": self.candidate_runs,
+            "selected_runs": self.selected_runs,
+            "skipped_runs": self.skipped_runs,
+            "skip_rate": self.skip_rate,
+            "skipped": dict(self.skipped),
+            "rule_hits": dict(self.rule_hits),
+        }
+
+
+class RoutingTable:
+    """Rules compiled into a predicate index that picks the agents for a patient"""
+
+    def __init__(self, rules: Sequence[dict] = ROUTING_RULES):
+        """
+        Args:
+            rules: Rule dicts with "name", "route" (specialty values) and any
+                of "complaints", "icd_prefixes", "vitals" (see config.ROUTING_RULES)
+        """
+        self.rules = list(rules)
+        self.rule_names = [rule["name"] for rule in self.rules]
+        self.stats = RoutingStats()
+        self._lock = threading.Lock()
+
+        # Specialties each rule routes to, and every specialty some rule governs
+        self._routes = [frozenset(SpecialtyType(s) for s in rule["route"]) for rule in self.rules]
+        self.routed_specialties = frozenset().union(*self._routes)
+
+        complaint_bits: Dict[str, int] = {}
+        prefix_bits: Dict[int, Dict[str, int]] = {}
+        self._vital_checks = []
+
+        for index, rule in enumerate(self.rules):
+            bit = 1 << index
+            for phrase in rule.get("complaints", []):
+                phrase = phrase.lower()
+                complaint_bits[phrase] = complaint_bits.get(phrase, 0) | bit
+            for version, prefixes in rule.get("icd_prefixes", {}).items():
+                by_prefix = prefix_bits.setdefault(int(version), {})
+                for prefix in prefixes:
+                    prefix = normalize_icd_code(prefix)
+                    by_prefix[prefix] = by_prefix.get(prefix, 0) | bit
+            for vital, (low, high) in rule.get("vitals", {}).items():
+                self._vital_checks.append((
+                    vital,
+                    float("-inf") if low is None else low,
+                    float("inf") if high is None else high,
+                    bit,
+                ))
+
+        # Longest phrase first so overlapping phrases prefer the specific one
+        phrases = sorted(complaint_bits, key=len, reverse=True)
+        self._complaint_bits = complaint_bits
+        self._complaint_pattern = (
+            re.compile(r"\b(?:" + "|".join(map(re.escape, phrases)) + r")\b") if phrases else None
+        )
+
+        categories: Dict[int, Dict[int, List[str]]] = {}
+        for version, by_prefix in prefix_bits.items():
+            for prefix in by_prefix:
+                bits = 0
+                for other, other_bits in by_prefix.items():
+                    if prefix.startswith(other):
+                        bits |= other_bits
+                categories.setdefault(bits, {}).setdefault(version, []).append(prefix)
+        self._icd_matcher = ICDPrefixMatcher(categories)
+
+    def fired_rules(self, patient_data: PatientData) -> int:
+        """Bitmask of the rules that match the patient (bit i = rules[i])"""
+        bits = 0
+
+        if self._complaint_pattern is not None and patient_data.chief_complaint:
+            for match in self._complaint_pattern.finditer(patient_data.chief_complaint.lower()):
+                bits |= self._complaint_bits[match.group(0)]
+
+        codes, versions = patient_data.icd_codes, patient_data.icd_versions
+        if len(versions) == len(codes):
+            for code, version in zip(codes, versions):
+                bits |= self._icd_matcher.match(code, version) or 0
+        else:
+            # Unknown versions: a code may fire rules from any version
+            for code in codes:
+                for version in self._icd_matcher.versions:
+                    bits |= self._icd_matcher.match(code, version) or 0
+
+        vitals = patient_data.vitals
+        for vital, low, high, bit in self._vital_checks:
+            value = vitals.get(vital)
+            if value is not None and low <= value < high:
+                bits |= bit
+
+        return bits
+
+    def explain(self, patient_data: PatientData) -> List[str]:
+        """Names of the rules that fire for the patient"""
+        bits = self.fired_rules(patient_data)
+        return [name for index, name in enumerate(self.rule_names) if bits >> index & 1]
+
+    def route(self, patient_data: PatientData, registered: Iterable[SpecialtyType]) -> List[SpecialtyType]:
+        """
+        Registered specialties to run for the patient, in registration order
+
+        Safety and specialties no rule routes to always run; if no rule
+        fires every registered specialty runs.
+        """
+        registered = list(registered)
+        bits = self.fired_rules(patient_data)
+
+        selected = set()
+        for index, specialties in enumerate(self._routes):
+            if bits >> index & 1:
+                selected |= specialties
+
+        fallback = not selected
+        agents = [
+            specialty for specialty in registered
+            if fallback
+            or specialty in selected
+            or specialty == SpecialtyType.SAFETY
+            or specialty not in self.routed_specialties
+        ]
+        self._record(registered, agents, bits, fallback)
+        return agents
+
+    def _record(self, registered: List[SpecialtyType], agents: List[SpecialtyType], bits: int, fallback: bool):
+        with self._lock:
+            stats = self.stats
+            stats.patients += 1
+            stats.fallbacks += fallback
+            stats.candidate_runs += len(registered)
+            stats.selected_runs += len(agents)
+            for specialty in set(registered) - set(agents):
+                key = getattr(specialty, "value", specialty)  # Agents may be registered under plain strings
+                stats.skipped[key] = stats.skipped.get(key, 0) + 1
+            for index, name in enumerate(self.rule_names):
+                if bits >> index & 1:
+                    stats.rule_hits[name] = stats.rule_hits.get(name, 0) + 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = RoutingStats()
+
+    def __repr__(self) -> str:
+        return f"RoutingTable({len(self.rules)} rules, skip_rate={self.stats.skip_rate:.1%})"
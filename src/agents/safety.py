@@ -12,7 +12,7 @@ from config import (
     SpecialtyType, DiagnosisType, RiskLevel,
     TROPONIN_HIGH, CRITICAL_ALERTS
 )
-from data_loader import PatientData, calculate_troponin_trend
+from data_loader import PatientData
 from src.agents.base import FractalAgent, DiagnosisResult
 from loguru import logger
 
@@ -29,7 +29,6 @@ class SafetyMonitorAgent(FractalAgent):
             name="Safety Monitor",
             depth=0
         )
-        self.critical_alerts = []
     
     async def _generate_hypotheses(self, patient_data: PatientData) -> List[DiagnosisResult]:
         """Check for life-threatening conditions"""
@@ -39,19 +38,19 @@ class SafetyMonitorAgent(FractalAgent):
         stemi_result = self._check_stemi(patient_data)
         if stemi_result:
             hypotheses.append(stemi_result)
-            self.critical_alerts.append("STEMI_ALERT")
+            self.context.alerts.append("STEMI_ALERT")
         
         # Check for massive PE
         pe_result = self._check_massive_pe(patient_data)
         if pe_result:
             hypotheses.append(pe_result)
-            self.critical_alerts.append("MASSIVE_PE_ALERT")
+            self.context.alerts.append("MASSIVE_PE_ALERT")
         
         # Check for sepsis
         sepsis_result = self._check_sepsis(patient_data)
         if sepsis_result:
             hypotheses.append(sepsis_result)
-            self.critical_alerts.append("SEPSIS_ALERT")
+            self.context.alerts.append("SEPSIS_ALERT")
         
         return hypotheses
     
@@ -62,12 +61,12 @@ class SafetyMonitorAgent(FractalAgent):
         - Chest pain
         - (In production: ST elevation on EKG)
         """
-        troponin_values = patient_data.labs.get('Troponin', [])
+        troponin_values = patient_data.lab('Troponin')
         if not troponin_values:
             return None
         
-        latest_troponin = troponin_values[-1][1]
-        troponin_trend = calculate_troponin_trend(troponin_values)
+        latest_troponin = troponin_values.latest()
+        troponin_trend = troponin_values.trend()
         
         # STEMI if very high troponin + rising
         if latest_troponin >= TROPONIN_HIGH and troponin_trend == "rising":
@@ -207,8 +206,10 @@ class SafetyMonitorAgent(FractalAgent):
     ) -> DiagnosisResult:
         """Return highest priority critical alert"""
         if hypotheses:
-            # Return most critical
-            return max(hypotheses, key=lambda x: x.confidence)
+            # Return most critical, carrying every alert raised by this call
+            result = max(hypotheses, key=lambda x: x.confidence)
+            result.supporting_evidence["critical_alerts"] = list(self.context.alerts)
+            return result
         
         # No critical alerts
         return DiagnosisResult(
@@ -217,15 +218,17 @@ class SafetyMonitorAgent(FractalAgent):
             reasoning="No critical safety alerts",
             risk_level=RiskLevel.LOW,
             recommendations=["Continue standard workup"],
-            supporting_evidence={},
+            supporting_evidence={"critical_alerts": []},
             agent_name=self.name,
             depth=self.depth
         )
     
-    def has_critical_alerts(self) -> bool:
-        """Check if any critical alerts were raised"""
-        return len(self.critical_alerts) > 0
+    @staticmethod
+    def has_critical_alerts(result: DiagnosisResult) -> bool:
+        """Check if any critical alerts were raised in the analysis behind result"""
+        return bool(result.supporting_evidence.get("critical_alerts"))
     
-    def get_alerts(self) -> List[str]:
-        """Get list of critical alerts"""
-        return self.critical_alerts.copy()
+    @staticmethod
+    def get_alerts(result: DiagnosisResult) -> List[str]:
+        """Get list of critical alerts raised in the analysis behind result"""
+        return list(result.supporting_evidence.get("critical_alerts", []))
@@ -0,0 +1,213 @@
+"""
+Span tracing for the fractal agent tree
+
+FractalAgent and MasterOrchestrator wrap each phase of an analysis
+(hypothesis generation, uncertainty, child spawning, synthesis) in
+TRACER.span(...). While tracing is disabled span() returns a shared no-op
+context manager, so the instrumentation costs one method call per phase.
+
+Usage:
+    from src.agents.tracing import TRACER
+
+    TRACER.enable(track_allocations=True)
+    state = await orchestrator.orchestrate(patient)
+    TRACER.export_chrome_trace("trace.json")   # open in chrome://tracing or Perfetto
+    records = TRACER.to_otel()                  # OpenTelemetry-style span dicts
+
+Spans recorded inside executor="process" workers stay in those processes.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import TRACE_AGENTS, TRACE_MAX_SPANS
+
+
+@dataclass
+class Span:
+    """One timed phase of an agent's (or the orchestrator's) work"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int  # time.time_ns() at entry
+    wall: float = 0.0  # Seconds
+    cpu: float = 0.0  # Thread CPU seconds (includes other tasks interleaved on the loop)
+    alloc_bytes: Optional[int] = None  # Net traced memory change, when allocations are tracked
+    thread_id: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+# Span open in the current task; asyncio copies it into child tasks
+_CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _NullSpan:
+    """Context manager used while tracing is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("tracer", "span", "token", "start", "cpu_start", "mem_start")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        parent = _CURRENT_SPAN.get()
+        self.span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent is not None else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent is not None else None,
+            start_ns=0,
+            thread_id=threading.get_ident(),
+            attributes=attributes,
+        )
+
+    def __enter__(self) -> Span:
+        self.token = _CURRENT_SPAN.set(self.span)
+        self.mem_start = tracemalloc.get_traced_memory()[0] if self.tracer.track_allocations else None
+        self.span.start_ns = time.time_ns()
+        self.cpu_start = time.thread_time()
+        self.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        span.wall = time.perf_counter() - self.start
+        span.cpu = time.thread_time() - self.cpu_start
+        if self.mem_start is not None:
+            span.alloc_bytes = tracemalloc.get_traced_memory()[0] - self.mem_start
+        if exc_type is not None:
+            span.error = exc_type.__name__
+        _CURRENT_SPAN.reset(self.token)
+        self.tracer.spans.append(span)
+        return False
+
+
+class Tracer:
+    """Collects spans while enabled"""
+
+    def __init__(self, enabled: bool = TRACE_AGENTS, max_spans: int = TRACE_MAX_SPANS):
+        """
+        Args:
+            enabled: Record spans from the start
+            max_spans: Spans kept; the oldest are dropped beyond this
+        """
+        self.enabled = enabled
+        self.track_allocations = False
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def span(self, name: str, **attributes):
+        """Context manager timing one phase; attributes are stored on the span"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _ActiveSpan(self, name, attributes)
+
+    def enable(self, track_allocations: bool = False):
+        """
+        Start recording spans
+
+        Args:
+            track_allocations: Also record net allocated bytes per span
+                (starts tracemalloc, which slows Python down noticeably)
+        """
+        self.enabled = True
+        self.track_allocations = track_allocations
+        if track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.track_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.track_allocations = False
+
+    def clear(self):
+        self.spans.clear()
+
+    def summary(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """{(agent, span name): {"count", "wall", "cpu"}} totals over the recorded spans"""
+        totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for span in self.spans:
+            key = (span.attributes.get("agent", ""), span.name)
+            entry = totals.setdefault(key, {"count": 0, "wall": 0.0, "cpu": 0.0})
+            entry["count"] += 1
+            entry["wall"] += span.wall
+            entry["cpu"] += span.cpu
+        return totals
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Spans as Chrome trace "complete" events (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = dict(span.attributes, cpu_ms=span.cpu * 1000)
+            if span.alloc_bytes is not None:
+                args["alloc_bytes"] = span.alloc_bytes
+            if span.error is not None:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": str(span.attributes.get("agent", "orchestrator")),
+                "ph": "X",
+                "ts": span.start_ns / 1000,
+                "dur": span.wall * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_chrome_trace(), default=str))
+        return path
+
+    def to_otel(self) -> List[Dict[str, Any]]:
+        """Spans as OpenTelemetry-style records (OTLP JSON field names)"""
+        records = []
+        for span in self.spans:
+            attributes = dict(span.attributes, cpu_seconds=span.cpu)
+            if span.alloc_bytes is not None:
+                attributes["alloc_bytes"] = span.alloc_bytes
+            records.append({
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "startTimeUnixNano": span.start_ns,
+                "endTimeUnixNano": span.start_ns + int(span.wall * 1e9),
+                "attributes": attributes,
+                "status": {"code": "ERROR", "message": span.error} if span.error else {"code": "OK"},
+            })
+        return records
+
+    def __repr__(self) -> str:
+        return f"Tracer(enabled={self.enabled}, {len(self.spans)} spans)"
+
+
+# Process-wide tracer used by the agents
+TRACER = Tracer()
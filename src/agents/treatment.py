@@ -208,11 +208,11 @@ class TreatmentAgent(FractalAgent):
             contraindications.append("advanced_age")
         
         # Check renal function (if creatinine available)
-        if patient.labs and patient.labs.get('creatinine', 0) > 2.0:
+        if patient.latest_lab('Creatinine', 0) > 2.0:
             contraindications.append("renal_impairment")
         
         # Check platelets
-        if patient.labs and patient.labs.get('platelets', 200) < 50:
+        if patient.latest_lab('Platelet Count', 200) < 50:
             contraindications.append("severe_thrombocytopenia")
         
         # Check blood pressure
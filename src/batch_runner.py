@@ -0,0 +1,300 @@
+"""
+Batch diagnosis runner over the MIMIC-IV cohort
+
+Runs MasterOrchestrator.orchestrate for many admissions, fanned out across
+worker processes (each with its own loader and registered agents), streams
+one record per admission to a JSONL or Parquet file, and reports throughput
+and per-agent latency percentiles.
+
+Usage:
+    python src/batch_runner.py --output results.jsonl --jobs 4
+    python src/batch_runner.py --output results.parquet --limit 500 --cohort all
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import diagnostics
+from config import SpecialtyType
+from data_loader import MIMICDataLoader, PatientData
+from src.agents.base import AgentState, DiagnosisResult, MasterOrchestrator
+from src.agents.cardiology import CardiologyAgent
+from src.agents.gastro import GastroenterologyAgent
+from src.agents.musculoskeletal import MusculoskeletalAgent
+from src.agents.pulmonary import PulmonaryAgent
+from src.agents.safety import SafetyMonitorAgent
+
+LATENCY_PERCENTILES = (50, 90, 99)
+_NESTED_FIELDS = (
+    "final_diagnosis", "results", "active_agents", "safety_alerts", "agent_timings", "timed_out_agents",
+    "failed_agents", "preempted_agents"
+)
+
+# Per-process state, set by _init_worker
+_WORKER_LOADER: Optional[MIMICDataLoader] = None
+_WORKER_ORCHESTRATOR: Optional[MasterOrchestrator] = None
+
+
+def build_orchestrator(use_cache: bool = True, **options) -> MasterOrchestrator:
+    """Orchestrator with the chest pain specialty agents registered (options go to MasterOrchestrator)"""
+    orchestrator = MasterOrchestrator(use_cache=use_cache, **options)
+    orchestrator.register_agent(SpecialtyType.SAFETY, SafetyMonitorAgent())
+    orchestrator.register_agent(SpecialtyType.CARDIOLOGY, CardiologyAgent())
+    orchestrator.register_agent(SpecialtyType.GASTROENTEROLOGY, GastroenterologyAgent())
+    orchestrator.register_agent(SpecialtyType.PULMONARY, PulmonaryAgent())
+    orchestrator.register_agent(SpecialtyType.MUSCULOSKELETAL, MusculoskeletalAgent())
+    return orchestrator
+
+
+def _result_record(result: Optional[DiagnosisResult]) -> Optional[Dict[str, Any]]:
+    if result is None:
+        return None
+    return {
+        "agent": result.agent_name,
+        "diagnosis": result.diagnosis.value,
+        "confidence": round(float(result.confidence), 4),
+        "risk_level": result.risk_level.value,
+        "depth": result.depth,
+    }
+
+
+def state_to_record(state: AgentState, elapsed: float) -> Dict[str, Any]:
+    """Flatten an AgentState into one JSON-serializable output row"""
+    patient = state.patient_data
+    return {
+        "hadm_id": int(patient.hadm_id),
+        "patient_id": int(patient.patient_id),
+        "final_diagnosis": _result_record(state.final_diagnosis),
+        "confidence": round(float(state.confidence), 4),
+        "results": [_result_record(r) for r in state.diagnosis_results],
+        "active_agents": list(state.active_agents),
+        "safety_alerts": list(state.safety_alerts),
+        "agent_timings": {name: round(seconds, 6) for name, seconds in state.agent_timings.items()},
+        "partial": state.partial,
+        "timed_out_agents": list(state.timed_out_agents),
+        "failed_agents": list(state.failed_agents),
+        "provisional": state.provisional,
+        "preempted_agents": list(state.preempted_agents),
+        "elapsed": round(elapsed, 6),
+    }
+
+
+async def _diagnose_patients(orchestrator: MasterOrchestrator, patients: List[PatientData]) -> List[Dict[str, Any]]:
+    records = []
+    for patient in patients:
+        start = time.perf_counter()
+        state = await orchestrator.orchestrate(patient)
+        records.append(state_to_record(state, time.perf_counter() - start))
+    return records
+
+
+def _init_worker(loader: MIMICDataLoader, log_level: str):
+    # Every admission in a batch is distinct, so the result cache would never hit;
+    # the batch is already spread over processes, so agents run inline
+    global _WORKER_LOADER, _WORKER_ORCHESTRATOR
+    diagnostics.configure(level=log_level)
+    _WORKER_LOADER = loader
+    _WORKER_ORCHESTRATOR = build_orchestrator(use_cache=False, executor=None)
+
+
+def _diagnose_chunk(hadm_ids: List[int]) -> List[Dict[str, Any]]:
+    patients = _WORKER_LOADER.get_patients_bulk(hadm_ids)
+    return asyncio.run(_diagnose_patients(_WORKER_ORCHESTRATOR, patients))
+
+
+class JSONLSink:
+    """Writes one JSON object per line, flushed per chunk"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "w")
+
+    def write(self, records: List[Dict[str, Any]]):
+        for record in records:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """Writes records as Parquet row groups (requires pyarrow)"""
+
+    def __init__(self, path: Path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+
+        self._pa = pa
+        self._pq = pq
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._writer = None
+
+    def write(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        # Nested fields are stored as JSON strings so the schema stays fixed
+        rows = [
+            {k: json.dumps(v) if k in _NESTED_FIELDS else v for k, v in record.items()}
+            for record in records
+        ]
+        table = self._pa.Table.from_pylist(rows)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(str(self.path), table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_sink(path: Path):
+    """Choose the output format from the file suffix"""
+    return ParquetSink(path) if Path(path).suffix == ".parquet" else JSONLSink(path)
+
+
+@dataclass
+class BatchStats:
+    """Throughput and latency summary of a batch run"""
+    patients: int = 0
+    elapsed: float = 0.0
+    agent_latencies: Dict[str, List[float]] = field(default_factory=dict)
+    patient_latencies: List[float] = field(default_factory=list)
+
+    def add(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.patients += 1
+            self.patient_latencies.append(record["elapsed"])
+            for agent, seconds in record["agent_timings"].items():
+                self.agent_latencies.setdefault(agent, []).append(seconds)
+
+    @property
+    def patients_per_second(self) -> float:
+        return self.patients / self.elapsed if self.elapsed > 0 else 0.0
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        """{agent: {"p50": ms, "p90": ms, "p99": ms}}, plus the whole orchestration"""
+        series = dict(self.agent_latencies, orchestrate=self.patient_latencies)
+        return {
+            name: {
+                f"p{q}": float(np.percentile(values, q)) * 1000
+                for q in LATENCY_PERCENTILES
+            }
+            for name, values in series.items() if values
+        }
+
+    def format_report(self) -> str:
+        lines = [
+            f"Diagnosed {self.patients} patients in {self.elapsed:.2f}s "
+            f"({self.patients_per_second:.1f} patients/s)",
+            "Latency (ms): " + " / ".join(f"p{q}" for q in LATENCY_PERCENTILES),
+        ]
+        for name, values in self.percentiles().items():
+            lines.append(f"  {name}: " + " / ".join(f"{v:.2f}" for v in values.values()))
+        return "\n".join(lines)
+
+
+def _chunks(items: List[int], size: int) -> Iterator[List[int]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def run_batch(
+    loader: MIMICDataLoader,
+    hadm_ids: List[int],
+    output: Path,
+    n_jobs: int = 1,
+    chunk_size: int = 50,
+    log_level: str = "WARNING"
+) -> BatchStats:
+    """
+    Diagnose admissions and stream the results to output
+
+    Args:
+        loader: Loader the patients are assembled from (copied to workers)
+        hadm_ids: Admissions to diagnose
+        output: .jsonl or .parquet file
+        n_jobs: Worker processes; 1 runs in this process (where agents may
+            still use the AGENT_EXECUTOR pool)
+        chunk_size: Admissions per worker task
+        log_level: Log level inside workers (per-analysis detail is DEBUG)
+
+    Returns:
+        Throughput and latency statistics
+    """
+    stats = BatchStats()
+    sink = open_sink(output)
+    chunks = list(_chunks([int(h) for h in hadm_ids], chunk_size))
+    start = time.perf_counter()
+
+    try:
+        if n_jobs <= 1:
+            orchestrator = build_orchestrator(use_cache=False)
+            try:
+                for chunk in chunks:
+                    records = asyncio.run(_diagnose_patients(orchestrator, loader.get_patients_bulk(chunk)))
+                    sink.write(records)
+                    stats.add(records)
+            finally:
+                orchestrator.close()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_worker, initargs=(loader, log_level)
+            ) as pool:
+                # Chunks are written in submission order as they complete
+                for records in pool.map(_diagnose_chunk, chunks):
+                    sink.write(records)
+                    stats.add(records)
+    finally:
+        sink.close()
+        stats.elapsed = time.perf_counter() - start
+
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the diagnosis agents over a MIMIC-IV cohort")
+    parser.add_argument("--output", type=Path, required=True, help="Results file (.jsonl or .parquet)")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Admissions per worker task")
+    parser.add_argument("--limit", type=int, default=None, help="Diagnose at most this many admissions")
+    parser.add_argument("--cohort", choices=["chest_pain", "all"], default="chest_pain")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    diagnostics.configure(level=args.log_level)
+
+    loader = MIMICDataLoader()
+    loader.load_all()
+    if args.cohort == "chest_pain":
+        hadm_ids = loader.filter_chest_pain_patients()
+    else:
+        hadm_ids = loader.admissions['hadm_id'].tolist()
+    hadm_ids = hadm_ids[:args.limit] if args.limit else hadm_ids
+
+    stats = run_batch(
+        loader, hadm_ids, args.output,
+        n_jobs=args.jobs, chunk_size=args.chunk_size, log_level=args.log_level
+    )
+    print(stats.format_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "datasets" / "mimic-iv-clinical-database-demo-2.2"
 MODELS_DIR = PROJECT_ROOT / "models"
 LOGS_DIR = PROJECT_ROOT / "logs"
+CACHE_DIR = PROJECT_ROOT / ".cache"
 
 # Create directories
 MODELS_DIR.mkdir(exist_ok=True)
@@ -30,6 +31,37 @@ MAX_FRACTAL_DEPTH = 3
 CONFIDENCE_THRESHOLD = 0.85
 SAFETY_OVERRIDE_PRIORITY = 1000
 
+# Orchestrator latency budget: each agent gets AGENT_TIMEOUT_SECONDS and the
+# whole request ORCHESTRATION_DEADLINE_SECONDS (the safety agent is always awaited)
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", "2.0"))
+ORCHESTRATION_DEADLINE_SECONDS = float(os.getenv("ORCHESTRATION_DEADLINE_SECONDS", "5.0"))
+# Priority mode: a CRITICAL safety result returns a provisional diagnosis at once
+# and cancels the specialty agents still running
+SAFETY_PRIORITY_MODE = os.getenv("SAFETY_PRIORITY_MODE", "0") != "0"
+# Run each agent's analyze() in a "thread" or "process" pool instead of on the
+# event loop (agents are CPU-bound); empty runs them inline
+AGENT_EXECUTOR = os.getenv("AGENT_EXECUTOR", "") or None
+AGENT_EXECUTOR_WORKERS = int(os.getenv("AGENT_EXECUTOR_WORKERS", "0")) or None  # None = CPU count
+
+# Span tracing of agent phases (see src/agents/tracing.py)
+TRACE_AGENTS = os.getenv("TRACE_AGENTS", "0") != "0"
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "100000"))
+
+# Agent selection: "all" runs every registered agent, "rules" uses ROUTING_RULES
+AGENT_ROUTING = os.getenv("AGENT_ROUTING", "all")
+
+# Adaptive fractal depth (see src/agents/depth_policy.py): lower MAX_FRACTAL_DEPTH
+# under load or when the request budget runs short, raise it for high-risk patients
+ADAPTIVE_DEPTH = os.getenv("ADAPTIVE_DEPTH", "0") != "0"
+DEPTH_POLICY_CAPACITY = int(os.getenv("DEPTH_POLICY_CAPACITY", "32"))  # Concurrent root analyses
+DEPTH_POLICY_BACKPRESSURE = 0.75  # Fraction of capacity at which depth drops one level
+DEPTH_POLICY_MIN_DEPTH = 1
+DEPTH_POLICY_RISK_BOOST = 1
+
+# Orchestrator result cache (keyed by PatientData fingerprint)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+
 # Clinical Thresholds
 TROPONIN_NORMAL = 0.04  # ng/mL
 TROPONIN_ELEVATED = 0.05
@@ -49,6 +81,143 @@ CHEST_PAIN_ICD9_CODES = {
     "3000": "Anxiety state, unspecified",
 }
 
+# ICD-10-CM categories covering the same conditions
+CHEST_PAIN_ICD10_CODES = {
+    "I20": "Angina pectoris",
+    "I21": "Acute myocardial infarction",
+    "I22": "Subsequent myocardial infarction",
+    "I24": "Other acute ischemic heart diseases",
+    "I25": "Chronic ischemic heart disease",
+    "R071": "Chest pain on breathing",
+    "R072": "Precordial pain",
+    "R078": "Other chest pain",
+    "R079": "Chest pain, unspecified",
+    "K21": "Gastro-esophageal reflux disease",
+    "K25": "Gastric ulcer",
+    "I26": "Pulmonary embolism",
+    "M15": "Polyosteoarthritis",
+    "F41": "Other anxiety disorders",
+}
+
+# Chest pain cohort: category -> {icd_version: code prefixes}
+# A prefix also matches its sub-codes (e.g. 4151 matches 41511, I21 matches I214)
+CHEST_PAIN_ICD_CATEGORIES = {
+    "cardiology": {9: ["41401", "41071", "41189"], 10: ["I20", "I21", "I22", "I24", "I25"]},
+    "undifferentiated": {9: ["78650", "78651"], 10: ["R071", "R072", "R078", "R079"]},
+    "gastroenterology": {9: ["5329", "5121"], 10: ["K21", "K25"]},
+    "pulmonary": {9: ["4151"], 10: ["I26"]},
+    "musculoskeletal": {9: ["7330"], 10: ["M15"]},
+    "psychiatry": {9: ["3000"], 10: ["F41"]},
+}
+
+# Medication classes recognised in prescriptions (lower-case name fragments)
+MEDICATION_CLASSES = {
+    "anticoagulant": ["heparin", "enoxaparin", "warfarin", "apixaban", "rivaroxaban",
+                      "dabigatran", "fondaparinux"],
+    "antiplatelet": ["aspirin", "clopidogrel", "ticagrelor", "prasugrel"],
+    "antianginal": ["nitroglycerin", "isosorbide", "ranolazine"],
+    "acid_suppression": ["omeprazole", "pantoprazole", "esomeprazole", "lansoprazole",
+                         "famotidine", "ranitidine"],
+}
+# Orders that match a class but don't count towards it: heparin line flushes,
+# locks and dwells, and subcutaneous (prophylactic) heparin, whose labels carry
+# their route (see TIMELINE_EVENT_SOURCES)
+MEDICATION_EXCLUSIONS = {
+    "anticoagulant": ["flush", "lock", "dwell", "heparin (sc)", "heparin (subcut)"],
+}
+
+# Culture specimens (spec_type_desc fragments, lower-case) that count as respiratory
+RESPIRATORY_SPECIMENS = ["sputum", "bronchoalveolar lavage", "bronchial washings",
+                         "bronchial brush", "tracheal aspirate", "mini-bal"]
+
+# Declarative agent routing (src/agents/routing.py). A rule fires when any of
+# its triggers matches: a chief complaint phrase, an ICD code prefix
+# ({icd_version: prefixes}) or a vital sign inside a [low, high) range (None =
+# unbounded); it then routes to its specialties. Safety always runs, specialties
+# no rule mentions always run, and a patient no rule fires for gets every agent.
+ROUTING_RULES = [
+    {
+        "name": "cardiac_presentation",
+        "complaints": ["chest pressure", "chest tightness", "palpitations", "syncope"],
+        "icd_prefixes": {9: ["410", "411", "413", "414", "427", "428"],
+                         10: ["I20", "I21", "I22", "I24", "I25", "I47", "I48", "I50"]},
+        "route": ["cardiology"],
+    },
+    {
+        "name": "undifferentiated_chest_pain",
+        "complaints": ["chest pain"],
+        "icd_prefixes": CHEST_PAIN_ICD_CATEGORIES["undifferentiated"],
+        "route": ["cardiology", "gastroenterology", "pulmonary", "musculoskeletal"],
+    },
+    {
+        "name": "gastrointestinal",
+        "complaints": ["heartburn", "epigastric", "dysphagia", "nausea", "vomiting", "reflux"],
+        "icd_prefixes": {9: ["530", "531", "532", "533", "535", "574", "575", "577"],
+                         10: ["K20", "K21", "K22", "K25", "K26", "K29", "K80", "K81", "K85"]},
+        "route": ["gastroenterology"],
+    },
+    {
+        "name": "respiratory",
+        "complaints": ["shortness of breath", "dyspnea", "cough", "hemoptysis", "pleuritic"],
+        "icd_prefixes": {9: ["415", "480", "481", "482", "485", "486", "511", "512"],
+                         10: ["I26", "J12", "J13", "J15", "J18", "J90", "J93"]},
+        "vitals": {"o2_saturation": (None, 94), "respiratory_rate": (22, None)},
+        "route": ["pulmonary"],
+    },
+    {
+        "name": "musculoskeletal",
+        "complaints": ["trauma", "fall", "injury", "reproducible", "rib"],
+        "icd_prefixes": {9: ["7330", "7393", "7865", "807", "848"],
+                         10: ["M94", "M15", "S22", "S29", "R0782"]},
+        "route": ["musculoskeletal"],
+    },
+    {
+        "name": "hemodynamic_instability",
+        "vitals": {"systolic_bp": (None, 90), "heart_rate": (120, None)},
+        "route": ["cardiology", "pulmonary"],
+    },
+]
+
+# MIMIC-IV lab itemids extracted for the agents (itemid -> lab name)
+# Note: MIMIC demo may not have troponin/BNP
+IMPORTANT_LABS = {
+    51222: 'Hemoglobin',
+    51265: 'Platelet Count',
+    50912: 'Creatinine',
+    50902: 'Chloride',
+    50971: 'Potassium',
+    50983: 'Sodium',
+    50931: 'Glucose',
+    50878: 'AST',
+    50861: 'ALT',
+    51237: 'INR',
+    51274: 'PT',
+    51275: 'PTT',
+    51003: 'Troponin',  # Troponin T, ng/mL
+    50963: 'BNP',  # NT-proBNP, pg/mL
+}
+
+# ICU chartevents itemids for the vitals the agents read
+VITAL_ITEMIDS = {
+    220045: 'heart_rate',
+    220179: 'systolic_bp',  # non-invasive
+    220050: 'systolic_bp',  # arterial line
+    220180: 'diastolic_bp',
+    220051: 'diastolic_bp',
+    220210: 'respiratory_rate',
+    220277: 'o2_saturation',
+    223762: 'temperature',
+    223761: 'temperature_f',  # converted to Celsius
+}
+VITAL_SIGNS = [
+    'heart_rate', 'systolic_bp', 'diastolic_bp',
+    'respiratory_rate', 'o2_saturation', 'temperature'
+]
+
+# Vitals are taken from the measurement nearest to admittime within these windows
+CHARTEVENTS_WINDOW_HOURS = 24
+OMR_WINDOW_DAYS = 365
+
 # MIMIC-IV Data Paths
 MIMIC_HOSP_DIR = DATA_DIR / "hosp"
 MIMIC_ICU_DIR = DATA_DIR / "icu"
@@ -59,6 +228,180 @@ DIAGNOSES_CSV = MIMIC_HOSP_DIR / "diagnoses_icd.csv"
 LABEVENTS_CSV = MIMIC_HOSP_DIR / "labevents.csv"
 D_ICD_DIAGNOSES_CSV = MIMIC_HOSP_DIR / "d_icd_diagnoses.csv"
 ICUSTAYS_CSV = MIMIC_ICU_DIR / "icustays.csv"
+CHARTEVENTS_CSV = MIMIC_ICU_DIR / "chartevents.csv"
+OMR_CSV = MIMIC_HOSP_DIR / "omr.csv"
+PRESCRIPTIONS_CSV = MIMIC_HOSP_DIR / "prescriptions.csv"
+PHARMACY_CSV = MIMIC_HOSP_DIR / "pharmacy.csv"
+MICROBIOLOGYEVENTS_CSV = MIMIC_HOSP_DIR / "microbiologyevents.csv"
+TRANSFERS_CSV = MIMIC_HOSP_DIR / "transfers.csv"
+D_ITEMS_CSV = MIMIC_ICU_DIR / "d_items.csv"
+DATETIMEEVENTS_CSV = MIMIC_ICU_DIR / "datetimeevents.csv"
+OUTPUTEVENTS_CSV = MIMIC_ICU_DIR / "outputevents.csv"
+PROCEDUREEVENTS_CSV = MIMIC_ICU_DIR / "procedureevents.csv"
+SHA256SUMS_TXT = DATA_DIR / "SHA256SUMS.txt"
+
+# Read schema per MIMIC-IV table: only the columns the loader uses are parsed,
+# with compact dtypes (int32 ids, categorical codes, float32 values) and
+# timestamps pre-parsed to datetime64. Nullable ids use pandas "Int32".
+# Optional tables (absent from the demo extract) load as empty frames.
+MIMIC_TABLES = {
+    "admissions": {
+        "path": ADMISSIONS_CSV,
+        "usecols": ["subject_id", "hadm_id", "admittime", "dischtime"],
+        "dtype": {"subject_id": "int32", "hadm_id": "int32"},
+        "parse_dates": ["admittime", "dischtime"],
+        "required": True,
+    },
+    "patients": {
+        "path": PATIENTS_CSV,
+        "usecols": ["subject_id", "gender", "anchor_age", "anchor_year"],
+        "dtype": {"subject_id": "int32", "gender": "category",
+                  "anchor_age": "int16", "anchor_year": "int16"},
+        "parse_dates": [],
+        "required": True,
+    },
+    "diagnoses_icd": {
+        "path": DIAGNOSES_CSV,
+        "usecols": ["subject_id", "hadm_id", "seq_num", "icd_code", "icd_version"],
+        "dtype": {"subject_id": "int32", "hadm_id": "int32", "seq_num": "int16",
+                  "icd_code": "category", "icd_version": "int8"},
+        "parse_dates": [],
+        "required": True,
+    },
+    "labevents": {
+        "path": LABEVENTS_CSV,
+        "usecols": ["subject_id", "hadm_id", "itemid", "charttime", "valuenum"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "itemid": "int32",
+                  "valuenum": "float32"},
+        "parse_dates": ["charttime"],
+        "required": False,
+    },
+    "d_icd_diagnoses": {
+        "path": D_ICD_DIAGNOSES_CSV,
+        "usecols": ["icd_code", "icd_version", "long_title"],
+        "dtype": {"icd_code": "str", "icd_version": "int8", "long_title": "str"},
+        "parse_dates": [],
+        "required": False,
+    },
+    "icustays": {
+        "path": ICUSTAYS_CSV,
+        "usecols": ["subject_id", "hadm_id", "stay_id", "intime", "outtime"],
+        "dtype": {"subject_id": "int32", "hadm_id": "int32", "stay_id": "int32"},
+        "parse_dates": ["intime", "outtime"],
+        "required": False,
+    },
+    "chartevents": {
+        "path": CHARTEVENTS_CSV,
+        "usecols": ["subject_id", "hadm_id", "itemid", "charttime", "valuenum"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "itemid": "int32",
+                  "valuenum": "float32"},
+        "parse_dates": ["charttime"],
+        "required": False,
+    },
+    "omr": {
+        "path": OMR_CSV,
+        "usecols": ["subject_id", "chartdate", "result_name", "result_value"],
+        "dtype": {"subject_id": "int32", "result_name": "category", "result_value": "str"},
+        "parse_dates": ["chartdate"],
+        "required": False,
+    },
+    "prescriptions": {
+        "path": PRESCRIPTIONS_CSV,
+        "usecols": ["subject_id", "hadm_id", "starttime", "drug", "route"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "drug": "category",
+                  "route": "category"},
+        "parse_dates": ["starttime"],
+        "required": False,
+    },
+    "pharmacy": {
+        "path": PHARMACY_CSV,
+        "usecols": ["subject_id", "hadm_id", "starttime", "medication", "route"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "medication": "category",
+                  "route": "category"},
+        "parse_dates": ["starttime"],
+        "required": False,
+    },
+    "microbiologyevents": {
+        "path": MICROBIOLOGYEVENTS_CSV,
+        "usecols": ["subject_id", "hadm_id", "chartdate", "charttime", "spec_type_desc",
+                    "test_name", "org_name"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "spec_type_desc": "category",
+                  "test_name": "category", "org_name": "category"},
+        "parse_dates": ["chartdate", "charttime"],
+        "required": False,
+    },
+    "transfers": {
+        "path": TRANSFERS_CSV,
+        "usecols": ["subject_id", "hadm_id", "eventtype", "careunit", "intime"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "eventtype": "category",
+                  "careunit": "category"},
+        "parse_dates": ["intime"],
+        "required": False,
+    },
+    "d_items": {
+        "path": D_ITEMS_CSV,
+        "usecols": ["itemid", "label"],
+        "dtype": {"itemid": "int32", "label": "str"},
+        "parse_dates": [],
+        "required": False,
+    },
+    "datetimeevents": {
+        "path": DATETIMEEVENTS_CSV,
+        "usecols": ["subject_id", "hadm_id", "charttime", "itemid"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "itemid": "int32"},
+        "parse_dates": ["charttime"],
+        "required": False,
+    },
+    "outputevents": {
+        "path": OUTPUTEVENTS_CSV,
+        "usecols": ["subject_id", "hadm_id", "charttime", "itemid", "value"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "itemid": "int32",
+                  "value": "float32"},
+        "parse_dates": ["charttime"],
+        "required": False,
+    },
+    "procedureevents": {
+        "path": PROCEDUREEVENTS_CSV,
+        "usecols": ["subject_id", "hadm_id", "starttime", "itemid", "value"],
+        "dtype": {"subject_id": "int32", "hadm_id": "Int32", "itemid": "int32",
+                  "value": "float32"},
+        "parse_dates": ["starttime"],
+        "required": False,
+    },
+}
+
+# Admission timeline: event table -> where each event's time, label and value
+# come from. The first non-null column in "time"/"label" wins; "itemid"
+# labels are resolved through d_items. A "flag" column sets the value to 1.0
+# where it is present and 0.0 elsewhere (e.g. a culture grew an organism). A
+# "qualifier" column is appended to the label as "LABEL (QUALIFIER)", only for
+# the "qualified" values when those are listed.
+TIMELINE_EVENT_SOURCES = {
+    "prescriptions": {"time": ["starttime"], "label": ["drug"],
+                      "qualifier": "route", "qualified": ["SC", "SUBCUT"]},
+    "pharmacy": {"time": ["starttime"], "label": ["medication"]},
+    "microbiologyevents": {"time": ["charttime", "chartdate"], "label": ["org_name", "test_name"],
+                           "flag": "org_name", "qualifier": "spec_type_desc"},
+    "transfers": {"time": ["intime"], "label": ["careunit", "eventtype"]},
+    "datetimeevents": {"time": ["charttime"], "label": ["itemid"]},
+    "outputevents": {"time": ["charttime"], "label": ["itemid"], "value": "value"},
+    "procedureevents": {"time": ["starttime"], "label": ["itemid"], "value": "value"},
+}
+
+# Columnar table cache (CSV -> memory-mapped NumPy columns)
+MIMIC_CACHE_DIR = CACHE_DIR / "mimic"
+USE_TABLE_CACHE = os.getenv("MIMIC_TABLE_CACHE", "1") != "0"
+
+# Streaming mode for large tables (full MIMIC-IV labevents is tens of GB)
+LAB_STORE_PATH = CACHE_DIR / "labevents.sqlite"
+STREAM_CHUNKSIZE = int(os.getenv("MIMIC_STREAM_CHUNKSIZE", "500000"))
+
+# Fill PatientData.medications/microbiology from the timeline index. Building the
+# index reads the seven TIMELINE_EVENT_SOURCES tables, so it is opt-in
+LOAD_TIMELINE_CONTEXT = os.getenv("MIMIC_TIMELINE_CONTEXT", "0") != "0"
+
+# Persistent store of assembled PatientData keyed by hadm_id
+FEATURE_STORE_PATH = CACHE_DIR / "patient_features.sqlite"
 
 class RiskLevel(str, Enum):
     """Risk stratification levels"""
@@ -186,5 +529,6 @@ CRITICAL_ALERTS = {
 }
 
 # Logging Configuration
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # Also gates src/diagnostics.py
+LOG_ENQUEUE = os.getenv("LOG_ENQUEUE", "1") != "0"  # Queued sinks in diagnostics.configure()
 LOG_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>"
@@ -4,11 +4,15 @@ Data preprocessing and loading utilities for MIMIC-IV dataset
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 from loguru import logger
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
 import sys
 from pathlib import Path
 
@@ -16,11 +20,20 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config import (
-    ADMISSIONS_CSV, PATIENTS_CSV, DIAGNOSES_CSV, LABEVENTS_CSV,
-    D_ICD_DIAGNOSES_CSV, ICUSTAYS_CSV, CHEST_PAIN_ICD9_CODES
+    LABEVENTS_CSV, CHEST_PAIN_ICD_CATEGORIES, MIMIC_TABLES, IMPORTANT_LABS,
+    VITAL_ITEMIDS, VITAL_SIGNS, CHARTEVENTS_WINDOW_HOURS, OMR_WINDOW_DAYS,
+    USE_TABLE_CACHE, LAB_STORE_PATH, STREAM_CHUNKSIZE, MEDICATION_CLASSES, MEDICATION_EXCLUSIONS,
+    LOAD_TIMELINE_CONTEXT
 )
+from table_cache import ColumnarTableCache
+from lab_store import LabEventStore
+from lab_series import LabSeries, as_float64
+from icd_matcher import ICDPrefixMatcher
+from timeline import TimelineIndex
 
-@dataclass
+CHEST_PAIN_MATCHER = ICDPrefixMatcher(CHEST_PAIN_ICD_CATEGORIES)
+
+@dataclass(slots=True)
 class PatientData:
     """Structured patient data"""
     patient_id: str
@@ -30,53 +43,469 @@ class PatientData:
     chief_complaint: str
     admission_time: datetime
     vitals: Dict[str, float]
-    labs: Dict[str, List[Tuple[datetime, float]]]  # Lab name -> [(time, value)]
+    labs: Dict[str, LabSeries]  # Lab name -> time series; [(time, value)] lists are converted
     diagnoses: List[str]
     icd_codes: List[str]
+    medications: List[str] = field(default_factory=list)  # Drugs prescribed during the admission
+    microbiology: List[str] = field(default_factory=list)  # Organisms grown in cultures, "ORGANISM (SPECIMEN)"
+    icd_versions: List[int] = field(default_factory=list)  # ICD version of each icd_codes entry (empty = unknown)
+    
+    def __post_init__(self):
+        self.labs = {name: LabSeries.coerce(values) for name, values in self.labs.items()}
+    
+    def lab(self, name: str) -> LabSeries:
+        """Time series for a lab (empty if it was never measured)"""
+        return self.labs.get(name) or LabSeries()
+    
+    def latest_lab(self, name: str, default: Optional[float] = None) -> Optional[float]:
+        """Most recent value of a lab, or default if it was never measured"""
+        return self.lab(name).latest(default)
+    
+    def fingerprint(self) -> str:
+        """SHA256 of the patient's contents; equal data gives an equal fingerprint"""
+        admission_time = pd.Timestamp(self.admission_time).value if self.admission_time is not None else None
+        header = [
+            self.patient_id, self.hadm_id, self.age, self.gender, self.chief_complaint,
+            admission_time, sorted(self.vitals.items()), self.diagnoses, self.icd_codes,
+            self.medications, self.microbiology, self.icd_versions,
+        ]
+        digest = hashlib.sha256(json.dumps(header, default=str).encode())
+        for name in sorted(self.labs):
+            series = self.labs[name]
+            digest.update(f"\0{name}:{len(series)}".encode())
+            digest.update(series.times.tobytes())
+            digest.update(series.values.tobytes())
+        return digest.hexdigest()
+    
+    def on_medication(self, med_class: str) -> bool:
+        """Whether any prescribed drug belongs to a MEDICATION_CLASSES class (minus MEDICATION_EXCLUSIONS)"""
+        keywords = MEDICATION_CLASSES[med_class]
+        exclusions = MEDICATION_EXCLUSIONS.get(med_class, [])
+        return any(
+            any(k in drug for k in keywords) and not any(x in drug for x in exclusions)
+            for drug in map(str.lower, self.medications)
+        )
+
+def _group_ranges(frame: pd.DataFrame, key: str) -> Tuple[pd.DataFrame, Dict[int, Tuple[int, int]]]:
+    """
+    Stable-sort a frame by key and map each key value to its (start, stop) rows
+    
+    Rows keep their original relative order inside each group.
+    """
+    order = np.argsort(frame[key].to_numpy(), kind="stable")
+    grouped = frame.iloc[order].reset_index(drop=True)
+    
+    keys, starts, counts = np.unique(
+        grouped[key].to_numpy(), return_index=True, return_counts=True
+    )
+    ranges = {
+        k: (int(start), int(start + count))
+        for k, start, count in zip(keys.tolist(), starts, counts)
+    }
+    return grouped, ranges
+
+def _default_memory_usage(frame: pd.DataFrame) -> int:
+    """Approximate bytes the frame would take with pandas' default dtype inference"""
+    total = 0
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+            total += len(series) * 8  # int64 / float64
+        else:
+            # Codes, labels and unparsed timestamps are Python strings by default
+            total += series.astype(str).astype(object).memory_usage(deep=True, index=False)
+    return total
+
+# Loader shared with process-pool workers by get_patients_bulk
+_BULK_LOADER: Optional['MIMICDataLoader'] = None
+
+def _init_bulk_worker(loader: 'MIMICDataLoader'):
+    global _BULK_LOADER
+    _BULK_LOADER = loader
+
+def _build_patients_chunk(hadm_ids: List[int]) -> List['PatientData']:
+    return _BULK_LOADER._build_patients(hadm_ids)
+    
+class _LazyTable:
+    """
+    MIMIC table attribute that is read on first access
+    
+    Assigning a frame replaces the table and drops the indexes built on it.
+    """
+    
+    def __init__(self, table: str):
+        self.table = table
+    
+    def __set_name__(self, owner, attr: str):
+        self.slot = f"_table_{attr}"
+    
+    def __get__(self, loader: Optional['MIMICDataLoader'], owner=None):
+        if loader is None:
+            return self
+        frame = loader.__dict__.get(self.slot)
+        if frame is None:
+            frame = loader._load_table(self.table)
+            loader.__dict__[self.slot] = frame
+        return frame
     
+    def __set__(self, loader: 'MIMICDataLoader', frame: Optional[pd.DataFrame]):
+        loader.__dict__[self.slot] = frame
+        loader._drop_indexes()
+
 class MIMICDataLoader:
     """Load and preprocess MIMIC-IV data for chest pain patients"""
     
-    def __init__(self):
-        self.admissions = None
-        self.patients = None
-        self.diagnoses = None
-        self.labevents = None
-        self.d_icd = None
-        self.icustays = None
+    # Tables load lazily on first access (schema in config.MIMIC_TABLES)
+    admissions = _LazyTable("admissions")
+    patients = _LazyTable("patients")
+    diagnoses = _LazyTable("diagnoses_icd")
+    labevents = _LazyTable("labevents")
+    d_icd = _LazyTable("d_icd_diagnoses")
+    icustays = _LazyTable("icustays")
+    chartevents = _LazyTable("chartevents")
+    omr = _LazyTable("omr")
+    prescriptions = _LazyTable("prescriptions")
+    pharmacy = _LazyTable("pharmacy")
+    microbiology = _LazyTable("microbiologyevents")
+    transfers = _LazyTable("transfers")
+    d_items = _LazyTable("d_items")
+    datetimeevents = _LazyTable("datetimeevents")
+    outputevents = _LazyTable("outputevents")
+    procedureevents = _LazyTable("procedureevents")
+    
+    _INDEXES = (
+        '_admission_rows', '_patient_rows', '_diagnosis_index', '_icd_titles',
+        '_lab_index', '_vitals_by_hadm', 'timeline'
+    )
+    
+    def __init__(
+        self,
+        use_cache: bool = USE_TABLE_CACHE,
+        cache: Optional[ColumnarTableCache] = None,
+        timeline_context: bool = LOAD_TIMELINE_CONTEXT
+    ):
+        # Columnar cache avoids re-parsing the CSVs on every process start
+        self.cache = cache or (ColumnarTableCache() if use_cache else None)
+        
+        # Fill medications/microbiology per patient (builds the timeline index)
+        self.timeline_context = timeline_context
+        
+        # Set by stream_labevents(); lab lookups then read from disk
+        self.lab_store: Optional[LabEventStore] = None
+        self.streaming = False
         
         logger.info("Initializing MIMIC-IV data loader")
+    
+    def _load_table(self, table: str) -> pd.DataFrame:
+        """Read one table using its schema from MIMIC_TABLES"""
+        schema = MIMIC_TABLES[table]
+        csv_path = schema['path']
+        read_kwargs = {
+            'usecols': schema['usecols'],
+            'dtype': schema['dtype'],
+            'parse_dates': schema['parse_dates'],
+        }
+        
+        if not csv_path.exists() and not schema['required']:
+            logger.warning(f"{csv_path.name} not found; using an empty {table} table")
+            return pd.DataFrame({
+                col: pd.Series(dtype='datetime64[ns]' if col in schema['parse_dates']
+                               else schema['dtype'].get(col, 'float64'))
+                for col in schema['usecols']
+            })
+        
+        frame = self._read_table(table, csv_path, **read_kwargs)
+        logger.info(
+            f"Loaded {len(frame)} rows from {table} "
+            f"({frame.memory_usage(deep=True).sum() / 1e6:.1f} MB)"
+        )
+        return frame
+    
+    def source_fingerprint(self) -> str:
+        """
+        Version of the MIMIC source files the loader reads
+        
+        Uses the cache's SHA256 digests when available (memoized by file
+        stat), otherwise file size and mtime.
+        """
+        parts = []
+        for table, schema in sorted(MIMIC_TABLES.items()):
+            path = schema['path']
+            if not path.exists():
+                continue
+            if self.cache is not None:
+                version = self.cache.source_digest(path)
+            else:
+                stat = path.stat()
+                version = f"{stat.st_size}:{stat.st_mtime_ns}"
+            parts.append(f"{table}={version}")
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+    
+    def memory_report(self) -> pd.DataFrame:
+        """
+        Memory used by each loaded table versus default dtype inference
+        
+        Tables that have not been accessed yet are not loaded by this call.
+        
+        Returns:
+            DataFrame indexed by table with rows, bytes, default_bytes and
+            saved_bytes columns
+        """
+        report = []
+        for attr, descriptor in vars(MIMICDataLoader).items():
+            if not isinstance(descriptor, _LazyTable):
+                continue
+            frame = self.__dict__.get(descriptor.slot)
+            if frame is None:
+                continue
+            used = int(frame.memory_usage(deep=True, index=False).sum())
+            default = int(_default_memory_usage(frame))
+            report.append({
+                'table': descriptor.table,
+                'rows': len(frame),
+                'bytes': used,
+                'default_bytes': default,
+                'saved_bytes': default - used,
+            })
+            logger.info(
+                f"{descriptor.table}: {used / 1e6:.2f} MB "
+                f"({(default - used) / 1e6:.2f} MB saved by compact dtypes)"
+            )
+        return pd.DataFrame(report, columns=['table', 'rows', 'bytes', 'default_bytes', 'saved_bytes']).set_index('table')
+    
+    def _read_table(self, name: str, csv_path: Path, **read_kwargs) -> pd.DataFrame:
+        """Read a table through the columnar cache, falling back to the raw CSV"""
+        if self.cache is not None:
+            try:
+                return self.cache.load(name, csv_path, **read_kwargs)
+            except OSError as e:
+                if not csv_path.exists():
+                    raise
+                logger.warning(f"Columnar cache unavailable for {name}, reading CSV: {e}")
+        return pd.read_csv(csv_path, **read_kwargs)
+        
+    def load_all(self, streaming: bool = False):
+        """
+        Eagerly load all required MIMIC-IV tables
+        
+        Tables otherwise load on first access, so callers that only need a
+        few tables (e.g. filter_chest_pain_patients) can skip this.
         
-    def load_all(self):
-        """Load all required MIMIC-IV tables"""
+        Args:
+            streaming: Skip loading labevents into memory; call
+                stream_labevents() to spill the cohort's labs to disk instead
+        """
         logger.info("Loading MIMIC-IV datasets...")
+        self.streaming = streaming
         
         try:
-            self.admissions = pd.read_csv(ADMISSIONS_CSV)
-            logger.info(f"Loaded {len(self.admissions)} admissions")
-            
-            self.patients = pd.read_csv(PATIENTS_CSV)
-            logger.info(f"Loaded {len(self.patients)} patients")
-            
-            self.diagnoses = pd.read_csv(DIAGNOSES_CSV)
-            logger.info(f"Loaded {len(self.diagnoses)} diagnoses")
+            self.admissions
+            self.patients
+            self.diagnoses
             
             # Load lab events (may be large)
-            logger.info("Loading lab events (this may take a moment)...")
-            self.labevents = pd.read_csv(LABEVENTS_CSV)
-            logger.info(f"Loaded {len(self.labevents)} lab events")
+            if not streaming:
+                logger.info("Loading lab events (this may take a moment)...")
+                self.labevents
             
-            self.d_icd = pd.read_csv(D_ICD_DIAGNOSES_CSV)
-            logger.info(f"Loaded {len(self.d_icd)} ICD diagnosis codes")
-            
-            self.icustays = pd.read_csv(ICUSTAYS_CSV)
-            logger.info(f"Loaded {len(self.icustays)} ICU stays")
+            self.d_icd
+            self.icustays
             
             logger.success("All datasets loaded successfully")
             
         except Exception as e:
             logger.error(f"Error loading datasets: {e}")
             raise
+        
+        self.build_indexes()
+    
+    def build_indexes(self):
+        """
+        Build all hash indexes used by get_patient_data
+        
+        Each index is otherwise built on first use:
+        - hadm_id -> admissions row
+        - subject_id -> patients row
+        - hadm_id -> row range of diagnoses (grouped by admission)
+        - icd_code -> long_title
+        - hadm_id -> row range of the important lab results
+        - hadm_id -> measured vitals
+        - hadm_id -> event timeline (medications, cultures, transfers, ICU events),
+          only with timeline_context
+        """
+        for index in self._INDEXES:
+            if index == 'timeline' and not self.timeline_context:
+                continue
+            getattr(self, index)
+        
+        logger.debug(
+            f"Indexed {len(self._admission_rows)} admissions, "
+            f"{len(self._patient_rows)} patients, {len(self._icd_titles)} ICD titles"
+        )
+    
+    def _drop_indexes(self):
+        for index in self._INDEXES:
+            self.__dict__.pop(index, None)
+    
+    @cached_property
+    def _admission_rows(self) -> Dict[int, int]:
+        return {hadm_id: row for row, hadm_id in enumerate(self.admissions['hadm_id'].tolist())}
+    
+    @cached_property
+    def _patient_rows(self) -> Dict[int, int]:
+        return {subject_id: row for row, subject_id in enumerate(self.patients['subject_id'].tolist())}
+    
+    @cached_property
+    def _diagnosis_index(self) -> Tuple[pd.DataFrame, Dict[int, Tuple[int, int]]]:
+        return _group_ranges(self.diagnoses, 'hadm_id')
+    
+    @cached_property
+    def _icd_titles(self) -> Dict[str, str]:
+        # First title wins, matching the previous per-code lookup
+        titles = self.d_icd.drop_duplicates('icd_code', keep='first')
+        return dict(zip(titles['icd_code'].tolist(), titles['long_title'].tolist()))
+    
+    @cached_property
+    def _lab_index(self) -> Tuple[pd.DataFrame, Dict[int, Tuple[int, int]]]:
+        labevents = self.__dict__.get('_table_labevents')
+        if labevents is None and self.streaming:
+            # Streaming mode: labs are served from lab_store
+            labevents = pd.DataFrame(columns=['hadm_id', 'itemid', 'charttime', 'valuenum'])
+        elif labevents is None:
+            labevents = self.labevents
+        return _group_ranges(self._prepare_labs(labevents), 'hadm_id')
+    
+    @cached_property
+    def timeline(self) -> TimelineIndex:
+        """Events from the timeline tables (config.TIMELINE_EVENT_SOURCES) per admission"""
+        tables = {
+            'prescriptions': self.prescriptions,
+            'pharmacy': self.pharmacy,
+            'microbiologyevents': self.microbiology,
+            'transfers': self.transfers,
+            'datetimeevents': self.datetimeevents,
+            'outputevents': self.outputevents,
+            'procedureevents': self.procedureevents,
+        }
+        item_labels = dict(zip(self.d_items['itemid'].tolist(), self.d_items['label'].tolist()))
+        timeline = TimelineIndex.build(tables, item_labels=item_labels)
+        logger.debug(f"Built {timeline!r}")
+        return timeline
+    
+    @cached_property
+    def _vitals_by_hadm(self) -> Dict[int, Dict[str, float]]:
+        """Measured vitals per admission: chartevents first, then omr BP/weight"""
+        admissions = self.admissions[['subject_id', 'hadm_id', 'admittime']].copy()
+        admissions['admittime'] = pd.to_datetime(admissions['admittime']).astype('datetime64[ns]')
+        
+        measured = self._chartevents_vitals(admissions).combine_first(self._omr_vitals(admissions))
+        return {
+            int(hadm_id): {name: float(value) for name, value in row.items() if pd.notna(value)}
+            for hadm_id, row in measured.to_dict('index').items()
+        }
+    
+    def _chartevents_vitals(self, admissions: pd.DataFrame) -> pd.DataFrame:
+        """ICU vitals nearest to admittime within CHARTEVENTS_WINDOW_HOURS, one row per hadm_id"""
+        events = self._chartevents_vital_rows(admissions['hadm_id'].tolist())
+        events = pd.DataFrame({
+            'hadm_id': events['hadm_id'].astype('int64').to_numpy(),
+            'vital': events['itemid'].map(VITAL_ITEMIDS).to_numpy(),
+            'charttime': pd.to_datetime(events['charttime']).astype('datetime64[ns]').to_numpy(),
+            'value': as_float64(events['valuenum'].to_numpy()),
+        }).merge(admissions[['hadm_id', 'admittime']].astype({'hadm_id': 'int64'}), on='hadm_id')
+        
+        fahrenheit = events['vital'] == 'temperature_f'
+        events.loc[fahrenheit, 'value'] = ((events.loc[fahrenheit, 'value'] - 32) * 5 / 9).round(1)
+        events.loc[fahrenheit, 'vital'] = 'temperature'
+        
+        events['offset'] = (events['charttime'] - events['admittime']).abs()
+        events = events[events['offset'] <= pd.Timedelta(hours=CHARTEVENTS_WINDOW_HOURS)]
+        
+        nearest = events.sort_values('offset', kind='stable').groupby(['hadm_id', 'vital']).first()
+        return nearest['value'].unstack()
+    
+    def _chartevents_vital_rows(self, hadm_ids: List[int]) -> pd.DataFrame:
+        """
+        VITAL_ITEMIDS rows of chartevents for the given admissions
+        
+        Unless the table is already in memory, chartevents (hundreds of
+        millions of rows in full MIMIC-IV) is streamed in chunks and only the
+        matching rows are kept.
+        """
+        columns = ['hadm_id', 'itemid', 'charttime', 'valuenum']
+        schema = MIMIC_TABLES['chartevents']
+        loaded = self.__dict__.get('_table_chartevents')
+        if loaded is not None:
+            chunks = [loaded[columns]]
+        elif schema['path'].exists():
+            chunks = self.iter_table_chunks(
+                schema['path'],
+                usecols=columns,
+                hadm_ids=hadm_ids,
+                dtype={col: schema['dtype'][col] for col in ('hadm_id', 'itemid', 'valuenum')}
+            )
+        else:
+            chunks = []
+        
+        vital_itemids = list(VITAL_ITEMIDS.keys())
+        kept = [
+            chunk.loc[
+                chunk['itemid'].isin(vital_itemids) & chunk['valuenum'].notna() & chunk['hadm_id'].notna(),
+                columns
+            ]
+            for chunk in chunks
+        ]
+        return pd.concat(kept, ignore_index=True) if kept else pd.DataFrame(columns=columns)
+    
+    def _omr_vitals(self, admissions: pd.DataFrame) -> pd.DataFrame:
+        """Outpatient BP and weight nearest to admittime within OMR_WINDOW_DAYS, one row per hadm_id"""
+        omr = self.omr
+        omr = omr[omr['subject_id'].isin(admissions['subject_id'])]
+        result_name = omr['result_name'].astype(str)
+        
+        bp = omr[result_name == 'Blood Pressure']
+        bp_parts = bp['result_value'].astype(str).str.split('/', n=1, expand=True).reindex(columns=[0, 1])
+        weight = omr[result_name == 'Weight (Lbs)']
+        
+        readings = {
+            'blood_pressure': pd.DataFrame({
+                'subject_id': bp['subject_id'].to_numpy(),
+                'chartdate': bp['chartdate'].to_numpy(),
+                'systolic_bp': pd.to_numeric(bp_parts[0], errors='coerce').to_numpy(),
+                'diastolic_bp': pd.to_numeric(bp_parts[1], errors='coerce').to_numpy(),
+            }),
+            'weight': pd.DataFrame({
+                'subject_id': weight['subject_id'].to_numpy(),
+                'chartdate': weight['chartdate'].to_numpy(),
+                'weight_kg': (pd.to_numeric(weight['result_value'], errors='coerce') * 0.453592).round(1).to_numpy(),
+            }),
+        }
+        
+        left = admissions.sort_values('admittime', kind='stable')
+        vitals = pd.DataFrame(index=pd.Index(admissions['hadm_id'].astype('int64'), name='hadm_id'))
+        for frame in readings.values():
+            frame = frame.dropna()
+            frame['chartdate'] = pd.to_datetime(frame['chartdate']).astype('datetime64[ns]')
+            frame['subject_id'] = frame['subject_id'].astype(left['subject_id'].dtype)
+            joined = pd.merge_asof(
+                left, frame.sort_values('chartdate', kind='stable'),
+                left_on='admittime', right_on='chartdate', by='subject_id',
+                direction='nearest', tolerance=pd.Timedelta(days=OMR_WINDOW_DAYS)
+            )
+            columns = [c for c in frame.columns if c not in ('subject_id', 'chartdate')]
+            vitals = vitals.join(joined.set_index(joined['hadm_id'].astype('int64'))[columns])
+        
+        return vitals.dropna(how='all')
+    
+    def chest_pain_cohort(self) -> pd.DataFrame:
+        """
+        Chest pain related diagnoses, matched by ICD-9/ICD-10 prefix
+        
+        Returns:
+            The matching diagnoses_icd rows plus a categorical `category`
+            column (see CHEST_PAIN_ICD_CATEGORIES)
+        """
+        return CHEST_PAIN_MATCHER.filter(self.diagnoses)
     
     def filter_chest_pain_patients(self) -> List[int]:
         """
@@ -85,14 +514,7 @@ class MIMICDataLoader:
         Returns:
             List of hadm_id (admission IDs) for chest pain patients
         """
-        if self.diagnoses is None:
-            raise ValueError("Diagnoses not loaded. Call load_all() first.")
-        
-        # Filter by ICD codes related to chest pain
-        chest_pain_codes = list(CHEST_PAIN_ICD9_CODES.keys())
-        chest_pain_dx = self.diagnoses[
-            self.diagnoses['icd_code'].isin(chest_pain_codes)
-        ]
+        chest_pain_dx = self.chest_pain_cohort()
         
         logger.info(f"Found {len(chest_pain_dx)} chest pain diagnoses")
         
@@ -107,11 +529,11 @@ class MIMICDataLoader:
         """Get comprehensive data for a specific admission"""
         try:
             # Get admission info
-            admission = self.admissions[self.admissions['hadm_id'] == hadm_id].iloc[0]
+            admission = self.admissions.iloc[self._admission_rows[hadm_id]]
             subject_id = admission['subject_id']
             
             # Get patient demographics
-            patient = self.patients[self.patients['subject_id'] == subject_id].iloc[0]
+            patient = self.patients.iloc[self._patient_rows[subject_id]]
             
             # Calculate age at admission
             anchor_age = patient['anchor_age']
@@ -120,18 +542,19 @@ class MIMICDataLoader:
             age = anchor_age + (admit_year - anchor_year)
             
             # Get diagnoses
-            patient_dx = self.diagnoses[self.diagnoses['hadm_id'] == hadm_id]
-            icd_codes = patient_dx['icd_code'].tolist()
+            diagnoses_by_hadm, diagnosis_ranges = self._diagnosis_index
+            start, stop = diagnosis_ranges.get(hadm_id, (0, 0))
+            icd_codes = diagnoses_by_hadm['icd_code'].iloc[start:stop].tolist()
+            icd_versions = [int(v) for v in diagnoses_by_hadm['icd_version'].iloc[start:stop]]
             
             # Map ICD codes to descriptions
-            dx_descriptions = []
-            for code in icd_codes:
-                dx_info = self.d_icd[self.d_icd['icd_code'] == code]
-                if not dx_info.empty:
-                    dx_descriptions.append(dx_info.iloc[0]['long_title'])
+            dx_descriptions = [
+                self._icd_titles[code] for code in icd_codes if code in self._icd_titles
+            ]
             
             # Get lab values
             labs = self._get_lab_values(subject_id, hadm_id)
+            medications, microbiology = self._get_timeline_context(hadm_id)
             
             # Create structured patient data
             patient_data = PatientData(
@@ -141,10 +564,13 @@ class MIMICDataLoader:
                 gender=patient['gender'],
                 chief_complaint="chest pain",  # Inferred from diagnosis codes
                 admission_time=pd.to_datetime(admission['admittime']),
-                vitals=self._simulate_vitals(),  # MIMIC demo may not have all vitals
+                vitals=self._get_vitals(hadm_id),
                 labs=labs,
                 diagnoses=dx_descriptions,
-                icd_codes=icd_codes
+                icd_codes=icd_codes,
+                medications=medications,
+                microbiology=microbiology,
+                icd_versions=icd_versions
             )
             
             return patient_data
@@ -153,103 +579,328 @@ class MIMICDataLoader:
             logger.error(f"Error getting patient data for hadm_id {hadm_id}: {e}")
             return None
     
-    def _get_lab_values(self, subject_id: int, hadm_id: int) -> Dict[str, List[Tuple[datetime, float]]]:
-        """Extract lab values for a patient"""
-        patient_labs = self.labevents[
-            (self.labevents['subject_id'] == subject_id) &
-            (self.labevents['hadm_id'] == hadm_id)
+    def iter_table_chunks(
+        self,
+        csv_path: Path,
+        usecols: Optional[List[str]] = None,
+        hadm_ids: Optional[List[int]] = None,
+        chunksize: int = STREAM_CHUNKSIZE,
+        dtype: Optional[Dict[str, str]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Stream a large MIMIC table in chunks of bounded size
+        
+        Args:
+            csv_path: Table to read
+            usecols: Columns to keep
+            hadm_ids: If given, only rows for these admissions are yielded
+            chunksize: Rows parsed per chunk
+            dtype: Column dtypes (see config.MIMIC_TABLES)
+        """
+        cohort = pd.Index(hadm_ids) if hadm_ids is not None else None
+        for chunk in pd.read_csv(csv_path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+            if cohort is not None:
+                chunk = chunk[chunk['hadm_id'].isin(cohort)]
+            if not chunk.empty:
+                yield chunk
+    
+    def stream_labevents(
+        self,
+        hadm_ids: Optional[List[int]] = None,
+        store_path: Path = LAB_STORE_PATH,
+        chunksize: int = STREAM_CHUNKSIZE,
+        csv_path: Path = LABEVENTS_CSV
+    ) -> LabEventStore:
+        """
+        Read labevents in chunks and spill the cohort's labs to disk
+        
+        Only the IMPORTANT_LABS itemids and (optionally) the given admissions
+        are kept, so peak memory is one chunk regardless of file size.
+        Subsequent lab lookups are served from the on-disk store.
+        
+        Args:
+            hadm_ids: Cohort to keep (e.g. filter_chest_pain_patients());
+                None keeps every admission
+            store_path: SQLite file for the spilled results (recreated)
+            chunksize: Rows parsed per chunk
+            csv_path: labevents file to stream
+        """
+        store = LabEventStore(store_path)
+        store.clear()
+        
+        rows_read = rows_kept = 0
+        for chunk in self.iter_table_chunks(
+            csv_path,
+            usecols=['hadm_id', 'itemid', 'charttime', 'valuenum'],
+            hadm_ids=hadm_ids,
+            chunksize=chunksize,
+            dtype={col: MIMIC_TABLES['labevents']['dtype'][col] for col in ('hadm_id', 'itemid', 'valuenum')}
+        ):
+            rows_read += len(chunk)
+            rows_kept += store.append(self._prepare_labs(chunk))
+        
+        logger.info(f"Streamed labevents: kept {rows_kept} of {rows_read} cohort rows in {store_path}")
+        
+        self.lab_store = store
+        self.streaming = True
+        return store
+    
+    @staticmethod
+    def _prepare_labs(labevents: pd.DataFrame) -> pd.DataFrame:
+        """
+        Reduce labevents to the important labs in a single vectorized pass
+        
+        Keeps rows with a numeric value, parses charttime once for the whole
+        column and orders rows by (hadm_id, lab, charttime).
+        """
+        labs = labevents.loc[
+            labevents['itemid'].isin(list(IMPORTANT_LABS.keys())) & labevents['valuenum'].notna(),
+            ['hadm_id', 'itemid', 'charttime', 'valuenum']
         ]
+        labs = labs[labs['hadm_id'].notna()]
+        
+        lab_names = pd.Categorical(
+            labs['itemid'].map(IMPORTANT_LABS),
+            categories=list(dict.fromkeys(IMPORTANT_LABS.values())),
+            ordered=True
+        )
+        labs = pd.DataFrame({
+            'hadm_id': labs['hadm_id'].astype('int64').to_numpy(),
+            'lab_name': lab_names,
+            'charttime': pd.to_datetime(labs['charttime']).to_numpy(),
+            'valuenum': labs['valuenum'].to_numpy(),
+        })
+        return labs.sort_values(['hadm_id', 'lab_name', 'charttime'], kind='stable')
+    
+    @staticmethod
+    def _group_labs(labs: pd.DataFrame) -> Dict[int, Dict[str, LabSeries]]:
+        """Group prepared lab rows into {hadm_id: {lab name: LabSeries}}"""
+        times = labs['charttime'].to_numpy().astype('datetime64[ns]').view(np.int64)
+        values = labs['valuenum'].to_numpy(dtype=np.float32)
+        
+        grouped: Dict[int, Dict[str, LabSeries]] = {}
+        for (hadm_id, lab_name), positions in labs.groupby(
+            ['hadm_id', 'lab_name'], sort=False, observed=True
+        ).indices.items():
+            grouped.setdefault(int(hadm_id), {})[lab_name] = LabSeries(
+                times[positions], values[positions]
+            )
+        return grouped
+    
+    def _get_lab_values(self, subject_id: int, hadm_id: int) -> Dict[str, LabSeries]:
+        """Extract lab values for a patient"""
+        if self.lab_store is not None:
+            labs_dict = self.lab_store.get(hadm_id)
+        else:
+            labs_by_hadm, lab_ranges = self._lab_index
+            start, stop = lab_ranges.get(hadm_id, (0, 0))
+            patient_labs = labs_by_hadm.iloc[start:stop]
+            labs_dict = self._group_labs(patient_labs).get(hadm_id, {})
         
-        labs_dict = {}
-        
-        # Key lab tests
-        important_labs = {
-            51222: 'Hemoglobin',
-            51265: 'Platelet Count',
-            50912: 'Creatinine',
-            50902: 'Chloride',
-            50971: 'Potassium',
-            50983: 'Sodium',
-            50931: 'Glucose',
-            50878: 'AST',
-            50861: 'ALT',
-            51237: 'INR',
-            51274: 'PT',
-            51275: 'PTT',
+        return self._fill_simulated_labs(hadm_id, labs_dict)
+    
+    def get_lab_values_bulk(self, hadm_ids: List[int]) -> Dict[int, Dict[str, LabSeries]]:
+        """
+        Extract lab values for many admissions at once
+        
+        Filters the prepared lab rows once for the whole batch and groups them
+        by (admission, lab) instead of slicing per admission.
+        
+        Returns:
+            {hadm_id: {lab name: LabSeries}} for every requested admission
+        """
+        hadm_ids = [int(h) for h in hadm_ids]
+        if self.lab_store is not None:
+            grouped = self.lab_store.get_many(hadm_ids)
+        else:
+            labs_by_hadm = self._lab_index[0]
+            labs = labs_by_hadm[labs_by_hadm['hadm_id'].isin(hadm_ids)]
+            grouped = self._group_labs(labs)
+        
+        return {
+            hadm_id: self._fill_simulated_labs(hadm_id, grouped.get(hadm_id, {}))
+            for hadm_id in hadm_ids
         }
+    
+    def _get_vitals(self, hadm_id: int) -> Dict[str, float]:
+        """Measured vitals for an admission, simulated only where data is missing"""
+        measured = self._vitals_by_hadm.get(int(hadm_id), {})
+        if all(name in measured for name in VITAL_SIGNS):
+            return dict(measured)
         
-        # Note: MIMIC demo may not have troponin/BNP
-        # In production, itemid for troponin would be ~51003
-        
-        for itemid, lab_name in important_labs.items():
-            lab_values = patient_labs[patient_labs['itemid'] == itemid]
-            if not lab_values.empty:
-                values = []
-                for _, row in lab_values.iterrows():
-                    if pd.notna(row['valuenum']):
-                        time = pd.to_datetime(row['charttime'])
-                        values.append((time, float(row['valuenum'])))
-                
-                if values:
-                    labs_dict[lab_name] = sorted(values, key=lambda x: x[0])
-        
-        # Simulate troponin for demo purposes (in real MIMIC-IV full version, this exists)
-        labs_dict['Troponin'] = self._simulate_troponin()
-        labs_dict['BNP'] = self._simulate_bnp()
+        vitals = self._simulate_vitals(hadm_id)
+        vitals.update(measured)
+        return vitals
+    
+    def _get_timeline_context(self, hadm_id: int) -> Tuple[List[str], List[str]]:
+        """Prescribed drugs and cultured organisms for an admission, in time order"""
+        if not self.timeline_context:
+            return [], []
+        medications = self.timeline.distinct_labels(hadm_id, ['prescriptions'])
+        organisms = self.timeline.distinct_labels(hadm_id, ['microbiologyevents'], flagged=True)
+        return medications, organisms
+    
+    def _fill_simulated_labs(
+        self, hadm_id: int, labs_dict: Dict[str, LabSeries]
+    ) -> Dict[str, LabSeries]:
+        """Add seeded troponin/BNP when the admission has no measured values"""
+        if 'Troponin' in labs_dict and 'BNP' in labs_dict:
+            return labs_dict
+        
+        row = self._admission_rows.get(int(hadm_id))
+        admit_time = pd.Timestamp(self.admissions['admittime'].iloc[row]) if row is not None else pd.Timestamp(0)
         
+        # Demo extract has no troponin/BNP; full MIMIC-IV does
+        if 'Troponin' not in labs_dict:
+            labs_dict['Troponin'] = LabSeries.from_pairs(self._simulate_troponin(hadm_id, admit_time))
+        if 'BNP' not in labs_dict:
+            labs_dict['BNP'] = LabSeries.from_pairs(self._simulate_bnp(hadm_id, admit_time))
         return labs_dict
     
-    def _simulate_vitals(self) -> Dict[str, float]:
-        """Simulate vital signs (demo dataset may not have all)"""
-        # In production, these would come from chartevents
+    @staticmethod
+    def _seeded_rng(hadm_id: int, stream: int) -> np.random.Generator:
+        """Deterministic generator per admission, so reruns see identical patients"""
+        return np.random.default_rng([int(hadm_id), stream])
+    
+    def _simulate_vitals(self, hadm_id: int) -> Dict[str, float]:
+        """Simulate vital signs (fallback when no chartevents/omr data)"""
+        rng = self._seeded_rng(hadm_id, 0)
         return {
-            'heart_rate': np.random.randint(60, 120),
-            'systolic_bp': np.random.randint(100, 160),
-            'diastolic_bp': np.random.randint(60, 100),
-            'respiratory_rate': np.random.randint(12, 24),
-            'o2_saturation': np.random.randint(92, 100),
-            'temperature': round(np.random.uniform(36.5, 38.5), 1)
+            'heart_rate': int(rng.integers(60, 120)),
+            'systolic_bp': int(rng.integers(100, 160)),
+            'diastolic_bp': int(rng.integers(60, 100)),
+            'respiratory_rate': int(rng.integers(12, 24)),
+            'o2_saturation': int(rng.integers(92, 100)),
+            'temperature': round(float(rng.uniform(36.5, 38.5)), 1)
         }
     
-    def _simulate_troponin(self) -> List[Tuple[datetime, float]]:
-        """Simulate serial troponin measurements"""
-        now = datetime.now()
+    def _simulate_troponin(self, hadm_id: int, admit_time: datetime) -> List[Tuple[datetime, float]]:
+        """Simulate serial troponin measurements at 0h, 3h and 6h"""
+        rng = self._seeded_rng(hadm_id, 1)
+        times = [admit_time + pd.Timedelta(hours=h) for h in (0, 3, 6)]
         
         # Simulate 3 serial troponins
-        baseline = np.random.choice([0.02, 0.03, 0.04, 0.08, 0.15, 0.5])
+        baseline = float(rng.choice([0.02, 0.03, 0.04, 0.08, 0.15, 0.5]))
         
         if baseline < 0.05:  # Normal
             return [
-                (now, baseline),
-                (now, baseline + np.random.uniform(-0.01, 0.01)),
-                (now, baseline + np.random.uniform(-0.01, 0.01))
+                (times[0], baseline),
+                (times[1], baseline + float(rng.uniform(-0.01, 0.01))),
+                (times[2], baseline + float(rng.uniform(-0.01, 0.01)))
             ]
         else:  # Elevated - simulate rising trend
             return [
-                (now, baseline),
-                (now, baseline * 1.5),
-                (now, baseline * 2.0)
+                (times[0], baseline),
+                (times[1], baseline * 1.5),
+                (times[2], baseline * 2.0)
             ]
     
-    def _simulate_bnp(self) -> List[Tuple[datetime, float]]:
+    def _simulate_bnp(self, hadm_id: int, admit_time: datetime) -> List[Tuple[datetime, float]]:
         """Simulate BNP measurement"""
-        now = datetime.now()
-        bnp_value = np.random.choice([50, 100, 200, 500, 1000])
-        return [(now, bnp_value)]
+        rng = self._seeded_rng(hadm_id, 2)
+        bnp_value = float(rng.choice([50, 100, 200, 500, 1000]))
+        return [(admit_time, bnp_value)]
+    
+    def get_patients_bulk(
+        self,
+        hadm_ids: List[int],
+        n_jobs: int = 1,
+        chunk_size: int = 2000
+    ) -> List[PatientData]:
+        """
+        Build PatientData for many admissions in one pass
+        
+        Demographics come from a single admissions/patients merge, diagnoses
+        and labs from one groupby each, instead of per-admission lookups.
+        
+        Args:
+            hadm_ids: Admission IDs to build (duplicates are ignored)
+            n_jobs: Worker processes; chunks of admissions are built in
+                parallel when greater than 1
+            chunk_size: Admissions per worker task
+        
+        Returns:
+            PatientData in request order; unknown admissions are skipped
+        """
+        hadm_ids = list(dict.fromkeys(int(h) for h in hadm_ids))
+        
+        if n_jobs <= 1 or len(hadm_ids) <= chunk_size:
+            patients = self._build_patients(hadm_ids)
+        else:
+            chunks = [hadm_ids[i:i + chunk_size] for i in range(0, len(hadm_ids), chunk_size)]
+            patients = []
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_bulk_worker, initargs=(self,)
+            ) as pool:
+                for chunk_patients in pool.map(_build_patients_chunk, chunks):
+                    patients.extend(chunk_patients)
+        
+        if len(patients) < len(hadm_ids):
+            logger.warning(f"Skipped {len(hadm_ids) - len(patients)} admissions without patient data")
+        logger.info(f"Built {len(patients)} patients in bulk")
+        return patients
     
-    def get_sample_patients(self, n: int = 10) -> List[PatientData]:
+    def _build_patients(self, hadm_ids: List[int]) -> List[PatientData]:
+        """Vectorized PatientData assembly for one chunk of admissions"""
+        admissions = self.admissions.loc[
+            self.admissions['hadm_id'].isin(hadm_ids), ['subject_id', 'hadm_id', 'admittime']
+        ]
+        cohort = admissions.merge(
+            self.patients[['subject_id', 'gender', 'anchor_age', 'anchor_year']],
+            on='subject_id', how='inner'
+        )
+        cohort['admittime'] = pd.to_datetime(cohort['admittime'])
+        cohort['age'] = cohort['anchor_age'] + (cohort['admittime'].dt.year - cohort['anchor_year'])
+        
+        diagnoses_by_hadm = self._diagnosis_index[0]
+        dx = diagnoses_by_hadm[diagnoses_by_hadm['hadm_id'].isin(hadm_ids)]
+        codes = np.asarray(dx['icd_code'], dtype=object)
+        versions = np.asarray(dx['icd_version'], dtype=np.int64)
+        positions_by_hadm = dx.groupby('hadm_id', sort=False).indices
+        codes_by_hadm = {int(h): codes[positions].tolist() for h, positions in positions_by_hadm.items()}
+        versions_by_hadm = {int(h): versions[positions].tolist() for h, positions in positions_by_hadm.items()}
+        labs_by_hadm = self.get_lab_values_bulk(cohort['hadm_id'].tolist())
+        
+        rows_by_hadm = {
+            row.hadm_id: row for row in cohort.itertuples(index=False)
+        }
+        
+        patients = []
+        for hadm_id in hadm_ids:
+            row = rows_by_hadm.get(hadm_id)
+            if row is None:
+                continue
+            
+            icd_codes = codes_by_hadm.get(hadm_id, [])
+            medications, microbiology = self._get_timeline_context(hadm_id)
+            patients.append(PatientData(
+                patient_id=str(row.subject_id),
+                hadm_id=str(hadm_id),
+                age=int(row.age),
+                gender=row.gender,
+                chief_complaint="chest pain",
+                admission_time=row.admittime,
+                vitals=self._get_vitals(hadm_id),
+                labs=labs_by_hadm[hadm_id],
+                diagnoses=[self._icd_titles[c] for c in icd_codes if c in self._icd_titles],
+                icd_codes=icd_codes,
+                medications=medications,
+                microbiology=microbiology,
+                icd_versions=versions_by_hadm.get(hadm_id, [])
+            ))
+        
+        return patients
+    
+    def get_sample_patients(self, n: int = 10, seed: Optional[int] = None) -> List[PatientData]:
         """Get a sample of chest pain patients for testing"""
         chest_pain_admissions = self.filter_chest_pain_patients()
         
-        sample_hadm_ids = chest_pain_admissions['hadm_id'].sample(
-            min(n, len(chest_pain_admissions))
+        rng = np.random.default_rng(seed)
+        sample_hadm_ids = rng.choice(
+            chest_pain_admissions, size=min(n, len(chest_pain_admissions)), replace=False
         ).tolist()
         
-        patients = []
-        for hadm_id in sample_hadm_ids:
-            patient_data = self.get_patient_data(hadm_id)
-            if patient_data:
-                patients.append(patient_data)
+        patients = self.get_patients_bulk(sample_hadm_ids)
         
         logger.info(f"Loaded {len(patients)} sample patients")
         return patients
@@ -276,27 +927,12 @@ Key Labs:
     
     for lab_name, values in patient.labs.items():
         if values:
-            latest_value = values[-1][1]
-            summary += f"- {lab_name}: {latest_value}\n"
+            summary += f"- {lab_name}: {values.latest()}\n"
     
     summary += f"\nFinal Diagnoses: {', '.join(patient.diagnoses[:3])}\n"
     
     return summary
 
-def calculate_troponin_trend(troponin_values: List[Tuple[datetime, float]]) -> str:
+def calculate_troponin_trend(troponin_values) -> str:
     """Determine if troponin is rising, falling, or stable"""
-    if len(troponin_values) < 2:
-        return "insufficient_data"
-    
-    values = [v[1] for v in troponin_values]
-    
-    # Check trend
-    first_half = np.mean(values[:len(values)//2])
-    second_half = np.mean(values[len(values)//2:])
-    
-    if second_half > first_half * 1.2:
-        return "rising"
-    elif second_half < first_half * 0.8:
-        return "falling"
-    else:
-        return "stable"
+    return LabSeries.coerce(troponin_values).trend()
@@ -0,0 +1,87 @@
+"""
+Level-gated diagnostic logging for the agent hot path
+
+Agents and the orchestrator report per-request detail (every analysis,
+every gathered result) through this channel instead of calling loguru or
+print directly. Messages use loguru's "{}" formatting and are only formatted
+when their level passes the gate, and any argument that is a callable is
+only called then, so expensive summaries cost nothing in production:
+
+    diagnostics.debug("{} results: {}", len(results), lambda: describe(results))
+
+The gate defaults to LOG_LEVEL (INFO). Demos get their verbose view with
+LOG_LEVEL=DEBUG or diagnostics.set_level("DEBUG"); configure() also installs
+queued (background-thread) loguru sinks so writing logs never blocks a request.
+"""
+
+import sys
+from pathlib import Path
+from typing import Any, Iterable, List, Union
+
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import LOG_ENQUEUE, LOG_FORMAT, LOG_LEVEL
+
+_threshold = logger.level(LOG_LEVEL).no
+
+
+def set_level(level: Union[str, int]):
+    """Lowest level that diagnostics are formatted and emitted at"""
+    global _threshold
+    _threshold = level if isinstance(level, int) else logger.level(level).no
+
+
+def is_enabled(level: Union[str, int]) -> bool:
+    return (level if isinstance(level, int) else logger.level(level).no) >= _threshold
+
+
+def configure(
+    level: Union[str, int] = LOG_LEVEL,
+    sinks: Iterable[Any] = (sys.stderr,),
+    enqueue: bool = LOG_ENQUEUE,
+    format: str = LOG_FORMAT
+) -> List[int]:
+    """
+    Replace loguru's handlers and set the diagnostics gate
+
+    Args:
+        level: Minimum level for both the gate and the sinks
+        sinks: Streams, paths or callables accepted by logger.add
+        enqueue: Write through a queue drained by a background thread
+
+    Returns:
+        The loguru handler ids
+    """
+    set_level(level)
+    logger.remove()
+    return [logger.add(sink, level=level, format=format, enqueue=enqueue) for sink in sinks]
+
+
+def log(level: str, message: str, *args, **kwargs):
+    """Emit message at level if the gate allows it (callable args are called lazily)"""
+    if logger.level(level).no < _threshold:
+        return
+    _emit(level, message, args, kwargs)
+
+
+def _emit(level: str, message: str, args: tuple, kwargs: dict):
+    args = tuple(arg() if callable(arg) else arg for arg in args)
+    kwargs = {key: value() if callable(value) else value for key, value in kwargs.items()}
+    # depth=2 attributes the record to the caller of debug()/info()/log()
+    logger.opt(depth=2).log(level, message, *args, **kwargs)
+
+
+_DEBUG = logger.level("DEBUG").no
+_INFO = logger.level("INFO").no
+
+
+def debug(message: str, *args, **kwargs):
+    if _DEBUG >= _threshold:
+        _emit("DEBUG", message, args, kwargs)
+
+
+def info(message: str, *args, **kwargs):
+    if _INFO >= _threshold:
+        _emit("INFO", message, args, kwargs)
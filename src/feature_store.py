@@ -0,0 +1,226 @@
+"""
+Persistent PatientData feature store
+
+Assembled patients (demographics, diagnoses, ICD codes, vitals and lab time
+series) are stored in SQLite keyed by hadm_id, so agents and demos can fetch
+a patient without touching the raw MIMIC tables. Recently used patients are
+also kept decoded in memory.
+"""
+
+import json
+import sqlite3
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import FEATURE_STORE_PATH
+from data_loader import MIMICDataLoader, PatientData
+from lab_series import LabSeries, as_float64
+
+# SQLite's default limit on bound parameters is 999
+_MAX_QUERY_PARAMS = 900
+# Bump when the payload layout changes so existing stores are rebuilt
+PAYLOAD_VERSION = 5
+
+
+def encode_patient(patient: PatientData) -> str:
+    """Serialize a PatientData to a JSON record"""
+    return json.dumps({
+        "patient_id": patient.patient_id,
+        "hadm_id": patient.hadm_id,
+        "age": patient.age,
+        "gender": patient.gender,
+        "chief_complaint": patient.chief_complaint,
+        "admission_time": pd.Timestamp(patient.admission_time).value,
+        "vitals": patient.vitals,
+        "labs": {
+            name: [values.times.tolist(), as_float64(values.values).tolist()]
+            for name, values in patient.labs.items()
+        },
+        "diagnoses": patient.diagnoses,
+        "icd_codes": patient.icd_codes,
+        "medications": patient.medications,
+        "microbiology": patient.microbiology,
+        "icd_versions": patient.icd_versions,
+    })
+
+
+def decode_patient(payload: str) -> PatientData:
+    """Rebuild a PatientData from encode_patient output"""
+    record = json.loads(payload)
+    return PatientData(
+        patient_id=record["patient_id"],
+        hadm_id=record["hadm_id"],
+        age=record["age"],
+        gender=record["gender"],
+        chief_complaint=record["chief_complaint"],
+        admission_time=pd.Timestamp(record["admission_time"]),
+        vitals=record["vitals"],
+        labs={
+            name: LabSeries(times, values)
+            for name, (times, values) in record["labs"].items()
+        },
+        diagnoses=record["diagnoses"],
+        icd_codes=record["icd_codes"],
+        medications=record["medications"],
+        microbiology=record["microbiology"],
+        icd_versions=record["icd_versions"],
+    )
+
+
+class PatientFeatureStore:
+    """SQLite store of assembled PatientData keyed by hadm_id"""
+
+    def __init__(self, path: Path = FEATURE_STORE_PATH, memory_size: int = 10000):
+        self.path = Path(path)
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[int, PatientData]" = OrderedDict()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS patients (hadm_id INTEGER PRIMARY KEY, payload TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+        return self._conn
+
+    def __getstate__(self):
+        # Connections cannot cross process boundaries; workers reopen lazily
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    def refresh(
+        self,
+        loader: MIMICDataLoader,
+        hadm_ids: Optional[Iterable[int]] = None,
+        source_version: Optional[str] = None,
+        n_jobs: int = 1
+    ) -> int:
+        """
+        Add admissions that are not stored yet
+
+        If the source tables changed since the last refresh, the store is
+        rebuilt from scratch instead.
+
+        Args:
+            loader: Loader used to assemble missing patients
+            hadm_ids: Admissions to cover (defaults to every admission)
+            source_version: Version of the source data; defaults to
+                loader.source_fingerprint()
+            n_jobs: Worker processes passed to get_patients_bulk
+
+        Returns:
+            Number of patients written
+        """
+        # Patients assembled without the timeline have empty medications/microbiology
+        source_version = (
+            f"{source_version or loader.source_fingerprint()}:v{PAYLOAD_VERSION}"
+            f":timeline={int(loader.timeline_context)}"
+        )
+        if self._get_meta("source_version") != source_version:
+            if len(self):
+                logger.info("MIMIC source data changed; rebuilding feature store")
+            self.clear()
+
+        if hadm_ids is None:
+            hadm_ids = loader.admissions['hadm_id'].tolist()
+        stored = set(self.hadm_ids())
+        missing = [int(h) for h in dict.fromkeys(hadm_ids) if int(h) not in stored]
+
+        written = self.put_many(loader.get_patients_bulk(missing, n_jobs=n_jobs)) if missing else 0
+        self._set_meta("source_version", source_version)
+
+        logger.info(f"Feature store refreshed: {written} new patients, {len(stored)} already stored")
+        return written
+
+    def put_many(self, patients: Iterable[PatientData]) -> int:
+        rows = [(int(p.hadm_id), encode_patient(p)) for p in patients]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO patients VALUES (?, ?)", rows)
+        for hadm_id, _ in rows:
+            self._memory.pop(hadm_id, None)
+        return len(rows)
+
+    def get(self, hadm_id: int) -> Optional[PatientData]:
+        """Fetch one patient, or None if it is not stored"""
+        hadm_id = int(hadm_id)
+        patient = self._memory.get(hadm_id)
+        if patient is not None:
+            self._memory.move_to_end(hadm_id)
+            return patient
+
+        row = self.conn.execute(
+            "SELECT payload FROM patients WHERE hadm_id = ?", (hadm_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        patient = decode_patient(row[0])
+        self._remember(hadm_id, patient)
+        return patient
+
+    def get_many(self, hadm_ids: Iterable[int]) -> Dict[int, PatientData]:
+        """Fetch many patients; admissions that are not stored are omitted"""
+        hadm_ids = [int(h) for h in hadm_ids]
+        found = {h: self._memory[h] for h in hadm_ids if h in self._memory}
+        missing = [h for h in hadm_ids if h not in found]
+
+        for i in range(0, len(missing), _MAX_QUERY_PARAMS):
+            batch = missing[i:i + _MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            for hadm_id, payload in self.conn.execute(
+                f"SELECT hadm_id, payload FROM patients WHERE hadm_id IN ({placeholders})", batch
+            ):
+                found[hadm_id] = decode_patient(payload)
+                self._remember(hadm_id, found[hadm_id])
+
+        return {h: found[h] for h in hadm_ids if h in found}
+
+    def hadm_ids(self) -> List[int]:
+        return [row[0] for row in self.conn.execute("SELECT hadm_id FROM patients")]
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM patients")
+            self.conn.execute("DELETE FROM meta")
+        self._memory.clear()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def __contains__(self, hadm_id: int) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM patients WHERE hadm_id = ?", (int(hadm_id),)
+        ).fetchone() is not None
+
+    def _remember(self, hadm_id: int, patient: PatientData):
+        self._memory[hadm_id] = patient
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
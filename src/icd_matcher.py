@@ -0,0 +1,117 @@
+"""
+ICD code prefix matching
+
+Compiles {category: {icd_version: [code prefixes]}} into one prefix trie per
+ICD version. A prefix matches the code itself and all of its sub-codes, and
+the longest matching prefix decides the category.
+
+Matching a diagnoses table is vectorized: each distinct (code, version) pair
+is looked up once and the result is broadcast back to every row, so the cost
+scales with the number of distinct codes rather than with the table size.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+_END = object()  # Trie key marking the end of a prefix; its value is the category
+
+
+def normalize_icd_code(code) -> str:
+    """Upper-case, without dots or whitespace (MIMIC stores codes undotted)"""
+    return str(code).strip().upper().replace(".", "")
+
+
+class ICDPrefixMatcher:
+    """Version-aware ICD-9/ICD-10 prefix trie"""
+
+    def __init__(self, categories: Dict[str, Dict[int, Iterable[str]]]):
+        """
+        Args:
+            categories: {category: {icd_version: [code prefixes]}}; when two
+                categories share a prefix, the first one listed wins
+        """
+        self.categories: List[str] = list(categories)
+        self._tries: Dict[int, dict] = {}
+
+        for category, prefixes_by_version in categories.items():
+            for version, prefixes in prefixes_by_version.items():
+                trie = self._tries.setdefault(int(version), {})
+                for prefix in prefixes:
+                    node = trie
+                    for char in normalize_icd_code(prefix):
+                        node = node.setdefault(char, {})
+                    node.setdefault(_END, category)
+
+    @property
+    def versions(self) -> List[int]:
+        return sorted(self._tries)
+
+    def match(self, code, version: Optional[int] = None) -> Optional[str]:
+        """
+        Category of a single code, or None if no prefix matches
+
+        Args:
+            code: ICD code, dotted or undotted
+            version: 9 or 10; None tries every version in ascending order
+        """
+        code = normalize_icd_code(code)
+        versions = self.versions if version is None else [int(version)]
+
+        for v in versions:
+            node = self._tries.get(v)
+            category = None
+            for char in code:
+                if node is None:
+                    break
+                category = node.get(_END, category)
+                node = node.get(char)
+            else:
+                if node is not None:
+                    category = node.get(_END, category)
+            if category is not None:
+                return category
+        return None
+
+    def match_codes(self, codes: pd.Series, versions: Optional[pd.Series] = None) -> pd.Categorical:
+        """
+        Category for every row (NaN where nothing matches)
+
+        Args:
+            codes: ICD codes (object or categorical)
+            versions: Matching ICD versions; without them every version is tried
+        """
+        result = np.full(len(codes), None, dtype=object)
+        codes = pd.Series(codes).reset_index(drop=True)
+
+        if versions is None:
+            groups = [(None, np.arange(len(codes)))]
+        else:
+            versions = pd.Series(versions).reset_index(drop=True)
+            groups = [
+                (int(v), positions)
+                for v, positions in versions.groupby(versions, sort=False).indices.items()
+            ]
+
+        for version, positions in groups:
+            codes_idx, uniques = pd.factorize(codes.iloc[positions])
+            matched = np.array([self.match(code, version) for code in uniques] + [None], dtype=object)
+            # factorize marks missing codes with -1, which selects the trailing None
+            result[positions] = matched[codes_idx]
+
+        return pd.Categorical(result, categories=self.categories)
+
+    def filter(self, diagnoses: pd.DataFrame) -> pd.DataFrame:
+        """
+        Matching rows of a diagnoses_icd-style frame, with a `category` column
+
+        Uses the `icd_version` column when present.
+        """
+        versions = diagnoses['icd_version'] if 'icd_version' in diagnoses.columns else None
+        category = self.match_codes(diagnoses['icd_code'], versions)
+
+        keep = ~pd.isna(category)
+        cohort = diagnoses.loc[keep].copy()
+        cohort['category'] = category[keep]
+        return cohort
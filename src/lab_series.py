@@ -0,0 +1,133 @@
+"""
+Compact lab time series
+
+A LabSeries stores one lab's measurements for one admission as two NumPy
+arrays (int64 epoch nanoseconds and float32 values) instead of a list of
+(datetime, float) tuples. It still iterates as (time, value) pairs, so code
+written against the list form keeps working.
+"""
+
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+def as_float64(values: np.ndarray) -> np.ndarray:
+    """
+    Widen stored values to float64 without float32 rounding noise
+
+    float32 13.1 widens to 13.100000381...; going through the shortest
+    decimal representation restores 13.1.
+    """
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return values.astype(str).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def _to_ns(time) -> int:
+    return pd.Timestamp(time).value
+
+
+class LabSeries:
+    """Time-sorted measurements of one lab: int64 epoch-ns times, float32 values"""
+
+    __slots__ = ("times", "values")
+    __hash__ = None
+
+    def __init__(self, times: Optional[np.ndarray] = None, values: Optional[np.ndarray] = None):
+        times = np.asarray(times if times is not None else [], dtype=np.int64)
+        values = np.asarray(values if values is not None else [], dtype=np.float32)
+        if times.shape != values.shape:
+            raise ValueError(f"times and values differ in length ({len(times)} vs {len(values)})")
+
+        if len(times) > 1 and np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+        self.times = times
+        self.values = values
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[datetime, float]]) -> "LabSeries":
+        """Build from [(time, value)] pairs"""
+        pairs = list(pairs)
+        return cls(
+            np.fromiter((_to_ns(time) for time, _ in pairs), dtype=np.int64, count=len(pairs)),
+            np.fromiter((value for _, value in pairs), dtype=np.float32, count=len(pairs)),
+        )
+
+    @classmethod
+    def coerce(cls, values: Union["LabSeries", Iterable[Tuple[datetime, float]]]) -> "LabSeries":
+        """Return values as a LabSeries, converting a list of pairs if needed"""
+        return values if isinstance(values, cls) else cls.from_pairs(values)
+
+    def latest(self, default: Optional[float] = None) -> Optional[float]:
+        """Most recent value, or default when there are no measurements"""
+        if not len(self.values):
+            return default
+        return float(as_float64(self.values[-1:])[0])
+
+    def latest_time(self) -> Optional[pd.Timestamp]:
+        return pd.Timestamp(int(self.times[-1])) if len(self.times) else None
+
+    def trend(self) -> str:
+        """Whether the values are rising, falling or stable (first vs second half)"""
+        if len(self.values) < 2:
+            return "insufficient_data"
+
+        values = as_float64(self.values)
+        half = len(values) // 2
+        first_half = values[:half].mean()
+        second_half = values[half:].mean()
+
+        if second_half > first_half * 1.2:
+            return "rising"
+        elif second_half < first_half * 0.8:
+            return "falling"
+        else:
+            return "stable"
+
+    def window(self, start=None, end=None) -> "LabSeries":
+        """Measurements with start <= time <= end (either bound may be None)"""
+        lo = np.searchsorted(self.times, _to_ns(start), side="left") if start is not None else 0
+        hi = np.searchsorted(self.times, _to_ns(end), side="right") if end is not None else len(self.times)
+        return LabSeries(self.times[lo:hi], self.values[lo:hi])
+
+    def to_list(self) -> List[Tuple[pd.Timestamp, float]]:
+        return list(zip(pd.to_datetime(self.times), as_float64(self.values).tolist()))
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __bool__(self) -> bool:
+        return len(self.times) > 0
+
+    def __iter__(self) -> Iterator[Tuple[pd.Timestamp, float]]:
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LabSeries(self.times[index], self.values[index])
+        return (pd.Timestamp(int(self.times[index])), float(as_float64(self.values[index:index + 1 or None])[0]))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LabSeries):
+            return np.array_equal(self.times, other.times) and np.array_equal(self.values, other.values)
+        if isinstance(other, (list, tuple)):
+            return self.to_list() == [(pd.Timestamp(time), value) for time, value in other]
+        return NotImplemented
+
+    def __getstate__(self):
+        return self.times, self.values
+
+    def __setstate__(self, state):
+        self.times, self.values = state
+
+    def __repr__(self) -> str:
+        return f"LabSeries({self.to_list()!r})"
@@ -0,0 +1,123 @@
+"""
+On-disk per-admission store for lab results
+
+Used by MIMICDataLoader's streaming mode: labevents is read in chunks,
+reduced to the labs the agents consume, and spilled here so memory stays
+bounded regardless of the size of labevents.csv.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import IMPORTANT_LABS
+from lab_series import LabSeries, as_float64
+
+# SQLite's default limit on bound parameters is 999
+_MAX_QUERY_PARAMS = 900
+_LAB_ORDER = {name: rank for rank, name in enumerate(dict.fromkeys(IMPORTANT_LABS.values()))}
+
+
+class LabEventStore:
+    """SQLite-backed {hadm_id: {lab name: LabSeries}} store"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS labs ("
+                "hadm_id INTEGER NOT NULL, lab_name TEXT NOT NULL, "
+                "charttime INTEGER NOT NULL, valuenum REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS labs_hadm ON labs (hadm_id)")
+        return self._conn
+
+    def __getstate__(self):
+        # Connections cannot cross process boundaries; workers reopen lazily
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    def append(self, labs: pd.DataFrame) -> int:
+        """
+        Spill prepared lab rows (hadm_id, lab_name, charttime, valuenum)
+
+        Returns:
+            Number of rows written
+        """
+        if labs.empty:
+            return 0
+
+        rows = zip(
+            labs["hadm_id"].astype("int64").tolist(),
+            labs["lab_name"].astype(str).tolist(),
+            pd.to_datetime(labs["charttime"]).astype("datetime64[ns]").astype("int64").tolist(),
+            # Widened via the shortest decimal repr so 13.1 is stored as 13.1
+            as_float64(labs["valuenum"].to_numpy()).tolist(),
+        )
+        with self.conn:
+            self.conn.executemany("INSERT INTO labs VALUES (?, ?, ?, ?)", rows)
+        return len(labs)
+
+    def get(self, hadm_id: int) -> Dict[str, LabSeries]:
+        """Lab time series for one admission"""
+        return self.get_many([hadm_id]).get(int(hadm_id), {})
+
+    def get_many(self, hadm_ids: Iterable[int]) -> Dict[int, Dict[str, LabSeries]]:
+        """Lab time series for many admissions, sorted by time within each lab"""
+        hadm_ids = list(dict.fromkeys(int(h) for h in hadm_ids))
+        grouped: Dict[int, Dict[str, List[tuple]]] = {}
+
+        for i in range(0, len(hadm_ids), _MAX_QUERY_PARAMS):
+            batch = hadm_ids[i:i + _MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            cursor = self.conn.execute(
+                f"SELECT hadm_id, lab_name, charttime, valuenum FROM labs "
+                f"WHERE hadm_id IN ({placeholders}) ORDER BY hadm_id, charttime, rowid",
+                batch
+            )
+            for hadm_id, lab_name, charttime, value in cursor:
+                grouped.setdefault(hadm_id, {}).setdefault(lab_name, []).append((charttime, value))
+
+        # Keep labs in the canonical IMPORTANT_LABS order
+        return {
+            hadm_id: {
+                name: LabSeries(
+                    np.fromiter((t for t, _ in rows), dtype=np.int64, count=len(rows)),
+                    np.fromiter((v for _, v in rows), dtype=np.float32, count=len(rows)),
+                )
+                for name, rows in sorted(labs.items(), key=lambda item: _LAB_ORDER.get(item[0], len(_LAB_ORDER)))
+            }
+            for hadm_id, labs in grouped.items()
+        }
+
+    def hadm_ids(self) -> List[int]:
+        """Admissions with at least one stored lab"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT hadm_id FROM labs")]
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM labs")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM labs").fetchone()[0]
+
+    def __repr__(self) -> str:
+        return f"LabEventStore({self.path})"
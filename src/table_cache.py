@@ -0,0 +1,246 @@
+"""
+Columnar on-disk cache for MIMIC-IV tables
+
+Each CSV is parsed once and written as a directory of NumPy column files.
+Later loads memory-map those files instead of re-parsing the CSV, so worker
+cold start only pays for the pages a caller actually touches.
+
+Cache entries are keyed by the SHA256 of the source file (the same digest
+format as SHA256SUMS.txt), so editing or replacing a CSV invalidates its
+entry automatically.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import DATA_DIR, MIMIC_CACHE_DIR, SHA256SUMS_TXT
+
+CACHE_FORMAT_VERSION = 1
+_HASH_BLOCK_SIZE = 1 << 20
+# Nullable extension arrays stored as values + mask
+_MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+
+class ColumnarTableCache:
+    """Convert MIMIC CSVs into memory-mapped NumPy columns, keyed by SHA256"""
+
+    def __init__(
+        self,
+        cache_dir: Path = MIMIC_CACHE_DIR,
+        manifest_path: Optional[Path] = SHA256SUMS_TXT,
+        data_dir: Path = DATA_DIR
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.data_dir = Path(data_dir)
+        self.manifest = self._read_manifest(manifest_path)
+        self._digest_index_path = self.cache_dir / "digests.json"
+        self._digest_index: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def load(self, name: str, csv_path: Path, **read_kwargs) -> pd.DataFrame:
+        """
+        Load a table, building its cache entry from the CSV if needed
+
+        Args:
+            name: Logical table name (cache sub-directory)
+            csv_path: Source CSV file
+            **read_kwargs: Extra arguments for pd.read_csv; they are part of
+                the cache key so a schema change rebuilds the entry
+
+        Returns:
+            DataFrame whose columns are memory-mapped from the cache
+        """
+        csv_path = Path(csv_path)
+        digest = self.source_digest(csv_path)
+        entry_dir = self.cache_dir / name / self._entry_key(digest, read_kwargs)
+
+        if (entry_dir / "meta.json").exists():
+            try:
+                df = self._read_entry(entry_dir)
+                logger.debug(f"Loaded {name} from columnar cache ({len(df)} rows)")
+                return df
+            except Exception as e:
+                logger.warning(f"Discarding unreadable cache entry for {name}: {e}")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+
+        logger.info(f"Building columnar cache for {name} from {csv_path.name}")
+        df = pd.read_csv(csv_path, **read_kwargs)
+        self._write_entry(entry_dir, df)
+        self._prune_stale_entries(entry_dir)
+        return self._read_entry(entry_dir)
+
+    def source_digest(self, csv_path: Path) -> str:
+        """
+        SHA256 of a source file
+
+        The digest is memoized against the file's size and mtime so an
+        unchanged file is never re-hashed on start-up.
+        """
+        csv_path = Path(csv_path)
+        stat = csv_path.stat()
+        index = self._load_digest_index()
+        key = str(csv_path.resolve())
+
+        cached = index.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+
+        digest = self._hash_file(csv_path)
+        published = self.manifest.get(self._manifest_name(csv_path))
+        if published and published != digest:
+            logger.warning(f"{csv_path.name} does not match its SHA256SUMS.txt entry")
+
+        index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        self._save_digest_index()
+        return digest
+
+    def invalidate(self, name: Optional[str] = None):
+        """Drop cache entries for one table, or for every table"""
+        target = self.cache_dir / name if name else self.cache_dir
+        shutil.rmtree(target, ignore_errors=True)
+        if name is None:
+            self._digest_index = None
+
+    def _entry_key(self, digest: str, read_kwargs: Dict[str, Any]) -> str:
+        options = json.dumps(read_kwargs, sort_keys=True, default=str)
+        options_hash = hashlib.sha256(options.encode()).hexdigest()[:8]
+        return f"{digest[:16]}-v{CACHE_FORMAT_VERSION}-{options_hash}"
+
+    def _write_entry(self, entry_dir: Path, df: pd.DataFrame):
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=entry_dir.parent, prefix=".build-"))
+        try:
+            columns = []
+            for i, column in enumerate(df.columns):
+                columns.append(self._write_column(tmp_dir, i, column, df[column]))
+
+            meta = {"version": CACHE_FORMAT_VERSION, "rows": len(df), "columns": columns}
+            with open(tmp_dir / "meta.json", "w") as f:
+                json.dump(meta, f)
+
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def _write_column(self, directory: Path, i: int, column: str, series: pd.Series) -> Dict[str, Any]:
+        dtype = series.dtype
+        spec = {"name": column, "file": f"{i}.npy"}
+
+        if isinstance(dtype, pd.CategoricalDtype):
+            spec["kind"] = "category"
+            np.save(directory / spec["file"], series.cat.codes.to_numpy())
+            self._save_categories(directory / f"{i}.categories.npy", series.cat.categories)
+        elif isinstance(series.array, _MASKED_ARRAYS):
+            # Nullable integer / float / boolean extension arrays
+            spec["kind"] = "masked"
+            spec["dtype"] = str(dtype)
+            values = series.to_numpy(dtype=dtype.numpy_dtype, na_value=dtype.numpy_dtype.type(0))
+            np.save(directory / spec["file"], values)
+            np.save(directory / f"{i}.mask.npy", series.isna().to_numpy())
+        elif dtype.kind in "biufcmM" and isinstance(dtype, np.dtype):
+            spec["kind"] = "array"
+            np.save(directory / spec["file"], series.to_numpy())
+        else:
+            # Strings and other Python objects are dictionary-encoded
+            spec["kind"] = "object"
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            np.save(directory / spec["file"], codes.astype(np.int32))
+            self._save_categories(directory / f"{i}.categories.npy", pd.Index(uniques))
+
+        return spec
+
+    @staticmethod
+    def _save_categories(path: Path, categories: pd.Index):
+        values = categories.to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        np.save(path, values)
+
+    def _read_entry(self, entry_dir: Path) -> pd.DataFrame:
+        with open(entry_dir / "meta.json") as f:
+            meta = json.load(f)
+
+        data = {}
+        for spec in meta["columns"]:
+            values = np.load(entry_dir / spec["file"], mmap_mode="c")
+            kind = spec["kind"]
+
+            if kind == "array":
+                data[spec["name"]] = values
+            elif kind == "masked":
+                mask = np.load(entry_dir / spec["file"].replace(".npy", ".mask.npy"), mmap_mode="c")
+                array_type = pd.api.types.pandas_dtype(spec["dtype"]).construct_array_type()
+                data[spec["name"]] = array_type(values, mask)
+            else:
+                categories = np.load(entry_dir / spec["file"].replace(".npy", ".categories.npy"))
+                column = pd.Categorical.from_codes(values, categories=categories)
+                if kind == "object":
+                    column = np.asarray(column, dtype=object)
+                data[spec["name"]] = column
+
+        df = pd.DataFrame(data, copy=False)
+        if len(df) != meta["rows"]:
+            raise ValueError(f"expected {meta['rows']} rows, found {len(df)}")
+        return df
+
+    def _prune_stale_entries(self, current: Path):
+        for entry in current.parent.iterdir():
+            if entry != current and entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def _load_digest_index(self) -> Dict[str, Dict[str, Any]]:
+        if self._digest_index is None:
+            try:
+                with open(self._digest_index_path) as f:
+                    self._digest_index = json.load(f)
+            except (OSError, ValueError):
+                self._digest_index = {}
+        return self._digest_index
+
+    def _save_digest_index(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._digest_index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._digest_index, f)
+        os.replace(tmp_path, self._digest_index_path)
+
+    def _manifest_name(self, csv_path: Path) -> str:
+        try:
+            return csv_path.resolve().relative_to(self.data_dir.resolve()).as_posix()
+        except ValueError:
+            return csv_path.name
+
+    @staticmethod
+    def _read_manifest(manifest_path: Optional[Path]) -> Dict[str, str]:
+        """Parse a `sha256sum`-style manifest into {relative path: digest}"""
+        manifest = {}
+        if manifest_path is None or not Path(manifest_path).exists():
+            return manifest
+        with open(manifest_path) as f:
+            for line in f:
+                parts = line.split(maxsplit=1)
+                if len(parts) == 2:
+                    manifest[parts[1].strip().lstrip("*")] = parts[0]
+        return manifest
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+                sha.update(block)
+        return sha.hexdigest()
@@ -0,0 +1,234 @@
+"""
+Per-admission event timeline
+
+Events from several MIMIC-IV tables (prescriptions, pharmacy, microbiology,
+transfers and ICU datetime/output/procedure events) are merged once into
+flat arrays sorted by (hadm_id, time), with the event type and label stored
+as small integer codes. Finding an admission is a binary search over the
+distinct hadm_ids and a time window is a second binary search inside that
+admission, so "all events for hadm X between t0 and t1" costs O(log n) plus
+the size of the answer.
+"""
+
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import TIMELINE_EVENT_SOURCES
+from lab_series import as_float64
+
+
+@dataclass
+class TimelineEvent:
+    """One event on an admission's timeline"""
+    time: pd.Timestamp
+    event_type: str
+    label: str
+    value: Optional[float] = None
+
+
+def _first_present(frame: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """Row-wise first non-null value among columns"""
+    result = frame[columns[0]]
+    for column in columns[1:]:
+        result = result.where(result.notna(), frame[column])
+    return result
+
+
+def _to_ns(time) -> int:
+    return pd.Timestamp(time).value
+
+
+class TimelineIndex:
+    """Sorted event arrays for every admission, queried by hadm_id and time window"""
+
+    def __init__(
+        self,
+        hadm_ids: np.ndarray,
+        times: np.ndarray,
+        type_codes: np.ndarray,
+        label_codes: np.ndarray,
+        values: np.ndarray,
+        event_types: List[str],
+        labels: np.ndarray
+    ):
+        """Arrays must already be sorted by (hadm_id, time); use build() otherwise"""
+        self.hadm_ids = hadm_ids
+        self.times = times
+        self.type_codes = type_codes
+        self.label_codes = label_codes
+        self.values = values
+        self.event_types = list(event_types)
+        self.labels = labels
+
+        self._keys, self._starts = np.unique(hadm_ids, return_index=True)
+        self._starts = np.append(self._starts, len(hadm_ids))
+
+    @classmethod
+    def build(
+        cls,
+        tables: Dict[str, pd.DataFrame],
+        sources: Dict[str, dict] = TIMELINE_EVENT_SOURCES,
+        item_labels: Optional[Dict[int, str]] = None
+    ) -> "TimelineIndex":
+        """
+        Merge event tables into one timeline
+
+        Args:
+            tables: {table name: frame} for the tables in sources; missing
+                or empty tables are skipped
+            sources: Column spec per table (see config.TIMELINE_EVENT_SOURCES)
+            item_labels: itemid -> label (d_items) for ICU event tables
+        """
+        item_labels = item_labels or {}
+        event_types = list(sources)
+        parts = []
+
+        for type_code, name in enumerate(event_types):
+            frame = tables.get(name)
+            if frame is None or frame.empty:
+                continue
+            spec = sources[name]
+
+            times = pd.to_datetime(_first_present(frame, spec["time"]))
+            keep = (frame["hadm_id"].notna() & times.notna()).to_numpy()
+            frame, times = frame[keep], times[keep]
+
+            if spec["label"] == ["itemid"]:
+                labels = frame["itemid"].map(item_labels).fillna(frame["itemid"].astype(str))
+            else:
+                labels = _first_present(frame[spec["label"]].astype(object), spec["label"])
+
+            if "qualifier" in spec and spec["qualifier"] in frame.columns:
+                qualifier = frame[spec["qualifier"]].astype(object)
+                qualify = qualifier.notna() & labels.notna()
+                if "qualified" in spec:
+                    qualify &= qualifier.isin(spec["qualified"])
+                labels = labels.astype(object).where(
+                    ~qualify, labels.astype(str) + " (" + qualifier.astype(str) + ")"
+                )
+
+            if "value" in spec:
+                values = frame[spec["value"]].to_numpy(dtype=np.float32, na_value=np.nan)
+            elif "flag" in spec:
+                values = frame[spec["flag"]].notna().to_numpy(dtype=np.float32)
+            else:
+                values = np.full(len(frame), np.nan, dtype=np.float32)
+
+            parts.append(pd.DataFrame({
+                "hadm_id": frame["hadm_id"].to_numpy(dtype=np.int64),
+                "time": times.to_numpy().astype("datetime64[ns]").view(np.int64),
+                "type": np.full(len(frame), type_code, dtype=np.int8),
+                "label": labels.to_numpy(dtype=object),
+                "value": values,
+            }))
+
+        if parts:
+            events = pd.concat(parts, ignore_index=True)
+        else:
+            events = pd.DataFrame({
+                "hadm_id": np.empty(0, np.int64), "time": np.empty(0, np.int64),
+                "type": np.empty(0, np.int8), "label": np.empty(0, object),
+                "value": np.empty(0, np.float32),
+            })
+
+        order = np.lexsort((events["time"].to_numpy(), events["hadm_id"].to_numpy()))
+        events = events.iloc[order]
+        label_codes, labels = pd.factorize(events["label"].fillna(""))
+
+        return cls(
+            hadm_ids=events["hadm_id"].to_numpy(),
+            times=events["time"].to_numpy(),
+            type_codes=events["type"].to_numpy(),
+            label_codes=label_codes.astype(np.int32),
+            values=events["value"].to_numpy(dtype=np.float32),
+            event_types=event_types,
+            labels=np.asarray(labels, dtype=object),
+        )
+
+    def span(self, hadm_id: int, start=None, end=None) -> Tuple[int, int]:
+        """Row range [lo, hi) of an admission's events with start <= time <= end"""
+        i = np.searchsorted(self._keys, int(hadm_id))
+        if i == len(self._keys) or self._keys[i] != int(hadm_id):
+            return 0, 0
+
+        lo, hi = int(self._starts[i]), int(self._starts[i + 1])
+        times = self.times[lo:hi]
+        first = np.searchsorted(times, _to_ns(start), side="left") if start is not None else 0
+        last = np.searchsorted(times, _to_ns(end), side="right") if end is not None else len(times)
+        return lo + int(first), lo + int(last)
+
+    def _select(self, hadm_id: int, start, end, event_types: Optional[Iterable[str]]) -> np.ndarray:
+        lo, hi = self.span(hadm_id, start, end)
+        rows = np.arange(lo, hi)
+        if event_types is not None:
+            codes = [self.event_types.index(t) for t in event_types]
+            rows = rows[np.isin(self.type_codes[lo:hi], codes)]
+        return rows
+
+    def query(
+        self,
+        hadm_id: int,
+        start=None,
+        end=None,
+        event_types: Optional[Iterable[str]] = None
+    ) -> List[TimelineEvent]:
+        """
+        Events for an admission in time order
+
+        Args:
+            hadm_id: Admission to query
+            start, end: Inclusive time bounds (either may be None)
+            event_types: Restrict to these source tables
+        """
+        rows = self._select(hadm_id, start, end, event_types)
+        values = as_float64(self.values[rows])
+        return [
+            TimelineEvent(
+                time=pd.Timestamp(int(self.times[row])),
+                event_type=self.event_types[self.type_codes[row]],
+                label=self.labels[self.label_codes[row]],
+                value=None if np.isnan(value) else float(value),
+            )
+            for row, value in zip(rows, values)
+        ]
+
+    def count(self, hadm_id: int, start=None, end=None, event_types: Optional[Iterable[str]] = None) -> int:
+        return len(self._select(hadm_id, start, end, event_types))
+
+    def distinct_labels(
+        self,
+        hadm_id: int,
+        event_types: Iterable[str],
+        start=None,
+        end=None,
+        flagged: bool = False
+    ) -> List[str]:
+        """
+        Distinct labels in first-seen order (e.g. the drugs given in a window)
+
+        Args:
+            flagged: Only events whose flag column was set (value == 1.0)
+        """
+        rows = self._select(hadm_id, start, end, event_types)
+        if flagged:
+            rows = rows[self.values[rows] == 1.0]
+        codes = pd.unique(self.label_codes[rows])
+        return [self.labels[code] for code in codes]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.hadm_ids, self.times, self.type_codes, self.label_codes, self.values)
+        return sum(a.nbytes for a in arrays)
+
+    def __len__(self) -> int:
+        return len(self.hadm_ids)
+
+    def __repr__(self) -> str:
+        return f"TimelineIndex({len(self)} events, {len(self._keys)} admissions)"
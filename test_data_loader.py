@@ -0,0 +1,353 @@
+"""Tests for the MIMIC-IV data loading layer"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_loader import MIMICDataLoader
+from src.table_cache import ColumnarTableCache
+
+
+@pytest.fixture
+def table_cache(tmp_path):
+    return ColumnarTableCache(cache_dir=tmp_path / "cache", manifest_path=None, data_dir=tmp_path)
+
+
+def _write_csv(path: Path, text: str) -> Path:
+    path.write_text(text)
+    return path
+
+
+def _is_memory_mapped(array) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def test_table_cache_round_trip_is_memory_mapped(tmp_path, table_cache):
+    csv_path = _write_csv(
+        tmp_path / "admissions.csv",
+        "subject_id,hadm_id,admittime,race\n"
+        "1,100,2180-01-01 10:00:00,WHITE\n"
+        "2,200,2180-02-01 11:00:00,\n"
+    )
+
+    first = table_cache.load("admissions", csv_path)
+    second = table_cache.load("admissions", csv_path)
+
+    expected = pd.read_csv(csv_path)
+    assert second['hadm_id'].tolist() == expected['hadm_id'].tolist()
+    assert second['admittime'].tolist() == expected['admittime'].tolist()
+    assert second['race'].iloc[0] == 'WHITE' and pd.isna(second['race'].iloc[1])
+    assert first['subject_id'].tolist() == second['subject_id'].tolist()
+    assert _is_memory_mapped(np.asarray(second['hadm_id']))
+
+
+def test_table_cache_round_trips_nullable_columns(tmp_path, table_cache):
+    csv_path = _write_csv(tmp_path / "labevents.csv", "hadm_id,valuenum,flag\n100,1.5,true\n,,\n300,2.0,false\n")
+    dtype = {'hadm_id': 'Int32', 'valuenum': 'Float64', 'flag': 'boolean'}
+
+    table_cache.load("labevents", csv_path, dtype=dtype)
+    cached = table_cache.load("labevents", csv_path, dtype=dtype)
+
+    pd.testing.assert_frame_equal(cached, pd.read_csv(csv_path, dtype=dtype))
+
+
+def test_table_cache_invalidates_when_source_changes(tmp_path, table_cache):
+    csv_path = _write_csv(tmp_path / "patients.csv", "subject_id,gender\n1,F\n")
+    assert table_cache.load("patients", csv_path)['gender'].tolist() == ['F']
+
+    _write_csv(csv_path, "subject_id,gender\n1,M\n2,F\n")
+
+    reloaded = table_cache.load("patients", csv_path)
+    assert reloaded['gender'].tolist() == ['M', 'F']
+    assert len(list((table_cache.cache_dir / "patients").iterdir())) == 1
+
+
+def test_table_cache_digest_matches_sha256sum(tmp_path, table_cache):
+    import hashlib
+
+    csv_path = _write_csv(tmp_path / "d_icd.csv", "icd_code,long_title\n4151,PE\n")
+    expected = hashlib.sha256(csv_path.read_bytes()).hexdigest()
+
+    assert table_cache.source_digest(csv_path) == expected
+
+
+def test_get_patient_data_uses_indexes(loader):
+    patient = loader.get_patient_data(100)
+
+    assert patient.patient_id == '1'
+    assert patient.age == 50
+    assert patient.gender == 'F'
+    assert patient.icd_codes == ['78650', '4019']
+    assert patient.diagnoses == ['Chest pain, unspecified', 'Hypertension']
+
+
+def test_get_patient_data_skips_untitled_codes(loader):
+    patient = loader.get_patient_data(200)
+
+    assert patient.age == 70
+    assert patient.icd_codes == ['4151', 'UNKNOWN']
+    assert patient.diagnoses == ['Pulmonary embolism']
+
+
+def test_get_patient_data_unknown_admission_returns_none(loader):
+    assert loader.get_patient_data(999) is None
+
+
+def test_lab_values_are_grouped_and_time_sorted(loader):
+    labs = loader._get_lab_values(1, 100)
+
+    assert [v for _, v in labs['Hemoglobin']] == [13.1, 12.5]
+    assert labs['Hemoglobin'][0][0] == pd.Timestamp('2180-01-01 11:00:00')
+    assert labs['Creatinine'] == [(pd.Timestamp('2180-01-01 11:00:00'), 1.1)]
+    assert 'Troponin' in labs and 'BNP' in labs
+
+
+def test_lab_series_accessors_and_patient_coercion():
+    from src.data_loader import LabSeries, PatientData
+
+    t0 = pd.Timestamp('2180-01-01 10:00:00')
+    series = LabSeries.from_pairs([(t0 + pd.Timedelta(hours=6), 0.09), (t0, 0.03), (t0 + pd.Timedelta(hours=3), 0.05)])
+
+    assert series.times.dtype == np.int64 and series.values.dtype == np.float32
+    assert series.latest() == 0.09 and series.latest_time() == t0 + pd.Timedelta(hours=6)
+    assert series[-1] == (t0 + pd.Timedelta(hours=6), 0.09)
+    assert series.trend() == 'rising'
+    assert [v for _, v in series.window(t0 + pd.Timedelta(hours=1), t0 + pd.Timedelta(hours=6))] == [0.05, 0.09]
+    assert LabSeries().latest(0.0) == 0.0 and not LabSeries()
+
+    patient = PatientData('1', '100', 50, 'F', 'Chest pain', t0, {}, {'Troponin': [(t0, 0.03)]}, [], [])
+    assert isinstance(patient.labs['Troponin'], LabSeries)
+    assert patient.latest_lab('Troponin') == 0.03
+    assert patient.latest_lab('Lipase', 0) == 0
+    assert not hasattr(patient, '__dict__')
+
+
+def test_lab_values_bulk_matches_single_admission(loader):
+    bulk = loader.get_lab_values_bulk([100, 200, 300])
+
+    assert bulk[100]['Hemoglobin'] == loader._get_lab_values(1, 100)['Hemoglobin']
+    assert bulk[200]['Potassium'] == [(pd.Timestamp('2181-06-01 09:00:00'), 4.2)]
+    assert set(bulk[300]) == {'Troponin', 'BNP'}
+
+
+def _comparable(patient):
+    return (patient.patient_id, patient.hadm_id, patient.age, patient.gender,
+            patient.admission_time, patient.icd_codes, patient.diagnoses,
+            {name: values for name, values in patient.labs.items()
+             if name not in ('Troponin', 'BNP')})
+
+
+def test_get_patients_bulk_matches_get_patient_data(loader):
+    bulk = loader.get_patients_bulk([300, 100, 999, 200, 100])
+
+    assert [p.hadm_id for p in bulk] == ['300', '100', '200']
+    for patient in bulk:
+        single = loader.get_patient_data(int(patient.hadm_id))
+        assert _comparable(patient) == _comparable(single)
+
+
+def test_get_patients_bulk_process_pool(loader):
+    bulk = loader.get_patients_bulk([100, 200, 300], n_jobs=2, chunk_size=1)
+
+    assert [p.hadm_id for p in bulk] == ['100', '200', '300']
+
+
+def test_get_sample_patients(loader):
+    patients = loader.get_sample_patients(n=5, seed=0)
+
+    assert sorted(p.hadm_id for p in patients) == ['100', '200', '300']
+
+
+def test_stream_labevents_spills_cohort_to_disk(tmp_path, loader):
+    csv_path = tmp_path / "labevents.csv"
+    loader.labevents.to_csv(csv_path, index=False)
+    in_memory = loader.get_lab_values_bulk([100, 200])
+
+    loader.labevents = None
+    loader.build_indexes()
+    store = loader.stream_labevents(
+        hadm_ids=[100, 200], store_path=tmp_path / "labs.sqlite", chunksize=2, csv_path=csv_path
+    )
+
+    assert sorted(store.hadm_ids()) == [100, 200]
+    streamed = loader.get_lab_values_bulk([100, 200])
+    for hadm_id in (100, 200):
+        expected = {k: v for k, v in in_memory[hadm_id].items() if k not in ('Troponin', 'BNP')}
+        actual = {k: v for k, v in streamed[hadm_id].items() if k not in ('Troponin', 'BNP')}
+        assert actual == expected
+    assert list(loader._get_lab_values(1, 100))[:2] == ['Hemoglobin', 'Creatinine']
+
+
+def test_icd_matcher_prefixes_and_versions():
+    from src.config import CHEST_PAIN_ICD9_CODES, CHEST_PAIN_ICD_CATEGORIES
+    from src.icd_matcher import ICDPrefixMatcher
+
+    matcher = ICDPrefixMatcher(CHEST_PAIN_ICD_CATEGORIES)
+
+    assert all(matcher.match(code, 9) for code in CHEST_PAIN_ICD9_CODES)
+    assert matcher.match('41519', 9) == 'pulmonary'
+    assert matcher.match('I21.4', 10) == 'cardiology'
+    assert matcher.match('R0789', 10) == 'undifferentiated'
+    assert matcher.match('R070', 10) is None
+    assert matcher.match('4151', 10) is None
+    assert matcher.match('I214') == 'cardiology'
+
+
+def test_chest_pain_cohort_matches_subcodes_and_icd10(loader):
+    loader.diagnoses = pd.DataFrame({
+        'subject_id': [1, 2, 3, 4, 5],
+        'hadm_id': [100, 200, 300, 400, 500],
+        'icd_code': ['78650', '41519', 'I214', 'I214', '4019'],
+        'icd_version': [9, 9, 10, 9, 9],
+    }).astype({'icd_code': 'category', 'icd_version': 'int8'})
+
+    cohort = loader.chest_pain_cohort()
+
+    assert cohort['hadm_id'].tolist() == [100, 200, 300]
+    assert cohort['category'].tolist() == ['undifferentiated', 'pulmonary', 'cardiology']
+    assert isinstance(cohort['category'].dtype, pd.CategoricalDtype)
+    assert loader.filter_chest_pain_patients() == [100, 200, 300]
+
+
+def test_timeline_queries_by_admission_and_window(loader):
+    timeline = loader.timeline
+    t0 = pd.Timestamp('2180-01-01 10:00:00')
+
+    events = timeline.query(100)
+    assert [(e.event_type, e.label) for e in events] == [
+        ('prescriptions', 'Aspirin'), ('outputevents', 'Foley'),
+        ('prescriptions', 'Pantoprazole'), ('prescriptions', 'Pantoprazole'),
+    ]
+    assert events[1].value == 350.0 and events[0].value is None
+    assert timeline.count(100, t0, t0 + pd.Timedelta(hours=2)) == 3
+    assert timeline.count(100, event_types=['outputevents']) == 1
+    assert timeline.query(999) == []
+
+
+def test_patient_data_carries_medications_and_cultures(loader):
+    assert loader.get_patient_data(100).medications == []
+    assert 'timeline' not in loader.__dict__  # Lookups don't build the timeline by default
+
+    loader.timeline_context = True
+    patient = loader.get_patient_data(100)
+    assert patient.medications == ['Aspirin', 'Pantoprazole']
+    assert patient.on_medication('acid_suppression') and not patient.on_medication('anticoagulant')
+
+    bulk = {p.hadm_id: p for p in loader.get_patients_bulk([100, 200, 300])}
+    assert bulk['200'].microbiology == ['STREPTOCOCCUS PNEUMONIAE (SPUTUM)']
+    assert bulk['200'].on_medication('anticoagulant')  # IV heparin
+    assert bulk['100'].medications == patient.medications
+
+    # Line flushes and subcutaneous prophylaxis are not anticoagulation
+    assert bulk['300'].medications == ['Heparin Flush (10 units/ml)', 'Heparin (SC)']
+    assert not bulk['300'].on_medication('anticoagulant')
+    assert bulk['300'].microbiology == ['ESCHERICHIA COLI (URINE)']
+
+
+def test_tables_load_lazily_on_first_access(monkeypatch):
+    lazy = MIMICDataLoader(use_cache=False)
+    loaded = []
+    monkeypatch.setattr(
+        lazy, '_load_table',
+        lambda table: loaded.append(table) or pd.DataFrame({'hadm_id': [1], 'icd_code': ['78650']})
+    )
+
+    lazy.filter_chest_pain_patients()
+
+    assert loaded == ['diagnoses_icd']
+
+
+def test_compact_float32_labs_round_trip_exactly(loader):
+    loader.labevents = loader.labevents.astype({'valuenum': 'float32', 'hadm_id': 'Int32'})
+
+    labs = loader._get_lab_values(1, 100)
+
+    assert [v for _, v in labs['Hemoglobin']] == [13.1, 12.5]
+    assert labs['Creatinine'][0][1] == 1.1
+
+
+def test_memory_report_covers_loaded_tables(loader):
+    loader.diagnoses = loader.diagnoses.astype({'icd_code': 'category', 'hadm_id': 'int32'})
+
+    report = loader.memory_report()
+
+    assert 'diagnoses_icd' in report.index
+    assert report.loc['admissions', 'rows'] == 3
+    assert (report['saved_bytes'] == report['default_bytes'] - report['bytes']).all()
+
+
+def test_vitals_come_from_chartevents_nearest_admission(loader):
+    vitals = loader.get_patient_data(200).vitals
+
+    assert vitals['heart_rate'] == 95.0
+    assert (vitals['systolic_bp'], vitals['diastolic_bp']) == (85.0, 50.0)
+    assert vitals['respiratory_rate'] == 24.0
+    assert vitals['o2_saturation'] == 88.0
+    assert vitals['temperature'] == 38.0
+
+
+def test_chartevents_vitals_stream_without_loading_the_table(tmp_path, monkeypatch, loader):
+    from config import MIMIC_TABLES  # The module data_loader reads (src/ is on sys.path)
+
+    expected = loader.get_patient_data(200).vitals
+    csv_path = tmp_path / "chartevents.csv"
+    noise = pd.DataFrame({'subject_id': [2], 'hadm_id': [200], 'itemid': [999],
+                          'charttime': ['2181-06-01 09:00:00'], 'valuenum': [1.0]})
+    pd.concat([loader.chartevents, noise]).to_csv(csv_path, index=False)
+
+    loader.__dict__.pop('_table_chartevents')
+    loader._drop_indexes()
+    monkeypatch.setitem(MIMIC_TABLES['chartevents'], 'path', csv_path)
+    monkeypatch.setattr(loader, 'iter_table_chunks', lambda *args, **kwargs: MIMICDataLoader.iter_table_chunks(
+        loader, *args, **dict(kwargs, chunksize=3)
+    ))
+
+    assert loader.get_patient_data(200).vitals == expected
+    assert '_table_chartevents' not in loader.__dict__
+
+
+def test_vitals_use_omr_and_seeded_fallback(loader):
+    first = loader.get_patient_data(100)
+    again = loader.get_patient_data(100)
+
+    assert (first.vitals['systolic_bp'], first.vitals['diastolic_bp']) == (142.0, 91.0)
+    assert first.vitals['weight_kg'] == 81.6
+    assert first.vitals == again.vitals
+    assert first.labs['Troponin'] == again.labs['Troponin']
+    assert first.labs['Troponin'][0][0] == pd.Timestamp('2180-01-01 10:00:00')
+
+
+def test_measured_troponin_is_not_simulated(loader):
+    extra = pd.DataFrame({
+        'subject_id': [1], 'hadm_id': [300], 'itemid': [51003],
+        'charttime': ['2182-03-05 14:00:00'], 'valuenum': [0.9],
+    })
+    loader.labevents = pd.concat([loader.labevents, extra], ignore_index=True)
+
+    assert loader.get_patient_data(300).labs['Troponin'] == [(pd.Timestamp('2182-03-05 14:00:00'), 0.9)]
+
+
+def test_feature_store_round_trip_and_incremental_refresh(tmp_path, loader):
+    from src.feature_store import PatientFeatureStore
+
+    store = PatientFeatureStore(tmp_path / "features.sqlite")
+    assert store.refresh(loader, hadm_ids=[100, 200], source_version='v1') == 2
+    assert store.refresh(loader, hadm_ids=[100, 200, 300], source_version='v1') == 1
+
+    fresh = PatientFeatureStore(tmp_path / "features.sqlite")
+    stored = fresh.get(100)
+    expected = loader.get_patient_data(100)
+    assert _comparable(stored) == _comparable(expected)
+    assert stored.vitals == expected.vitals
+    assert stored.labs['Troponin'] == expected.labs['Troponin']
+    assert sorted(fresh.get_many([300, 999, 200])) == [200, 300]
+
+    assert fresh.refresh(loader, hadm_ids=[100], source_version='v2') == 1
+    assert fresh.hadm_ids() == [100]
@@ -0,0 +1,455 @@
+"""Tests for the agent orchestration layer"""
+import asyncio
+import json
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+import diagnostics
+from batch_runner import build_orchestrator, run_batch
+from config import LOG_LEVEL, DiagnosisType, RiskLevel, SpecialtyType
+from src.agents.base import DiagnosisResult, FractalAgent, MasterOrchestrator, normalized_entropy
+from src.agents.depth_policy import DepthPolicy, request_budget
+from src.agents.pulmonary import PulmonaryAgent
+from src.agents.result_cache import ResultCache
+from src.agents.routing import RoutingTable
+from src.agents.safety import SafetyMonitorAgent
+from src.agents.tracing import TRACER
+
+
+class _SleepyAgent(FractalAgent):
+    """Agent that takes `delay` seconds and reports a fixed diagnosis"""
+
+    def __init__(self, specialty, delay, diagnosis=DiagnosisType.GERD, risk=RiskLevel.LOW):
+        super().__init__(specialty, f"{specialty.value} sleeper")
+        self.delay, self.diagnosis, self.risk = delay, diagnosis, risk
+
+    async def _generate_hypotheses(self, patient_data):
+        await asyncio.sleep(self.delay)
+        return [DiagnosisResult(self.diagnosis, 0.9, "test", self.risk, [], {}, self.name, self.depth)]
+
+    async def _identify_subspecialties(self, hypotheses):
+        return []
+
+    def _create_child_agent(self, subspecialty_name):
+        return None
+
+    async def _synthesize_results(self, hypotheses, children_results, patient_data):
+        return hypotheses[0]
+
+
+def test_orchestrate_records_agent_timings(loader):
+    orchestrator = build_orchestrator()
+    state = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+
+    assert set(state.agent_timings) == set(state.active_agents)
+    assert all(seconds >= 0 for seconds in state.agent_timings.values())
+    assert state.final_diagnosis is not None
+    assert state.final_diagnosis.confidence == state.confidence
+
+
+def test_run_batch_streams_jsonl_and_reports_latency(tmp_path, loader):
+    output = tmp_path / "results.jsonl"
+
+    stats = run_batch(loader, [100, 200, 300], output, chunk_size=2)
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [r["hadm_id"] for r in records] == [100, 200, 300]
+    assert stats.patients == 3 and stats.patients_per_second > 0
+    percentiles = stats.percentiles()
+    assert "Cardiology Agent" in percentiles and "orchestrate" in percentiles
+    assert set(percentiles["Cardiology Agent"]) == {"p50", "p90", "p99"}
+
+
+def test_patient_fingerprint_tracks_content(loader):
+    first, again = loader.get_patient_data(100), loader.get_patient_data(100)
+    assert first.fingerprint() == again.fingerprint()
+
+    again.vitals['heart_rate'] = again.vitals['heart_rate'] + 1
+    assert first.fingerprint() != again.fingerprint()
+    assert first.fingerprint() != loader.get_patient_data(200).fingerprint()
+
+
+def test_orchestrate_serves_repeat_patients_from_cache(loader):
+    orchestrator = build_orchestrator()
+    calls = []
+    agent = orchestrator.specialty_agents[next(iter(orchestrator.specialty_agents))]
+    analyze = agent.analyze
+    agent.analyze = lambda patient: calls.append(patient.hadm_id) or analyze(patient)
+
+    first = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+    first.diagnosis_results.clear()
+    second = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+
+    assert calls == ['100']
+    assert len(second.diagnosis_results) == len(orchestrator.specialty_agents)
+    assert orchestrator.cache.stats()['hits'] == 1
+
+
+def test_result_cache_expires_and_evicts():
+    now = [0.0]
+    cache = ResultCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)  # evicts 'b', the least recently used
+
+    assert cache.get('b') is None
+    now[0] = 11
+    assert cache.get('a') is None and len(cache) == 1
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 1, 'hit_rate': 1 / 3}
+
+
+def test_deadline_returns_partial_state_with_safety_result(loader):
+    orchestrator = MasterOrchestrator(use_cache=False, agent_timeout=None, deadline=0.05)
+    orchestrator.register_agent(SpecialtyType.SAFETY, _SleepyAgent(SpecialtyType.SAFETY, 0.1, DiagnosisType.STEMI, RiskLevel.CRITICAL))
+    orchestrator.register_agent(SpecialtyType.GASTROENTEROLOGY, _SleepyAgent(SpecialtyType.GASTROENTEROLOGY, 0.0))
+    orchestrator.register_agent(SpecialtyType.MUSCULOSKELETAL, _SleepyAgent(SpecialtyType.MUSCULOSKELETAL, 5.0))
+
+    state = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+
+    assert state.partial and state.timed_out_agents == ['musculoskeletal sleeper']
+    assert [r.agent_name for r in state.diagnosis_results] == ['safety sleeper', 'gastroenterology sleeper']
+    assert state.final_diagnosis.diagnosis == DiagnosisType.STEMI
+
+
+def test_agent_timeout_drops_only_the_slow_agent(loader):
+    orchestrator = MasterOrchestrator(use_cache=False, agent_timeout=0.05, deadline=None)
+    orchestrator.register_agent(SpecialtyType.GASTROENTEROLOGY, _SleepyAgent(SpecialtyType.GASTROENTEROLOGY, 0.0))
+    orchestrator.register_agent(SpecialtyType.PULMONARY, _SleepyAgent(SpecialtyType.PULMONARY, 1.0))
+
+    state = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+
+    assert state.timed_out_agents == ['pulmonary sleeper']
+    assert [r.agent_name for r in state.diagnosis_results] == ['gastroenterology sleeper']
+
+
+class _FailingAgent(_SleepyAgent):
+    async def _generate_hypotheses(self, patient_data):
+        raise RuntimeError(f"{self.name} crashed")
+
+
+def test_failed_agents_are_logged_and_failed_safety_marks_state_partial(loader):
+    messages = []
+    handler = logger.add(messages.append, level="ERROR", format="{message}")
+    try:
+        orchestrator = MasterOrchestrator(use_cache=False, deadline=None)
+        orchestrator.register_agent(SpecialtyType.GASTROENTEROLOGY, _SleepyAgent(SpecialtyType.GASTROENTEROLOGY, 0.0))
+        orchestrator.register_agent(SpecialtyType.PULMONARY, _FailingAgent(SpecialtyType.PULMONARY, 0.0))
+        state = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+        assert state.failed_agents == ['pulmonary sleeper'] and not state.partial
+
+        orchestrator.register_agent(SpecialtyType.SAFETY, _FailingAgent(SpecialtyType.SAFETY, 0.0))
+        state = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+    finally:
+        logger.remove(handler)
+
+    assert state.partial and state.failed_agents == ['pulmonary sleeper', 'safety sleeper']
+    assert [r.agent_name for r in state.diagnosis_results] == ['gastroenterology sleeper']
+    assert sum('safety sleeper crashed' in m for m in messages) == 1
+    assert sum('pulmonary sleeper crashed' in m for m in messages) == 2
+
+
+def test_orchestrate_stream_yields_results_as_agents_finish(loader):
+    orchestrator = MasterOrchestrator(use_cache=False, agent_timeout=None, deadline=0.2)
+    orchestrator.register_agent(SpecialtyType.SAFETY, _SleepyAgent(SpecialtyType.SAFETY, 0.3, DiagnosisType.STEMI, RiskLevel.CRITICAL))
+    orchestrator.register_agent(SpecialtyType.PULMONARY, _SleepyAgent(SpecialtyType.PULMONARY, 0.05))
+    orchestrator.register_agent(SpecialtyType.GASTROENTEROLOGY, _SleepyAgent(SpecialtyType.GASTROENTEROLOGY, 0.0))
+    orchestrator.register_agent(SpecialtyType.MUSCULOSKELETAL, _SleepyAgent(SpecialtyType.MUSCULOSKELETAL, 5.0))
+
+    async def collect():
+        return [item async for item in orchestrator.orchestrate_stream(loader.get_patient_data(100))]
+
+    *results, state = asyncio.run(collect())
+
+    assert [r.agent_name for r in results] == ['gastroenterology sleeper', 'pulmonary sleeper', 'safety sleeper']
+    assert state.timed_out_agents == ['musculoskeletal sleeper']
+    assert state.final_diagnosis.diagnosis == DiagnosisType.STEMI
+    assert [r.agent_name for r in state.diagnosis_results] == [
+        'safety sleeper', 'pulmonary sleeper', 'gastroenterology sleeper'
+    ]
+
+
+def test_priority_mode_returns_provisional_state_on_critical_safety_alert(loader):
+    orchestrator = MasterOrchestrator(use_cache=True, agent_timeout=None, deadline=None, priority_mode=True)
+    orchestrator.register_agent(SpecialtyType.SAFETY, _SleepyAgent(SpecialtyType.SAFETY, 0.05, DiagnosisType.STEMI, RiskLevel.CRITICAL))
+    orchestrator.register_agent(SpecialtyType.GASTROENTEROLOGY, _SleepyAgent(SpecialtyType.GASTROENTEROLOGY, 0.0))
+    orchestrator.register_agent(SpecialtyType.MUSCULOSKELETAL, _SleepyAgent(SpecialtyType.MUSCULOSKELETAL, 5.0))
+    patient = loader.get_patient_data(100)
+
+    async def stream():
+        return [item async for item in orchestrator.orchestrate_stream(patient)]
+
+    for state in (asyncio.run(orchestrator.orchestrate(patient)), asyncio.run(stream())[-1]):
+        assert state.provisional and not state.partial
+        assert state.preempted_agents == ['musculoskeletal sleeper'] and state.timed_out_agents == []
+        assert [r.agent_name for r in state.diagnosis_results] == ['safety sleeper', 'gastroenterology sleeper']
+        assert state.final_diagnosis.diagnosis == DiagnosisType.STEMI
+    assert len(orchestrator.cache) == 2  # Agent results only; provisional states are not cached
+
+
+def test_shared_agent_keeps_no_per_call_state(loader):
+    safety = SafetyMonitorAgent()
+    critical = loader.get_patient_data(100)
+    critical.vitals.update(systolic_bp=80, o2_saturation=85)
+    stable = loader.get_patient_data(200)
+
+    async def run_many():
+        return await asyncio.gather(*[safety.analyze(p) for p in [critical, stable] * 50])
+
+    results = asyncio.run(run_many())
+
+    expected = [SafetyMonitorAgent.get_alerts(asyncio.run(safety.analyze(p))) for p in (critical, stable)]
+    assert 'MASSIVE_PE_ALERT' in expected[0] and expected[0] != expected[1]
+    assert [SafetyMonitorAgent.get_alerts(r) for r in results] == expected * 50
+    assert not hasattr(safety, 'children') and not hasattr(safety, 'critical_alerts')
+
+
+class _CountingChild(_SleepyAgent):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.analyses = 0
+
+    async def _generate_hypotheses(self, patient_data):
+        self.analyses += 1
+        return await super()._generate_hypotheses(patient_data)
+
+
+class _BranchingAgent(_SleepyAgent):
+    """Uncertain parent that asks for the same subspecialty twice"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created = []  # Child agents this parent created
+
+    async def _generate_hypotheses(self, patient_data):
+        return [
+            DiagnosisResult(d, 0.5, "test", RiskLevel.LOW, [], {}, self.name, self.depth)
+            for d in (DiagnosisType.GERD, DiagnosisType.COSTOCHONDRITIS)
+        ]
+
+    async def _identify_subspecialties(self, hypotheses):
+        return ["GI", "GI"]
+
+    def _create_child_agent(self, subspecialty_name):
+        child = _CountingChild(SpecialtyType.GASTROENTEROLOGY, 0.0)
+        child.depth = self.depth + 1
+        self.created.append(child)
+        return child
+
+
+def test_child_agents_are_pooled_and_memoized_per_request(loader):
+    parent = _BranchingAgent(SpecialtyType.GASTROENTEROLOGY, 0.0)
+    patient = loader.get_patient_data(100)
+
+    first = asyncio.run(parent.analyze(patient))
+    second = asyncio.run(parent.analyze(patient))
+
+    assert len(parent.created) == 1
+    assert parent.created[0].analyses == 2  # Once per request tree, despite two spawns each
+    assert [c.agent_name for c in first.children_results] == ['gastroenterology sleeper'] * 2
+    assert second.depth == 0 and second.children_results[0].depth == 1
+    assert parent.get_tree_structure().splitlines() == [
+        '└─ gastroenterology sleeper (depth=0)', '  └─ gastroenterology sleeper (depth=1)'
+    ]
+    assert FractalAgent.result_tree(first).count('(depth=1)') == 2
+
+
+def test_depth_policy_adapts_spawning_to_load_risk_and_budget(loader):
+    policy = DepthPolicy(enabled=True, capacity=4, min_depth=0, risk_boost=1)
+    parent = _BranchingAgent(SpecialtyType.GASTROENTEROLOGY, 0.0)
+    parent.depth_policy, parent.max_depth = policy, 1
+    patient = loader.get_patient_data(100)
+
+    assert asyncio.run(parent.analyze(patient)).children_results  # Idle: spawns
+
+    policy.in_flight = 4  # Saturated: depth drops to min_depth, high-risk patients keep one level
+    assert not asyncio.run(parent.analyze(patient)).children_results
+    assert policy.depth_limits(1, 0, np.array([True, False])).tolist() == [1, 0]
+    policy.in_flight = 0
+
+    with request_budget(0.0):  # Less time left than a depth-1 analysis costs
+        assert not asyncio.run(parent.analyze(patient)).children_results
+
+    stats = policy.stats()
+    assert stats[0]['count'] == 3 and stats[1]['count'] == 1
+    assert set(stats[1]) == {'count', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms'}
+    assert policy.decisions['budget'] == 1 and policy.in_flight == 0
+
+    disabled = DepthPolicy(enabled=False)
+    parent.depth_policy = disabled
+    asyncio.run(parent.analyze(patient))
+    assert disabled.stats() == {} and disabled.in_flight == 0  # No timing or locking when off
+
+
+def test_pulmonary_features_ignore_prophylaxis_and_non_respiratory_cultures(loader):
+    loader.timeline_context = True
+    agent = PulmonaryAgent()
+
+    therapeutic = agent._extract_pulmonary_features(loader.get_patient_data(200))  # IV heparin, sputum culture
+    assert therapeutic.get('anticoagulated') and therapeutic.get('positive_culture')
+
+    prophylactic = agent._extract_pulmonary_features(loader.get_patient_data(300))  # Flush, SC heparin, urine culture
+    assert not prophylactic.get('anticoagulated') and not prophylactic.get('positive_culture')
+
+
+def test_normalized_entropy_matches_per_patient_formula():
+    rows = [[0.5, 0.5], [0.9, 0.1, 0.0], [0.7], [], [0.0, 0.0]]
+
+    def reference(confidences):
+        total = sum(confidences)
+        if not confidences or total == 0:
+            return 1.0
+        entropy = -sum(c / total * math.log2(c / total + 1e-10) for c in confidences if c > 0)
+        return entropy / (math.log2(len(confidences)) if len(confidences) > 1 else 1)
+
+    matrix = np.full((len(rows), 3), np.nan)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+
+    np.testing.assert_allclose(normalized_entropy(matrix), [reference(r) for r in rows])
+
+
+def test_score_batch_matches_per_patient_scoring(loader):
+    agent = build_orchestrator(use_cache=False).specialty_agents[SpecialtyType.CARDIOLOGY]
+    hypotheses = [asyncio.run(agent._generate_hypotheses(p)) for p in loader.get_patients_bulk([100, 200, 300])]
+
+    uncertainty, spawn = agent.score_batch(hypotheses)
+    single = [agent.score_batch([h]) for h in hypotheses]
+
+    np.testing.assert_allclose(uncertainty, [u[0] for u, _ in single])
+    assert spawn.tolist() == [bool(s[0]) for _, s in single]
+
+
+def test_executor_modes_match_inline_results(loader):
+    patients = loader.get_patients_bulk([100, 200, 300])
+
+    def diagnose(**options):
+        orchestrator = build_orchestrator(use_cache=False, **options)
+        try:
+            return [
+                [(r.agent_name, r.diagnosis, r.confidence) for r in asyncio.run(orchestrator.orchestrate(p)).diagnosis_results]
+                for p in patients
+            ]
+        finally:
+            orchestrator.close()
+
+    inline = diagnose(executor=None)
+    assert diagnose(executor="thread", max_workers=2) == inline
+    assert diagnose(executor="process", max_workers=2) == inline
+    # Workers started with spawn (macOS/Windows default) receive pickled agents
+    assert diagnose(executor="process", max_workers=2, start_method="spawn") == inline
+
+
+def test_tracer_records_agent_phase_spans(tmp_path, loader):
+    orchestrator = build_orchestrator(use_cache=False)
+    TRACER.clear()
+    asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+    assert len(TRACER.spans) == 0  # Disabled by default
+
+    TRACER.enable(track_allocations=True)
+    try:
+        asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+    finally:
+        TRACER.disable()
+
+    spans = list(TRACER.spans)
+    root = next(s for s in spans if s.name == 'orchestrate')
+    assert root.parent_id is None and all(s.trace_id == root.trace_id for s in spans)
+    assert {'agent', 'analyze', 'generate_hypotheses', 'uncertainty', 'synthesize', 'synthesize_final'} <= {s.name for s in spans}
+    by_id = {s.span_id: s for s in spans}
+    assert all(by_id[s.parent_id].name == 'analyze' for s in spans if s.name == 'generate_hypotheses')
+    assert all(s.alloc_bytes is not None and s.wall >= 0 for s in spans)
+    assert TRACER.summary()[('Cardiology Agent', 'analyze')]['count'] == 1
+
+    trace = json.loads(TRACER.export_chrome_trace(tmp_path / 'trace.json').read_text())
+    assert len(trace['traceEvents']) == len(spans) and trace['traceEvents'][0]['ph'] == 'X'
+    otel = TRACER.to_otel()
+    assert {r['parentSpanId'] for r in otel} - {''} <= {r['spanId'] for r in otel}
+    TRACER.clear()
+
+
+def test_orchestrate_is_silent_and_diagnostics_are_lazy(capsys, loader):
+    asyncio.run(build_orchestrator(use_cache=False).orchestrate(loader.get_patient_data(100)))
+    assert capsys.readouterr().out == ''
+
+    calls = []
+    diagnostics.set_level("INFO")
+    diagnostics.debug("summary: {}", lambda: calls.append('debug'))
+    assert calls == [] and not diagnostics.is_enabled("DEBUG")
+
+    diagnostics.set_level("DEBUG")
+    try:
+        diagnostics.debug("summary: {}", lambda: calls.append('debug'))
+        # demo.py-style plain string keys must survive the DEBUG summaries
+        orchestrator = MasterOrchestrator(use_cache=False)
+        orchestrator.register_agent("safety", SafetyMonitorAgent())
+        state = asyncio.run(orchestrator.orchestrate(loader.get_patient_data(100)))
+        assert state.active_agents == ['Safety Monitor']
+    finally:
+        diagnostics.set_level(LOG_LEVEL)
+    assert calls == ['debug']
+
+
+def test_routing_table_selects_agents_and_counts_skipped_work(loader):
+    router = RoutingTable()
+    orchestrator = build_orchestrator(use_cache=False, router=router)
+    dyspneic = loader.get_patient_data(200)  # ICD-9 4151, pulmonary embolism
+    dyspneic.chief_complaint = "shortness of breath"
+
+    state = asyncio.run(orchestrator.orchestrate(dyspneic))
+
+    assert router.explain(dyspneic) == ['respiratory', 'hemodynamic_instability']
+    assert state.active_agents == ['Safety Monitor', 'Cardiology Agent', 'Pulmonary Agent']
+    assert router.stats.as_dict()['skipped'] == {'gastroenterology': 1, 'musculoskeletal': 1}
+
+    undifferentiated = loader.get_patient_data(100)  # ICD-9 78650, chest pain NOS
+    assert len(router.route(undifferentiated, orchestrator.specialty_agents)) == 5
+    assert router.stats.patients == 2 and router.stats.skip_rate == 2 / 10
+
+
+def test_routing_counts_skipped_agents_registered_under_string_keys(loader):
+    router = RoutingTable()
+    orchestrator = MasterOrchestrator(use_cache=False, router=router)
+    for specialty, agent in build_orchestrator(use_cache=False).specialty_agents.items():
+        orchestrator.register_agent(specialty.value, agent)
+    dyspneic = loader.get_patient_data(200)
+    dyspneic.chief_complaint = "shortness of breath"
+
+    state = asyncio.run(orchestrator.orchestrate(dyspneic))
+
+    assert state.active_agents == ['Safety Monitor', 'Cardiology Agent', 'Pulmonary Agent']
+    assert router.stats.as_dict()['skipped'] == {'gastroenterology': 1, 'musculoskeletal': 1}
+
+
+def test_chest_pain_complaint_alone_routes_to_every_differential(loader):
+    router = RoutingTable()
+    patient = loader.get_patient_data(300)
+    patient.icd_codes, patient.icd_versions, patient.vitals = [], [], {}
+
+    assert patient.chief_complaint == "chest pain"
+    assert router.explain(patient) == ['undifferentiated_chest_pain']
+    registered = list(build_orchestrator(use_cache=False).specialty_agents)
+    assert router.route(patient, registered) == registered
+
+
+def test_routing_matches_icd_codes_within_their_version(loader):
+    router = RoutingTable([
+        {"name": "icd9_v12", "icd_prefixes": {9: ["V12"]}, "route": ["cardiology"]},
+        {"name": "icd10_v12", "icd_prefixes": {10: ["V12"]}, "route": ["pulmonary"]},
+    ])
+    patient = loader.get_patient_data(100)
+    assert patient.icd_versions == [9, 9]
+
+    patient.icd_codes, patient.icd_versions = ['V1251'], [9]
+    assert router.explain(patient) == ['icd9_v12']
+    patient.icd_versions = [10]
+    assert router.explain(patient) == ['icd10_v12']
+    patient.icd_versions = []  # Unknown version: either may apply
+    assert router.explain(patient) == ['icd9_v12', 'icd10_v12']